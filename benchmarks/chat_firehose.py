@@ -0,0 +1,348 @@
+"""
+Chat firehose benchmark for Bot.event_message and the trivia cog.
+
+Feeds synthetic chat through the real Bot and TriviaCog using fake twitchio Message, Context and Channel objects, then
+reports throughput, per-message latency and allocations. Nothing connects to Twitch: the Helix calls used by the
+channel state cache are answered locally, the bot's built-in commands are not invoked and outbound chat is discarded.
+
+Usage (from the bot folder):
+    python benchmarks/chat_firehose.py --messages 20000 --users 500 --command-ratio 0.05 --answers 4
+    python benchmarks/chat_firehose.py --save-baseline
+    python benchmarks/chat_firehose.py --rate 1000
+
+With --rate 0 (the default) messages are fed back to back and latency is the time spent handling each message. With a
+positive rate messages arrive on a fixed schedule and latency also includes the time a message waited behind earlier
+ones.
+
+Results are compared against benchmarks/baseline.json when it holds a run with the same parameters. Regressions
+beyond --tolerance percent make the script exit with status 1.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import tracemalloc
+import time
+from time import perf_counter
+from twitchio.ext import commands
+
+BENCHMARK_PATH = os.path.abspath(os.path.dirname(__file__))
+PARENT_BOT_PATH = os.path.dirname(BENCHMARK_PATH)
+BASELINE_PATH = os.path.join(BENCHMARK_PATH, 'baseline.json')
+
+CHANNEL_NAMES = ['benchmarkchannel']
+GAME_NAME = 'Benchmark Game'
+CHAT_WORDS = ['pog', 'lul', 'hello', 'gg', 'nice', 'what', 'is', 'that', 'kappa', 'wow', 'no', 'yes', 'lol', 'hype']
+COMMANDS = ['!trivia', '!trivia count', '!trivia answers', '!loyalty', '!unknowncommand']
+
+
+class FakeChatter:
+    def __init__(self, user_id: int, name: str):
+        self.id = str(user_id)
+        self.name = name
+        self.display_name = name
+        self.is_mod = False
+        self.is_subscriber = user_id % 10 == 0
+        self.badges = {}
+        self._ws = None
+
+
+class FakeChannel:
+    def __init__(self, name: str):
+        self.name = name
+        self.sent_messages = 0
+
+    def get_chatter(self, name: str):
+        return None
+
+    async def send(self, content: str):
+        self.sent_messages += 1
+
+
+class FakeMessage:
+    def __init__(self, content: str, author: FakeChatter, channel: FakeChannel):
+        self.content = content
+        self.author = author
+        self.channel = channel
+        self.echo = False
+        self.tags = {}
+
+
+class FakeContext(commands.Context):
+    def __init__(self, message: FakeMessage, bot):
+        super().__init__(message, bot, prefix=bot.prefix)
+
+    async def send(self, content: str):
+        await self.channel.send(content)
+
+
+class FakeChannelInfo:
+    def __init__(self, game_name: str, title: str):
+        self.game_name = game_name
+        self.title = title
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    # Nearest-rank percentile of an already sorted list
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def build_chat(options, answers: list) -> list:
+    """
+    Generates the chat messages fed to the bot.
+
+    :param options: Parsed command line options
+    :param answers: The answers to the active trivia question
+    :return: List of (channel index, user index, content) tuples
+    """
+    generator = random.Random(options.seed)
+    chat = []
+    for _ in range(options.messages):
+        roll = generator.random()
+        if roll < options.command_ratio:
+            content = generator.choice(COMMANDS)
+        elif answers and roll < options.command_ratio + options.answer_ratio:
+            content = generator.choice(answers)
+        else:
+            content = ' '.join(generator.choice(CHAT_WORDS) for _ in range(generator.randint(1, 8)))
+        chat.append((generator.randrange(len(CHANNEL_NAMES)), generator.randrange(options.users), content))
+    return chat
+
+
+async def build_bot(options):
+    # Imported here so that the bot's config files are read from and written to the temporary working directory
+    from bot_configuration import load_config, get_settings
+    load_config()
+    import twitch_bot
+    from twitch_bot import Bot
+    import cogs.trivia as trivia
+    from cogs.trivia import TriviaCog, Question
+
+    # Trivia winners are credited loyalty points. The bot's paths are only defined when it runs as a script.
+    twitch_bot.LOYALTY_POINTS_FOLDER = os.path.join(os.getcwd(), 'loyalty')
+    os.makedirs(twitch_bot.LOYALTY_POINTS_FOLDER, exist_ok=True)
+
+    # Trivia keeps its files next to the cogs folder. Move them into the working directory so that a run leaves the
+    #   bot folder untouched, and run with the default trivia settings.
+    trivia_folder = os.path.join(os.getcwd(), 'trivia')
+    os.makedirs(trivia_folder, exist_ok=True)
+    trivia.TRIVIA_LOG_PATH = os.path.join(trivia_folder, 'trivia_log.txt')
+    trivia.question_bank.folder = os.path.join(trivia_folder, 'questions')
+    trivia.question_decks.decks_path = os.path.join(trivia_folder, 'question_decks.json')
+    trivia.trivia_config_watcher.config_path = os.path.join(trivia_folder, 'trivia_config.ini')
+    trivia.trivia_config.read_dict(trivia.DEFAULT_CONFIG)
+    # Every matched answer is logged, and the benchmark measures chat handling rather than the log file
+    trivia.trivia_config.set('General', 'enable_file_logging', 'False')
+    trivia.trivia_config_watcher.save()
+
+    settings = get_settings()
+    bot = Bot(token=settings.twitch.token, secret=settings.twitch.secret, prefix=settings.general.prefix,
+              channels=list(CHANNEL_NAMES), channel_state_ttl=settings.twitch.channel_state_ttl_in_seconds)
+
+    async def fetch_channel(channel_name):
+        return FakeChannelInfo(GAME_NAME, 'Benchmark stream')
+
+    async def fetch_streams(user_logins=None, type=None):
+        # Every channel is live so that trivia handles chat
+        return [object()]
+
+    async def get_context(message, cls=None):
+        return FakeContext(message, bot)
+
+    async def handle_commands(message):
+        return None
+
+    bot.fetch_channel = fetch_channel
+    bot.fetch_streams = fetch_streams
+    bot.get_context = get_context
+    bot.handle_commands = handle_commands
+
+    trivia_cog = TriviaCog(bot)
+    bot.add_cog(trivia_cog)
+    question = Question(game=GAME_NAME, points=10, question='Benchmark question?',
+                        answers=[f'answer number {index}' for index in range(options.answers)])
+    return bot, trivia_cog, question
+
+
+def arm_question(trivia_cog, question, channel_name: str):
+    # Puts the benchmark question up in the channel, as if trivia had just asked it
+    state = trivia_cog.get_channel_state(channel_name)
+    state.current_questions_list = [question]
+    state.current_question_index = 0
+    state.current_question = question
+    state.question_expiry_time = time.time() + 86400
+    state.trivia_paused = False
+    state.winners = {}
+    trivia_cog.bot.update_chat_filter(trivia_cog)
+
+
+async def feed(bot, trivia_cog, question, chat: list, rate: float) -> list:
+    """
+    Sends every chat message through Bot.event_message.
+
+    :return: List of per-message latencies in seconds
+    """
+    channels = [FakeChannel(channel_name) for channel_name in CHANNEL_NAMES]
+    chatters = {}
+    latencies = []
+    started = perf_counter()
+    for sequence, (channel_index, user_index, content) in enumerate(chat):
+        chatter = chatters.get(user_index)
+        if chatter is None:
+            chatter = chatters[user_index] = FakeChatter(user_index + 1, f'chatter{user_index}')
+        message = FakeMessage(content, chatter, channels[channel_index])
+
+        if rate > 0:
+            arrival = started + sequence / rate
+            delay = arrival - perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        else:
+            arrival = perf_counter()
+        await bot.event_message(message)
+        latencies.append(perf_counter() - arrival)
+
+        if trivia_cog.get_channel_state(channels[channel_index].name).current_question_index == -1:
+            # A correct answer ended the question. Put it back up so every message is checked against it.
+            arm_question(trivia_cog, question, channels[channel_index].name)
+    return latencies
+
+
+async def run(options) -> dict:
+    bot, trivia_cog, question = await build_bot(options)
+    chat = build_chat(options, question.answers)
+    for channel_name in CHANNEL_NAMES:
+        arm_question(trivia_cog, question, channel_name)
+
+    # Warm up the channel state cache, the permission index and the interpreter
+    await feed(bot, trivia_cog, question, chat[:min(len(chat), 1000)], 0)
+
+    gc.collect()
+    started = perf_counter()
+    latencies = await feed(bot, trivia_cog, question, chat, options.rate)
+    elapsed = perf_counter() - started
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    await feed(bot, trivia_cog, question, chat, 0)
+    after = tracemalloc.take_snapshot()
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    retained_blocks = sum(statistic.count_diff for statistic in after.compare_to(before, 'filename'))
+
+    bot.send_queue.stop()
+    # Finish the loyalty journal and question deck writes before the working directory is removed
+    for channel_loyalty in bot.channel_loyalty.values():
+        channel_loyalty.ledger.close()
+    sys.modules['cogs.trivia'].question_decks.close()
+    latencies.sort()
+    return {
+        'messages_per_second': len(chat) / elapsed,
+        'p50_latency_in_microseconds': percentile(latencies, 0.50) * 1e6,
+        'p99_latency_in_microseconds': percentile(latencies, 0.99) * 1e6,
+        'peak_allocated_kib': peak_bytes / 1024,
+        'retained_blocks_per_message': retained_blocks / len(chat)
+    }
+
+
+def scenario_key(options) -> str:
+    return (f'messages={options.messages} rate={options.rate} command_ratio={options.command_ratio} '
+            f'answer_ratio={options.answer_ratio} users={options.users} answers={options.answers} seed={options.seed}')
+
+
+def compare_to_baseline(key: str, results: dict, tolerance: float) -> bool:
+    """
+    Prints the change of every result against the stored baseline for the same scenario.
+
+    :return: True if no result regressed by more than tolerance percent
+    """
+    try:
+        with open(BASELINE_PATH, 'r') as baseline_file:
+            baseline = json.load(baseline_file).get(key)
+    except (OSError, ValueError):
+        baseline = None
+    if baseline is None:
+        print('No baseline stored for this scenario. Run with --save-baseline to store one.')
+        return True
+
+    passed = True
+    print('Change against baseline:')
+    for name, value in results.items():
+        if not baseline.get(name):
+            continue
+        change = (value - baseline[name]) / baseline[name] * 100
+        # Throughput regresses when it falls; everything else regresses when it rises
+        regression = -change if name == 'messages_per_second' else change
+        flag = ''
+        if regression > tolerance:
+            flag = '  REGRESSION'
+            passed = False
+        print(f'    {name}: {baseline[name]:.2f} -> {value:.2f} ({change:+.1f}%){flag}')
+    return passed
+
+
+def save_baseline(key: str, results: dict):
+    try:
+        with open(BASELINE_PATH, 'r') as baseline_file:
+            baseline = json.load(baseline_file)
+    except (OSError, ValueError):
+        baseline = {}
+    baseline[key] = results
+    with open(BASELINE_PATH, 'w') as baseline_file:
+        json.dump(baseline, baseline_file, indent=4, sort_keys=True)
+    print(f'Baseline saved to {BASELINE_PATH}.')
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Benchmarks Bot.event_message and the trivia cog with synthetic chat.')
+    parser.add_argument('--messages', type=int, default=20000, help='Number of chat messages to send')
+    parser.add_argument('--rate', type=float, default=0,
+                        help='Messages per second to offer. 0 sends them back to back.')
+    parser.add_argument('--command-ratio', type=float, default=0.05, help='Fraction of messages that are commands')
+    parser.add_argument('--answer-ratio', type=float, default=0.01,
+                        help='Fraction of messages that answer the trivia question correctly')
+    parser.add_argument('--users', type=int, default=500, help='Number of distinct chatters')
+    parser.add_argument('--answers', type=int, default=4, help='Number of answers to the active trivia question')
+    parser.add_argument('--seed', type=int, default=1, help='Seed for the generated chat')
+    parser.add_argument('--tolerance', type=float, default=10,
+                        help='Percent a result may regress against the baseline before the run fails')
+    parser.add_argument('--save-baseline', action='store_true', help='Store the results as the new baseline')
+    return parser.parse_args()
+
+
+def main():
+    options = parse_arguments()
+    sys.path.insert(0, PARENT_BOT_PATH)
+    # The bot reads and writes bot_config.ini in the working directory, so run somewhere disposable
+    working_directory = tempfile.mkdtemp(prefix='chat_firehose_')
+    with open(os.path.join(working_directory, 'bot_config.ini'), 'w') as config_file:
+        config_file.write(f'[Twitch]\ntoken = benchmark\nchannels = {",".join(CHANNEL_NAMES)}\n')
+    os.chdir(working_directory)
+
+    try:
+        results = asyncio.run(run(options))
+    finally:
+        os.chdir(PARENT_BOT_PATH)
+        shutil.rmtree(working_directory, ignore_errors=True)
+    key = scenario_key(options)
+    print(f'Scenario: {key}')
+    for name, value in results.items():
+        print(f'    {name}: {value:.2f}')
+
+    if options.save_baseline:
+        save_baseline(key, results)
+    elif not compare_to_baseline(key, results, options.tolerance):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
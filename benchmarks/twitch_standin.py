@@ -0,0 +1,526 @@
+"""
+Local stand-in for Twitch chat (IRC over websocket) and the Helix endpoints the bot uses, for end-to-end load testing
+without network access.
+
+Start the stand-in, then set local_twitch_url in the [Twitch] section of bot_config.ini and run the bot as usual:
+    python benchmarks/twitch_standin.py --port 8765 --scenario benchmarks/scenarios/raid.json
+    local_twitch_url = http://127.0.0.1:8765
+
+IRC: PASS/NICK/CAP REQ, JOIN/PART with NAMES lists, PRIVMSG with tags, USERSTATE/ROOMSTATE/USERNOTICE and PING/PONG.
+Messages the bot sends are counted per channel and checked against Twitch's chat rate limits.
+
+Helix: GET /helix/users, /helix/channels and /helix/streams, plus GET /oauth2/validate for the token.
+
+A scenario is a JSON file describing the channels and a list of timed steps, which start once the bot has joined its
+first channel. Each step has an "at" time in seconds and an "action":
+    chat       Generated chat: rate (messages per second), duration, users, command_ratio, commands, words,
+               answers, answer_ratio, user_prefix
+    say        One message: user, text
+    raid       Raid notice followed by the raiders joining: from, viewers, chat_rate, chat_duration
+    chatters   Grows the chatter list to count chatters
+    game       Changes the game: game_name
+    title      Changes the title: title
+    live       Starts the stream: viewer_count
+    offline    Ends the stream
+    latency    Sets injected latency: helix_ms, irc_ms, jitter_ms
+    errors     Sets injected Helix errors: helix_error_rate, helix_error_status
+    reconnect  Asks every connection to reconnect, as Twitch does before server maintenance
+    stop       Prints statistics and shuts the stand-in down
+Every step except latency, errors, reconnect and stop takes a "channel", defaulting to the scenario's first channel.
+
+Requires aiohttp, which is installed alongside twitchio.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+import zlib
+from collections import deque
+from datetime import datetime, timezone
+from aiohttp import web, WSMsgType
+
+CHAT_WORDS = ['pog', 'lul', 'hello', 'gg', 'nice', 'what', 'is', 'that', 'kappa', 'wow', 'no', 'yes', 'lol', 'hype']
+COMMANDS = ['!trivia', '!loyalty']
+NAMES_PER_LINE = 100
+# Messages per 30 seconds Twitch accepts from the bot in a channel
+MODERATOR_MESSAGES_PER_PERIOD = 100
+USER_MESSAGES_PER_PERIOD = 20
+RATE_LIMIT_PERIOD_IN_SECONDS = 30
+
+
+def user_id_for(login: str) -> str:
+    # Stable made-up user id, so the same login always has the same id
+    return str(100000 + zlib.crc32(login.encode()) % 900000000)
+
+
+def timestamp(seconds: float) -> str:
+    return datetime.fromtimestamp(seconds, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+class StandinChannel:
+    def __init__(self, name: str, game_name: str = 'Just Chatting', title: str = 'Stand-in stream', live: bool = False,
+                 viewer_count: int = 0, bot_is_moderator: bool = False):
+        self.name = name
+        self.id = user_id_for(name)
+        self.game_name = game_name
+        self.title = title
+        self.live = live
+        self.started_at = time.time()
+        self.viewer_count = viewer_count
+        self.bot_is_moderator = bot_is_moderator
+        self.chatters = set()
+        self.bot_messages = 0
+        self.rate_limited_messages = 0
+        self.recent_bot_messages = deque()
+
+    def game_id(self) -> str:
+        return user_id_for('game:' + self.game_name)
+
+
+class IrcConnection:
+    """
+    One websocket client. Outgoing lines are buffered and written several to a frame, as Twitch does.
+    """
+    def __init__(self, standin, websocket: web.WebSocketResponse):
+        self.standin = standin
+        self.websocket = websocket
+        self.nick = None
+        self.channels = set()
+        self._outbox = []
+        self._pending = asyncio.Event()
+        self._writer = asyncio.ensure_future(self._write())
+
+    def send(self, *lines: str):
+        self._outbox.extend(lines)
+        self._pending.set()
+
+    def close(self):
+        self._writer.cancel()
+
+    async def _write(self):
+        while not self.websocket.closed:
+            await self._pending.wait()
+            self._pending.clear()
+            await self.standin.delay(self.standin.irc_latency)
+            lines, self._outbox = self._outbox, []
+            if lines:
+                self.standin.irc_lines_sent += len(lines)
+                await self.websocket.send_str('\r\n'.join(lines) + '\r\n')
+
+
+class TwitchStandin:
+    def __init__(self, options):
+        self.bot_login = options.bot_login.lower()
+        self.helix_latency = options.helix_latency_ms / 1000
+        self.irc_latency = options.irc_latency_ms / 1000
+        self.jitter = options.jitter_ms / 1000
+        self.helix_error_rate = options.helix_error_rate
+        self.helix_error_status = options.helix_error_status
+        self.ping_interval = options.ping_interval
+        self.random = random.Random(options.seed)
+        self.channels = {}
+        self.connections = set()
+        self.logins_by_id = {}
+        self.helix_requests = {}
+        self.helix_errors = 0
+        self.irc_lines_sent = 0
+        self.scenario = None
+        self.scenario_task = None
+        self.stopped = asyncio.Event()
+
+    def get_channel(self, name: str) -> StandinChannel:
+        name = name.lower().lstrip('#')
+        channel = self.channels.get(name)
+        if channel is None:
+            channel = self.channels[name] = StandinChannel(name)
+        return channel
+
+    def register(self, login: str) -> str:
+        user_id = user_id_for(login)
+        self.logins_by_id[user_id] = login
+        return user_id
+
+    async def delay(self, latency: float):
+        latency += self.random.uniform(0, self.jitter) if self.jitter else 0
+        if latency > 0:
+            await asyncio.sleep(latency)
+
+    # Helix
+
+    @web.middleware
+    async def helix_faults(self, request: web.Request, handler):
+        if request.path.startswith('/irc'):
+            return await handler(request)
+        self.helix_requests[request.path] = self.helix_requests.get(request.path, 0) + 1
+        await self.delay(self.helix_latency)
+        if self.helix_error_rate and self.random.random() < self.helix_error_rate:
+            self.helix_errors += 1
+            headers = {}
+            if self.helix_error_status == 429:
+                headers = {'Ratelimit-Limit': '800', 'Ratelimit-Remaining': '0',
+                           'Ratelimit-Reset': str(int(time.time()) + 1)}
+            return web.json_response({'error': 'Injected error', 'status': self.helix_error_status,
+                                      'message': 'Injected by the Twitch stand-in'},
+                                     status=self.helix_error_status, headers=headers)
+        return await handler(request)
+
+    @staticmethod
+    def helix_response(data: list) -> web.Response:
+        return web.json_response({'data': data, 'pagination': {}},
+                                 headers={'Ratelimit-Limit': '800', 'Ratelimit-Remaining': '799',
+                                          'Ratelimit-Reset': str(int(time.time()) + 60)})
+
+    async def validate(self, request: web.Request) -> web.Response:
+        return web.json_response({'client_id': 'twitchstandin', 'login': self.bot_login,
+                                  'user_id': self.register(self.bot_login),
+                                  'scopes': ['chat:read', 'chat:edit'], 'expires_in': 5000000})
+
+    async def users(self, request: web.Request) -> web.Response:
+        logins = request.query.getall('login', [])
+        logins += [self.logins_by_id.get(user_id, f'user{user_id}') for user_id in request.query.getall('id', [])]
+        return self.helix_response([{
+            'id': self.register(login.lower()),
+            'login': login.lower(),
+            'display_name': login,
+            'type': '',
+            'broadcaster_type': '',
+            'description': '',
+            'profile_image_url': '',
+            'offline_image_url': '',
+            'view_count': 0,
+            'created_at': '2016-01-01T00:00:00Z'
+        } for login in logins])
+
+    async def channels_endpoint(self, request: web.Request) -> web.Response:
+        data = []
+        for broadcaster_id in request.query.getall('broadcaster_id', []):
+            channel = self.get_channel(self.logins_by_id.get(broadcaster_id, f'user{broadcaster_id}'))
+            data.append({
+                'broadcaster_id': channel.id,
+                'broadcaster_login': channel.name,
+                'broadcaster_name': channel.name,
+                'broadcaster_language': 'en',
+                'game_id': channel.game_id(),
+                'game_name': channel.game_name,
+                'title': channel.title,
+                'delay': 0,
+                'tags': [],
+                'content_classification_labels': [],
+                'is_branded_content': False
+            })
+        return self.helix_response(data)
+
+    async def streams(self, request: web.Request) -> web.Response:
+        names = request.query.getall('user_login', [])
+        names += [self.logins_by_id.get(user_id, f'user{user_id}') for user_id in request.query.getall('user_id', [])]
+        data = []
+        for name in names:
+            channel = self.get_channel(name)
+            if not channel.live:
+                continue
+            data.append({
+                'id': user_id_for(f'stream:{channel.name}:{channel.started_at}'),
+                'user_id': channel.id,
+                'user_login': channel.name,
+                'user_name': channel.name,
+                'game_id': channel.game_id(),
+                'game_name': channel.game_name,
+                'type': 'live',
+                'title': channel.title,
+                'viewer_count': channel.viewer_count,
+                'started_at': timestamp(channel.started_at),
+                'language': 'en',
+                'thumbnail_url': '',
+                'tag_ids': [],
+                'tags': [],
+                'is_mature': False
+            })
+        return self.helix_response(data)
+
+    # IRC
+
+    async def irc(self, request: web.Request) -> web.WebSocketResponse:
+        websocket = web.WebSocketResponse()
+        await websocket.prepare(request)
+        connection = IrcConnection(self, websocket)
+        self.connections.add(connection)
+        pinger = asyncio.ensure_future(self.ping(connection))
+        try:
+            async for message in websocket:
+                if message.type != WSMsgType.TEXT:
+                    continue
+                for line in message.data.split('\r\n'):
+                    if line:
+                        self.handle_line(connection, line)
+        finally:
+            pinger.cancel()
+            connection.close()
+            self.connections.discard(connection)
+        return websocket
+
+    async def ping(self, connection: IrcConnection):
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            connection.send('PING :tmi.twitch.tv')
+
+    def handle_line(self, connection: IrcConnection, line: str):
+        command, _, rest = line.partition(' ')
+        if command == 'PASS' or command == 'PONG':
+            return
+        elif command == 'NICK':
+            connection.nick = rest.strip().lower()
+            nick = connection.nick
+            connection.send(f':tmi.twitch.tv 001 {nick} :Welcome, GLHF!',
+                            f':tmi.twitch.tv 002 {nick} :Your host is tmi.twitch.tv',
+                            f':tmi.twitch.tv 003 {nick} :This server is rather new',
+                            f':tmi.twitch.tv 004 {nick} :-',
+                            f':tmi.twitch.tv 375 {nick} :-',
+                            f':tmi.twitch.tv 372 {nick} :You are in a maze of twisty passages, all alike.',
+                            f':tmi.twitch.tv 376 {nick} :>')
+        elif command == 'CAP':
+            connection.send(f':tmi.twitch.tv CAP * ACK {rest.partition(" ")[2]}')
+        elif command == 'PING':
+            connection.send('PONG :tmi.twitch.tv')
+        elif command == 'JOIN':
+            for name in rest.split(','):
+                self.join(connection, self.get_channel(name.strip()))
+        elif command == 'PART':
+            for name in rest.split(','):
+                channel = self.get_channel(name.strip())
+                connection.channels.discard(channel.name)
+                connection.send(f':{connection.nick}!{connection.nick}@{connection.nick}.tmi.twitch.tv '
+                                f'PART #{channel.name}')
+        elif command == 'PRIVMSG':
+            target, _, text = rest.partition(' :')
+            self.receive_from_bot(connection, self.get_channel(target), text)
+
+    def join(self, connection: IrcConnection, channel: StandinChannel):
+        nick = connection.nick
+        connection.channels.add(channel.name)
+        connection.send(f':{nick}!{nick}@{nick}.tmi.twitch.tv JOIN #{channel.name}',
+                        self.userstate(connection, channel),
+                        f'@emote-only=0;followers-only=-1;r9k=0;room-id={channel.id};slow=0;subs-only=0 '
+                        f':tmi.twitch.tv ROOMSTATE #{channel.name}')
+        names = [nick] + sorted(channel.chatters)
+        for index in range(0, len(names), NAMES_PER_LINE):
+            connection.send(f':{nick}.tmi.twitch.tv 353 {nick} = #{channel.name} '
+                            f':{" ".join(names[index:index + NAMES_PER_LINE])}')
+        connection.send(f':{nick}.tmi.twitch.tv 366 {nick} #{channel.name} :End of /NAMES list')
+        if self.scenario is not None and self.scenario_task is None:
+            self.scenario_task = asyncio.ensure_future(self.run_scenario())
+
+    def userstate(self, connection: IrcConnection, channel: StandinChannel) -> str:
+        is_broadcaster = connection.nick == channel.name
+        is_moderator = is_broadcaster or channel.bot_is_moderator
+        badges = 'broadcaster/1' if is_broadcaster else ('moderator/1' if is_moderator else '')
+        return (f'@badge-info=;badges={badges};color=;display-name={connection.nick};emote-sets=0;'
+                f'mod={int(is_moderator and not is_broadcaster)};subscriber=0;'
+                f'user-type={"mod" if is_moderator else ""} '
+                f':tmi.twitch.tv USERSTATE #{channel.name}')
+
+    def receive_from_bot(self, connection: IrcConnection, channel: StandinChannel, text: str):
+        now = time.monotonic()
+        recent = channel.recent_bot_messages
+        while recent and now - recent[0] > RATE_LIMIT_PERIOD_IN_SECONDS:
+            recent.popleft()
+        is_moderator = connection.nick == channel.name or channel.bot_is_moderator
+        limit = MODERATOR_MESSAGES_PER_PERIOD if is_moderator else USER_MESSAGES_PER_PERIOD
+        if len(recent) >= limit:
+            channel.rate_limited_messages += 1
+            connection.send(f'@msg-id=msg_ratelimit :tmi.twitch.tv NOTICE #{channel.name} '
+                            f':Your message was not sent because you are sending messages too quickly.')
+            return
+        recent.append(now)
+        channel.bot_messages += 1
+        connection.send(self.userstate(connection, channel))
+
+    def broadcast(self, channel: StandinChannel, lines: list):
+        for connection in self.connections:
+            if channel.name in connection.channels:
+                connection.send(*lines)
+
+    def privmsg(self, channel: StandinChannel, login: str, text: str) -> str:
+        is_subscriber = int(user_id_for(login)) % 10 == 0
+        return (f'@badge-info=;badges={"subscriber/1" if is_subscriber else ""};color=;display-name={login};emotes=;'
+                f'first-msg=0;flags=;id={uuid.uuid4()};mod=0;room-id={channel.id};subscriber={int(is_subscriber)};'
+                f'tmi-sent-ts={int(time.time() * 1000)};turbo=0;user-id={self.register(login)};user-type= '
+                f':{login}!{login}@{login}.tmi.twitch.tv PRIVMSG #{channel.name} :{text}')
+
+    def add_chatters(self, channel: StandinChannel, logins):
+        joins = []
+        for login in logins:
+            if login not in channel.chatters:
+                channel.chatters.add(login)
+                self.register(login)
+                joins.append(f':{login}!{login}@{login}.tmi.twitch.tv JOIN #{channel.name}')
+        if joins:
+            self.broadcast(channel, joins)
+
+    # Scenarios
+
+    def load_scenario(self, scenario: dict):
+        for name, attributes in scenario.get('channels', {}).items():
+            chatters = attributes.get('chatters', 0)
+            channel = self.channels[name.lower()] = StandinChannel(
+                name.lower(),
+                **{key: value for key, value in attributes.items() if key != 'chatters'})
+            channel.chatters.update(f'chatter{index}' for index in range(chatters))
+        self.scenario = scenario
+
+    async def run_scenario(self):
+        steps = sorted(self.scenario.get('steps', []), key=lambda step: step.get('at', 0))
+        default_channel = next(iter(self.scenario.get('channels', {})), None)
+        started = time.monotonic()
+        running = []
+        for step in steps:
+            delay = started + step.get('at', 0) - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            print(f'[{time.monotonic() - started:7.1f}s] {step["action"]}')
+            running.append(asyncio.ensure_future(self.run_step(step, default_channel)))
+        await asyncio.gather(*running)
+
+    async def run_step(self, step: dict, default_channel: str):
+        action = step['action']
+        channel = self.get_channel(step.get('channel') or default_channel or self.bot_login)
+        if action == 'chat':
+            await self.chat(channel, rate=step.get('rate', 10), duration=step.get('duration', 60),
+                            users=step.get('users', 500), command_ratio=step.get('command_ratio', 0.05),
+                            commands=step.get('commands', COMMANDS), words=step.get('words', CHAT_WORDS),
+                            answers=step.get('answers', []), answer_ratio=step.get('answer_ratio', 0),
+                            user_prefix=step.get('user_prefix', 'chatter'))
+        elif action == 'say':
+            self.add_chatters(channel, [step['user']])
+            self.broadcast(channel, [self.privmsg(channel, step['user'], step['text'])])
+        elif action == 'raid':
+            await self.raid(channel, step.get('from', 'raider'), step.get('viewers', 100),
+                            step.get('chat_rate', 0), step.get('chat_duration', 30))
+        elif action == 'chatters':
+            self.add_chatters(channel, [f'chatter{index}' for index in range(step.get('count', 10000))])
+        elif action == 'game':
+            channel.game_name = step['game_name']
+        elif action == 'title':
+            channel.title = step['title']
+        elif action == 'live':
+            channel.live = True
+            channel.started_at = time.time()
+            channel.viewer_count = step.get('viewer_count', len(channel.chatters))
+        elif action == 'offline':
+            channel.live = False
+        elif action == 'latency':
+            self.helix_latency = step.get('helix_ms', self.helix_latency * 1000) / 1000
+            self.irc_latency = step.get('irc_ms', self.irc_latency * 1000) / 1000
+            self.jitter = step.get('jitter_ms', self.jitter * 1000) / 1000
+        elif action == 'errors':
+            self.helix_error_rate = step.get('helix_error_rate', 0)
+            self.helix_error_status = step.get('helix_error_status', 500)
+        elif action == 'reconnect':
+            for connection in list(self.connections):
+                connection.send(':tmi.twitch.tv RECONNECT')
+        elif action == 'stop':
+            self.stopped.set()
+        else:
+            print(f'Unknown scenario action {action}.')
+
+    async def chat(self, channel: StandinChannel, rate: float, duration: float, users: int, command_ratio: float,
+                   commands: list, words: list, answers: list, answer_ratio: float, user_prefix: str):
+        # Emits chat in small batches so that high rates do not need one timer per message
+        batch_interval = 0.05
+        owed = 0.0
+        ends = time.monotonic() + duration
+        while time.monotonic() < ends:
+            owed += rate * batch_interval
+            lines = []
+            while owed >= 1:
+                owed -= 1
+                login = f'{user_prefix}{self.random.randrange(users)}'
+                if login not in channel.chatters:
+                    self.add_chatters(channel, [login])
+                roll = self.random.random()
+                if roll < command_ratio:
+                    text = self.random.choice(commands)
+                elif answers and roll < command_ratio + answer_ratio:
+                    text = self.random.choice(answers)
+                else:
+                    text = ' '.join(self.random.choice(words) for _ in range(self.random.randint(1, 8)))
+                lines.append(self.privmsg(channel, login, text))
+            if lines:
+                self.broadcast(channel, lines)
+            await asyncio.sleep(batch_interval)
+
+    async def raid(self, channel: StandinChannel, raider: str, viewers: int, chat_rate: float, chat_duration: float):
+        raider = raider.lower()
+        self.broadcast(channel, [
+            f'@badge-info=;badges=;color=;display-name={raider};emotes=;flags=;id={uuid.uuid4()};login={raider};mod=0;'
+            f'msg-id=raid;msg-param-displayName={raider};msg-param-login={raider};msg-param-viewerCount={viewers};'
+            f'room-id={channel.id};subscriber=0;system-msg={viewers}\\sraiders\\sfrom\\s{raider}\\shave\\sjoined!;'
+            f'tmi-sent-ts={int(time.time() * 1000)};user-id={self.register(raider)};user-type= '
+            f':tmi.twitch.tv USERNOTICE #{channel.name}'])
+        self.add_chatters(channel, [f'{raider}_viewer{index}' for index in range(viewers)])
+        channel.viewer_count += viewers
+        if chat_rate:
+            await self.chat(channel, rate=chat_rate, duration=chat_duration, users=viewers, command_ratio=0,
+                            commands=COMMANDS, words=CHAT_WORDS, answers=[], answer_ratio=0,
+                            user_prefix=f'{raider}_viewer')
+
+    def print_statistics(self):
+        print('Twitch stand-in statistics:')
+        print(f'    IRC lines sent to clients: {self.irc_lines_sent}')
+        for channel in self.channels.values():
+            print(f'    #{channel.name}: {channel.bot_messages} messages from the bot, '
+                  f'{channel.rate_limited_messages} rejected for exceeding the rate limit, '
+                  f'{len(channel.chatters)} chatters')
+        for path, requests in sorted(self.helix_requests.items()):
+            print(f'    {path}: {requests} requests')
+        print(f'    Injected Helix errors: {self.helix_errors}')
+
+
+async def serve(options):
+    standin = TwitchStandin(options)
+    if options.scenario:
+        with open(options.scenario, 'r') as scenario_file:
+            standin.load_scenario(json.load(scenario_file))
+
+    application = web.Application(middlewares=[standin.helix_faults])
+    application.add_routes([
+        web.get('/irc', standin.irc),
+        web.get('/oauth2/validate', standin.validate),
+        web.get('/helix/users', standin.users),
+        web.get('/helix/channels', standin.channels_endpoint),
+        web.get('/helix/streams', standin.streams)
+    ])
+    runner = web.AppRunner(application)
+    await runner.setup()
+    await web.TCPSite(runner, options.host, options.port).start()
+    print(f'Twitch stand-in listening on http://{options.host}:{options.port}. Set local_twitch_url in '
+          f'bot_config.ini to this address.')
+    try:
+        await standin.stopped.wait()
+    finally:
+        standin.print_statistics()
+        await runner.cleanup()
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Local stand-in for Twitch chat and Helix.')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=8765, help='Port to listen on')
+    parser.add_argument('--scenario', help='Scenario JSON file to run once the bot joins')
+    parser.add_argument('--bot-login', default='standinbot', help='Login reported for the bot\'s token')
+    parser.add_argument('--helix-latency-ms', type=float, default=0, help='Latency added to every Helix response')
+    parser.add_argument('--irc-latency-ms', type=float, default=0, help='Latency added to every IRC frame')
+    parser.add_argument('--jitter-ms', type=float, default=0, help='Random extra latency of up to this much')
+    parser.add_argument('--helix-error-rate', type=float, default=0, help='Fraction of Helix requests that fail')
+    parser.add_argument('--helix-error-status', type=int, default=500, help='HTTP status of injected Helix errors')
+    parser.add_argument('--ping-interval', type=float, default=60, help='Seconds between server PINGs')
+    parser.add_argument('--seed', type=int, default=1, help='Seed for generated chat and injected errors')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    try:
+        asyncio.run(serve(parse_arguments()))
+    except KeyboardInterrupt:
+        pass
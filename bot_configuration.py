@@ -1,4 +1,6 @@
 import os
+from dataclasses import dataclass, fields
+from types import MappingProxyType
 from configparser import ConfigParser, NoSectionError, NoOptionError
 
 BOT_PATH = os.getcwd()
@@ -16,7 +18,11 @@ DEFAULT_BOT_CONFIG = {
         'lp_earn_interval_in_seconds': '300',
         'lp_number_earned': '10',
         'lp_subscriber_doubling': 'True',
-        'enable_file_logging': 'True'
+        'lp_ledger_compaction_threshold': '50000',
+        'enable_file_logging': 'True',
+        'cog_tick_timeout_in_seconds': '5',
+        'cog_reload_interval_in_seconds': '2',
+        'metrics_port': '0'
     },
     'Command_Permissions': {
         'reload_cogs': 'Moderator',
@@ -36,15 +42,175 @@ DEFAULT_BOT_CONFIG = {
         'secret': 'wzy8hj3lag2t9lnt97zaha4sko7cr4',
         'channels': '',
         'heartbeat_duration_in_seconds': '30',
-        'retain_cache': 'True'
+        'retain_cache': 'True',
+        'channel_state_ttl_in_seconds': '30',
+        'local_twitch_url': ''
     }
 }
 
 
+class ConfigurationError(ValueError):
+    pass
+
+
+def parse_section(config: ConfigParser, section: str, settings_class):
+    """
+    Builds a settings dataclass from a ConfigParser section. Each field is read with the getter matching its type
+    annotation, so values are parsed and validated once rather than on every use.
+
+    :param config: The ConfigParser to read from
+    :param section: The name of the section to read
+    :param settings_class: The frozen dataclass describing the section
+    :raises ConfigurationError: If a value is missing or cannot be parsed as its type
+    :return: An instance of settings_class
+    """
+    values = {}
+    for field in fields(settings_class):
+        try:
+            if field.type is bool:
+                values[field.name] = config.getboolean(section, field.name)
+            elif field.type is int:
+                values[field.name] = config.getint(section, field.name)
+            else:
+                values[field.name] = config.get(section, field.name)
+        except (ValueError, NoSectionError, NoOptionError) as e:
+            raise ConfigurationError(f'Invalid value for {section}.{field.name}: {str(e)}')
+    return settings_class(**values)
+
+
+class WatchedConfig:
+    """
+    Pairs a ConfigParser with an immutable settings snapshot parsed from it. reload_if_changed re-reads the ini file
+    when its modification time changes and swaps in a new snapshot only if the whole file validates, so readers
+    always see either the old settings or the new ones, never a mix.
+    """
+    def __init__(self, config: ConfigParser, config_path: str, defaults: dict, parse, on_load=None):
+        self.config = config
+        self.config_path = config_path
+        self.defaults = defaults
+        self.parse = parse
+        self.on_load = on_load
+        self.settings = None
+        self.modified_time = None
+
+    def load(self):
+        """
+        Reads the ini file over the defaults, validates it and swaps in the new snapshot.
+
+        :raises ConfigurationError: If the file does not validate. The previous settings are kept.
+        :return: The new settings snapshot
+        """
+        candidate = ConfigParser()
+        candidate.read_dict(self.defaults)
+        candidate.read(self.config_path)
+        settings = self.parse(candidate)
+        for section in self.config.sections():
+            self.config.remove_section(section)
+        self.config.read_dict(candidate)
+        self.settings = settings
+        self.modified_time = self.get_modified_time()
+        if self.on_load is not None:
+            self.on_load(self.config)
+        return settings
+
+    def reload_if_changed(self) -> bool:
+        """
+        Reloads the settings if the ini file has been modified since it was last loaded or saved.
+
+        :raises ConfigurationError: If the modified file does not validate. The previous settings are kept.
+        :return: True if new settings were loaded
+        """
+        modified_time = self.get_modified_time()
+        if modified_time == self.modified_time:
+            return False
+        # Record the attempt so an invalid file is reported once rather than on every check
+        self.modified_time = modified_time
+        self.load()
+        return True
+
+    def save(self):
+        """
+        Writes the ConfigParser to the ini file and re-parses the settings snapshot from it. on_load is not called,
+        since whoever modified the ConfigParser is expected to have updated anything derived from it.
+
+        :return: None
+        """
+        with open(self.config_path, 'w') as config_file:
+            self.config.write(config_file)
+        self.settings = self.parse(self.config)
+        self.modified_time = self.get_modified_time()
+
+    def get_modified_time(self):
+        try:
+            return os.stat(self.config_path).st_mtime_ns
+        except OSError:
+            return None
+
+
+@dataclass(frozen=True)
+class GeneralSettings:
+    prefix: str
+    lp_enabled: bool
+    lp_type: str
+    lp_earn_interval_in_seconds: int
+    lp_number_earned: int
+    lp_subscriber_doubling: bool
+    lp_ledger_compaction_threshold: int
+    enable_file_logging: bool
+    cog_tick_timeout_in_seconds: int
+    cog_reload_interval_in_seconds: int
+    metrics_port: int
+
+
+@dataclass(frozen=True)
+class TwitchSettings:
+    token: str
+    secret: str
+    channels: str
+    heartbeat_duration_in_seconds: int
+    retain_cache: bool
+    channel_state_ttl_in_seconds: int
+    local_twitch_url: str
+
+    @property
+    def channel_names(self) -> list:
+        return [name.strip().lower() for name in self.channels.split(',') if name.strip()]
+
+
+@dataclass(frozen=True)
+class BotSettings:
+    general: GeneralSettings
+    twitch: TwitchSettings
+    command_permissions: MappingProxyType
+
+
+def parse_bot_config(config: ConfigParser) -> BotSettings:
+    """
+    Parses and validates the bot's ConfigParser into a BotSettings snapshot.
+
+    :param config: The ConfigParser to read from
+    :raises ConfigurationError: If any value is invalid
+    :return: The BotSettings snapshot
+    """
+    general = parse_section(config, 'General', GeneralSettings)
+    if general.lp_earn_interval_in_seconds <= 0:
+        raise ConfigurationError('General.lp_earn_interval_in_seconds must be a positive integer.')
+    if general.cog_tick_timeout_in_seconds <= 0:
+        raise ConfigurationError('General.cog_tick_timeout_in_seconds must be a positive integer.')
+    if general.cog_reload_interval_in_seconds < 0:
+        raise ConfigurationError('General.cog_reload_interval_in_seconds must be 0 or a positive integer.')
+    return BotSettings(
+        general=general,
+        twitch=parse_section(config, 'Twitch', TwitchSettings),
+        command_permissions=MappingProxyType(dict(config['Command_Permissions']))
+    )
+
+
 def load_config():
     """
     Loads the config.ini file, if one exists. Primes the configuration using the DEFAULT_CONFIG dict before updating
-    the values from an existing config.ini file.
+    the values from an existing config.ini file, then writes the file back and parses it into the settings snapshot
+    returned by get_settings.
 
     :return:
     """
@@ -57,15 +223,151 @@ def load_config():
                                               f'https://twitchapps.com/tokengen/&scope={"%20".join(REQUIRED_SCOPES)}&'
                                               f'force_verify=true\nand input the code you are given here:\n>').strip()
         bot_config['Twitch']['channels'] = input('Whose channel do you want to connect to?\n>')
-    with open(BOT_CONFIG_PATH, 'w') as config_file:
-        bot_config.write(config_file)
+    bot_config_watcher.save()
+    permission_index.rebuild(bot_config)
+
+
+def get_settings() -> BotSettings:
+    """
+    :return: The current BotSettings snapshot. Call this at the point of use rather than keeping the result, so that
+        reloaded settings are picked up.
+    """
+    return bot_config_watcher.settings
+
+
+def reload_config_if_changed() -> bool:
+    """
+    Reloads the bot settings if bot_config.ini has been modified on disk.
+
+    :raises ConfigurationError: If the modified file does not validate. The previous settings are kept.
+    :return: True if new settings were loaded
+    """
+    return bot_config_watcher.reload_if_changed()
+
+
+def save_config():
+    """
+    Writes bot_config to bot_config.ini and refreshes the settings snapshot.
+
+    :return: None
+    """
+    bot_config_watcher.save()
 
 
-def check_permissions(username: str, permission: str) -> bool:
-    try:
-        if username in bot_config['Permissions'][permission]:
-            return True
-    except (NoSectionError, NoOptionError):
-        pass
-    return False
+# Holding a role on the left grants every role on the right as well
+ROLE_IMPLICATIONS = {
+    'broadcaster': ('moderator',)
+}
+
 
+def expand_roles(roles) -> frozenset:
+    """
+    Adds every role implied by the given roles, following ROLE_IMPLICATIONS transitively.
+
+    :param roles: Iterable of lowercase role names
+    :return: Frozenset of the roles and every role they imply
+    """
+    expanded = set()
+    pending = list(roles)
+    while pending:
+        role = pending.pop()
+        if role not in expanded:
+            expanded.add(role)
+            pending.extend(ROLE_IMPLICATIONS.get(role, ()))
+    return frozenset(expanded)
+
+
+class PermissionIndex:
+    """
+    Index of username -> frozenset of roles built from the Permissions section of the config, where each option is
+    a role and its value is a comma-separated list of usernames. Checking a permission is a single dictionary lookup.
+    """
+    def __init__(self):
+        self.roles_by_user = {}
+
+    def rebuild(self, config: ConfigParser):
+        """
+        Rebuilds the index from the Permissions section of a ConfigParser.
+
+        :param config: The ConfigParser to read from
+        :return: None
+        """
+        roles_by_user = {}
+        if config.has_section('Permissions'):
+            for role in config.options('Permissions'):
+                for username in config['Permissions'][role].split(','):
+                    username = username.strip().lower()
+                    if username:
+                        roles_by_user.setdefault(username, set()).add(role.lower())
+        self.roles_by_user = {username: expand_roles(roles) for username, roles in roles_by_user.items()}
+
+    def grant(self, username: str, role: str):
+        """
+        Adds a role to a user's entry in the index.
+
+        :param username: The user being granted the role
+        :param role: The role being granted
+        :return: None
+        """
+        username = username.strip().lower()
+        self.roles_by_user[username] = expand_roles(self.roles_by_user.get(username, frozenset()) |
+                                                    {role.strip().lower()})
+
+    def revoke(self, username: str, role: str, config: ConfigParser):
+        """
+        Removes a role from a user's entry in the index. The user's remaining roles are re-expanded from the config,
+        so roles still implied by another role the user holds are kept.
+
+        :param username: The user losing the role
+        :param role: The role being removed
+        :param config: The ConfigParser holding the user's remaining roles
+        :return: None
+        """
+        username = username.strip().lower()
+        remaining_roles = set()
+        if config.has_section('Permissions'):
+            for configured_role in config.options('Permissions'):
+                if configured_role.lower() == role.strip().lower():
+                    continue
+                if username in (name.strip().lower() for name in config['Permissions'][configured_role].split(',')):
+                    remaining_roles.add(configured_role.lower())
+        if remaining_roles:
+            self.roles_by_user[username] = expand_roles(remaining_roles)
+        else:
+            self.roles_by_user.pop(username, None)
+
+    def get_roles(self, username: str, channel_name: str = None) -> frozenset:
+        """
+        :param username: The user whose roles are wanted
+        :param channel_name: The channel the user is acting in. The channel's owner holds the broadcaster role there.
+        :return: Frozenset of the user's lowercase roles
+        """
+        username = username.lower()
+        roles = self.roles_by_user.get(username, frozenset())
+        if channel_name is not None and username == channel_name.lower():
+            roles = roles | expand_roles(('broadcaster',))
+        return roles
+
+
+permission_index = PermissionIndex()
+bot_config_watcher = WatchedConfig(bot_config, BOT_CONFIG_PATH, DEFAULT_BOT_CONFIG, parse_bot_config,
+                                   on_load=permission_index.rebuild)
+
+
+def get_roles(username: str, channel_name: str = None) -> frozenset:
+    """
+    :param username: The user whose roles are wanted
+    :param channel_name: The channel the user is acting in. The channel's owner holds the broadcaster role there.
+    :return: Frozenset of the user's lowercase roles
+    """
+    return permission_index.get_roles(username, channel_name)
+
+
+def check_permissions(username: str, permission: str, channel_name: str = None) -> bool:
+    """
+    :param username: The user whose permission is being checked
+    :param permission: The role required
+    :param channel_name: The channel the user is acting in. The channel's owner holds the broadcaster role there.
+    :return: True if the user holds the role
+    """
+    return permission.lower() in permission_index.get_roles(username, channel_name)
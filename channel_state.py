@@ -0,0 +1,108 @@
+import asyncio
+from time import monotonic
+from metrics import observe_helix
+
+
+class ChannelState:
+    """
+    Snapshot of the Helix-reported state of a single channel.
+    """
+    __slots__ = ('name', 'game_name', 'title', 'is_live', 'refreshed_at')
+
+    def __init__(self, name: str, game_name: str = '', title: str = '', is_live: bool = False,
+                 refreshed_at: float = 0.0):
+        self.name = name
+        self.game_name = game_name
+        self.title = title
+        self.is_live = is_live
+        self.refreshed_at = refreshed_at
+
+    def __str__(self):
+        return f'{self.name}: game "{self.game_name}", title "{self.title}", live {self.is_live}'
+
+
+class ChannelStateCache:
+    """
+    Holds the game name, title and live status for each channel the bot is in. Entries are refreshed from Helix at
+    most once per TTL, and concurrent readers of a stale entry share a single refresh, so reads on the message path
+    are a dictionary lookup in the common case.
+    """
+    def __init__(self, bot, ttl: float = 30, retry_after: float = 5):
+        self.bot = bot
+        self.ttl = ttl
+        self.retry_after = retry_after
+        self._states = {}
+        self._refreshes = {}
+
+    def peek(self, channel_name: str) -> ChannelState | None:
+        """
+        Returns the cached state for a channel without refreshing it, regardless of its age.
+
+        :param channel_name: The name of the channel
+        :return: The cached ChannelState, or None if the channel has never been fetched
+        """
+        return self._states.get(channel_name.lower())
+
+    async def get(self, channel_name: str) -> ChannelState:
+        """
+        Returns the state for a channel, refreshing it from Helix first if it is missing or older than the TTL. If the
+        refresh fails, the last known state is returned and the refresh is retried after retry_after seconds.
+
+        :param channel_name: The name of the channel
+        :raises Exception: If the channel has never been fetched and the refresh fails
+        :return: The ChannelState for the channel
+        """
+        key = channel_name.lower()
+        state = self._states.get(key)
+        if state is not None and monotonic() - state.refreshed_at < self.ttl:
+            return state
+        try:
+            return await self.refresh(key)
+        except Exception as e:
+            if state is None:
+                raise
+            # Serve the stale state rather than asking Helix again on every message while it is failing
+            state.refreshed_at = monotonic() - self.ttl + min(self.retry_after, self.ttl)
+            print(f'Could not refresh the state of channel {key}, so the last known state is still in use: {str(e)}')
+            return state
+
+    async def refresh(self, channel_name: str) -> ChannelState:
+        """
+        Fetches the channel information and stream status from Helix and stores the result. If a refresh for the
+        channel is already in flight, waits on that refresh instead of starting another.
+
+        :param channel_name: The name of the channel
+        :return: The refreshed ChannelState
+        """
+        key = channel_name.lower()
+        refresh = self._refreshes.get(key)
+        if refresh is None:
+            refresh = asyncio.ensure_future(self._fetch(key))
+            self._refreshes[key] = refresh
+            refresh.add_done_callback(lambda _: self._refreshes.pop(key, None))
+        return await asyncio.shield(refresh)
+
+    def invalidate(self, channel_name: str = None):
+        """
+        Marks a channel's state, or every channel's state if no name is given, as stale so the next read refreshes it.
+
+        :param channel_name: The name of the channel, or None for all channels
+        :return: None
+        """
+        states = self._states.values() if channel_name is None else [self._states.get(channel_name.lower())]
+        for state in states:
+            if state is not None:
+                state.refreshed_at = 0.0
+
+    async def _fetch(self, channel_name: str) -> ChannelState:
+        channel_info, streams = await asyncio.gather(
+            observe_helix('channels', self.bot.fetch_channel(channel_name)),
+            observe_helix('streams', self.bot.fetch_streams(user_logins=[channel_name], type='all'))
+        )
+        state = ChannelState(name=channel_name,
+                             game_name=channel_info.game_name or '',
+                             title=channel_info.title or '',
+                             is_live=len(streams) > 0,
+                             refreshed_at=monotonic())
+        self._states[channel_name] = state
+        return state
@@ -0,0 +1,66 @@
+import re
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class ChatFilter:
+    """
+    The chat lines a listener cog wants to receive, returned from the cog's chat_filter() method. A line reaches the
+    cog if it matches any of:
+
+    -prefixes: the raw message starts with one of these strings
+    -exact: the message's normalized text (utils.normalize_text) is one of these strings
+    -patterns: one of these regular expressions matches anywhere in the raw message. Patterns must not use named
+        groups.
+    """
+    prefixes: tuple = ()
+    exact: frozenset = frozenset()
+    patterns: tuple = ()
+
+
+class ChatMatcher:
+    """
+    Every declared ChatFilter compiled into one matcher, so each chat line is checked once against all of them rather
+    than once per cog. Exact strings are kept in one dictionary of normalized text -> cogs. Prefixes and patterns are
+    combined into a single regular expression holding one optional lookahead per cog, each ending in an empty group
+    that only takes part in the match if that cog's lookahead matched.
+    """
+    def __init__(self, cog_filters: dict = None):
+        """
+        :param cog_filters: Dictionary of cog -> ChatFilter
+        """
+        self.cogs_by_text = {}
+        self.pattern_cogs = []
+        self.pattern = None
+        self.group_indexes = []
+        lookaheads = []
+        for cog, chat_filter in (cog_filters or {}).items():
+            for text in chat_filter.exact:
+                self.cogs_by_text.setdefault(text, []).append(cog)
+            alternatives = [re.escape(prefix) for prefix in chat_filter.prefixes]
+            alternatives.extend(f'(?s:.*?)(?:{pattern})' for pattern in chat_filter.patterns)
+            if alternatives:
+                lookaheads.append(f'(?:(?=\\A(?:{"|".join(alternatives)}))(?P<cog{len(self.pattern_cogs)}>))?')
+                self.pattern_cogs.append(cog)
+        if lookaheads:
+            self.pattern = re.compile(''.join(lookaheads))
+            # Patterns may hold groups of their own, so look the cogs' groups up by name
+            self.group_indexes = [self.pattern.groupindex[f'cog{index}'] for index in range(len(self.pattern_cogs))]
+
+    def match(self, parsed) -> list:
+        """
+        :param parsed: The ParsedMessage of a chat line
+        :return: List of the cogs whose filters the line matches, each at most once
+        """
+        matched = []
+        if self.pattern is not None:
+            # Every lookahead is optional, so the pattern always matches
+            regs = self.pattern.match(parsed.content).regs
+            for cog, group_index in zip(self.pattern_cogs, self.group_indexes):
+                if regs[group_index][0] != -1:
+                    matched.append(cog)
+        if self.cogs_by_text:
+            for cog in self.cogs_by_text.get(parsed.normalized_text, ()):
+                if cog not in matched:
+                    matched.append(cog)
+        return matched
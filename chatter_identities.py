@@ -0,0 +1,113 @@
+import asyncio
+import os
+from json import loads, dumps, JSONDecodeError
+from time import perf_counter
+from metrics import observe_helix, file_write_seconds, unresolved_chatters
+
+# Helix accepts at most this many logins per Get Users request
+HELIX_USERS_PER_REQUEST = 100
+
+
+class ChatterIdentityCache:
+    """
+    Persistent map of chatter login name -> Twitch user id. User ids never change, so a name only has to be resolved
+    through Helix the first time it is seen. Unknown names are resolved in chunks of HELIX_USERS_PER_REQUEST that are
+    fetched concurrently, and newly resolved names are appended to the identities file as one JSON line per batch.
+    A chunk whose request fails is retried once.
+    """
+    def __init__(self, identities_path: str):
+        self.identities_path = identities_path
+        self.ids_by_name = {}
+
+    def load(self):
+        """
+        Loads the identity map from disk, if one exists.
+
+        :return: None
+        """
+        if not os.path.exists(self.identities_path):
+            return
+        with open(self.identities_path, 'r') as identities_file:
+            for line in identities_file:
+                try:
+                    self.ids_by_name.update(loads(line))
+                except JSONDecodeError:
+                    # A torn line from an interrupted append. The names on it will simply be resolved again.
+                    continue
+
+    def warm(self, loyalty_points: dict):
+        """
+        Seeds the identity map from the usernames recorded alongside loyalty points.
+
+        :param loyalty_points: Dictionary of user id -> {'loyalty_points': int, 'username': str}
+        :return: None
+        """
+        for user_id, record in loyalty_points.items():
+            username = record.get('username') if isinstance(record, dict) else None
+            if username:
+                self.ids_by_name.setdefault(str(username).lower(), str(user_id))
+
+    async def resolve(self, bot, names: list) -> dict:
+        """
+        Returns the user id of every name given, calling Helix only for names that have not been seen before.
+
+        :param bot: The bot, used to call fetch_users
+        :param names: List of chatter login names
+        :return: Dictionary of lowercase login name -> user id string. Names Helix could not resolve are omitted.
+        """
+        unknown_names = list({name.lower() for name in names if name.lower() not in self.ids_by_name})
+        if unknown_names:
+            chunks = [unknown_names[index:index + HELIX_USERS_PER_REQUEST]
+                      for index in range(0, len(unknown_names), HELIX_USERS_PER_REQUEST)]
+            new_identities = {}
+            failed_chunks = await self.fetch_chunks(bot, chunks, new_identities)
+            if failed_chunks:
+                failed_chunks = await self.fetch_chunks(bot, [chunk for chunk, error in failed_chunks],
+                                                        new_identities)
+            for chunk, error in failed_chunks:
+                unresolved_chatters.inc(len(chunk))
+                print(f'Could not look up the user ids of {len(chunk)} chatters, even after retrying. They are skipped '
+                      f'until they can be looked up: {str(error)}')
+            if new_identities:
+                self.ids_by_name.update(new_identities)
+                await asyncio.to_thread(self.append, dumps(new_identities))
+
+        resolved = {}
+        for name in names:
+            user_id = self.ids_by_name.get(name.lower())
+            if user_id is not None:
+                resolved[name.lower()] = user_id
+        return resolved
+
+    @staticmethod
+    async def fetch_chunks(bot, chunks: list, new_identities: dict) -> list:
+        """
+        Calls Get Users for every chunk of names concurrently.
+
+        :param bot: The bot, used to call fetch_users
+        :param chunks: List of lists of at most HELIX_USERS_PER_REQUEST login names
+        :param new_identities: Dictionary the resolved lowercase login name -> user id pairs are added to
+        :return: List of (chunk, exception) for the chunks whose request failed
+        """
+        results = await asyncio.gather(*[observe_helix('users', bot.fetch_users(names=chunk)) for chunk in chunks],
+                                       return_exceptions=True)
+        failed_chunks = []
+        for chunk, result in zip(chunks, results):
+            if isinstance(result, Exception):
+                failed_chunks.append((chunk, result))
+                continue
+            for user in result:
+                new_identities[user.name.lower()] = str(user.id)
+        return failed_chunks
+
+    def append(self, line: str):
+        """
+        Appends a serialized batch of name -> id pairs to the identities file.
+
+        :param line: JSON object of login name -> user id
+        :return: None
+        """
+        started = perf_counter()
+        with open(self.identities_path, 'a') as identities_file:
+            identities_file.write(line + '\n')
+        file_write_seconds.labels('chatter_identities').observe(perf_counter() - started)
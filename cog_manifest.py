@@ -0,0 +1,122 @@
+import hashlib
+import os
+from json import load, dump, JSONDecodeError
+
+
+def hash_file(file_path: str) -> str:
+    with open(file_path, 'rb') as source_file:
+        return hashlib.sha1(source_file.read()).hexdigest()
+
+
+class CogManifest:
+    """
+    Persistent cache of what each cog module contains, so that modules that have not changed since the last start do
+    not have to be imported and inspected to find their Cog classes.
+
+    Each .py file in the cogs directory maps to its mtime, size, hash, module name and a list of cog records:
+        {'class': Cog class name, 'name': Cog name, 'command': command that reaches the cog's execute function or
+         None, 'eager': True if the cog has to be loaded at startup}
+    A file whose mtime and size are unchanged is trusted without being read. Otherwise its hash decides.
+    """
+    def __init__(self, manifest_path: str):
+        self.manifest_path = manifest_path
+        self.entries = {}
+        self.changed = False
+
+    def load(self):
+        """
+        Loads the manifest from disk, if one exists. A corrupt manifest is discarded and rebuilt.
+
+        :return: None
+        """
+        try:
+            with open(self.manifest_path, 'r') as manifest_file:
+                entries = load(manifest_file)
+        except (OSError, JSONDecodeError):
+            return
+        if isinstance(entries, dict):
+            self.entries = entries
+
+    def save(self):
+        """
+        Writes the manifest to disk if it changed since it was loaded.
+
+        :return: None
+        """
+        if not self.changed:
+            return
+        temporary_path = self.manifest_path + '.tmp'
+        with open(temporary_path, 'w') as manifest_file:
+            dump(self.entries, manifest_file, indent=4, sort_keys=True)
+        os.replace(temporary_path, self.manifest_path)
+        self.changed = False
+
+    def lookup(self, file_path: str):
+        """
+        :param file_path: Path of the cog module
+        :return: The file's entry if the file is unchanged since it was recorded, otherwise None
+        """
+        entry = self.entries.get(file_path)
+        if entry is None:
+            return None
+        try:
+            stat = os.stat(file_path)
+            if entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+                return entry
+            if entry['hash'] != hash_file(file_path):
+                return None
+        except (OSError, KeyError):
+            return None
+        # Touched but not edited
+        entry['mtime_ns'] = stat.st_mtime_ns
+        entry['size'] = stat.st_size
+        self.changed = True
+        return entry
+
+    def record(self, file_path: str, module_name: str, cogs: list):
+        """
+        Records what an inspected cog module contains.
+
+        :param file_path: Path of the cog module
+        :param module_name: The module's import name, e.g. cogs.trivia
+        :param cogs: List of cog records, as described on the class
+        :return: None
+        """
+        stat = os.stat(file_path)
+        self.entries[file_path] = {
+            'mtime_ns': stat.st_mtime_ns,
+            'size': stat.st_size,
+            'hash': hash_file(file_path),
+            'module': module_name,
+            'cogs': cogs
+        }
+        self.changed = True
+
+    def prune(self, file_paths: set):
+        """
+        Forgets every file not in file_paths.
+
+        :param file_paths: The cog modules that still exist
+        :return: None
+        """
+        for file_path in [path for path in self.entries if path not in file_paths]:
+            del self.entries[file_path]
+            self.changed = True
+
+
+class LazyCog:
+    """
+    Stands in for a command-only cog in the bot's dispatch index until its command is first used. The cog's module is
+    only imported then, and the real cog replaces this placeholder.
+    """
+    def __init__(self, bot, file_path: str, module_name: str, class_name: str, name: str):
+        self.bot = bot
+        self.file_path = file_path
+        self.module_name = module_name
+        self.class_name = class_name
+        self.name = name
+
+    async def execute(self, context):
+        cog = self.bot.load_lazy_cog(self)
+        if cog is not None:
+            await cog.execute(context)
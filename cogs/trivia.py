@@ -2,35 +2,31 @@ import json
 import os
 import time
 import pathlib
-from random import randint
+from dataclasses import dataclass, replace
 from twitchio.channel import Channel
 from twitchio.ext import commands
 from configparser import ConfigParser
-from utils import LoggingLevel, log_to_file, get_formatted_time_diff
+from utils import LoggingLevel, log_to_file, get_formatted_time_diff, normalize_text
+from send_queue import Priority
+from chat_filters import ChatFilter
+from question_bank import QuestionBank, QuestionChange
+from question_deck import QuestionDecks
+from bot_configuration import WatchedConfig, ConfigurationError, parse_section, get_settings
 
 PARENT_BOT_PATH = pathlib.Path(os.path.abspath(os.path.dirname(__file__))).parent
 TRIVIA_CONFIG_PATH = os.path.join(PARENT_BOT_PATH, 'trivia', 'trivia_config.ini')
 TRIVIA_LOG_PATH = os.path.join(PARENT_BOT_PATH, 'trivia', 'trivia_log.txt')
 TRIVIA_DATA_FOLDER = os.path.join(PARENT_BOT_PATH, 'trivia', 'questions')
+TRIVIA_DECKS_PATH = os.path.join(PARENT_BOT_PATH, 'trivia', 'question_decks.json')
 
-master_questions_list = []  # List of all questions
-current_questions_list = []  # List of currently active questions depending on settings
-current_question_index = -1
-question_start_time = time.time()
-question_expiry_time = 0
+# Deck key used when questions are drawn from every game
+ALL_QUESTIONS_DECK = '*'
+# Ways of leaning the order questions are drawn in. Every question is still asked once before any is repeated.
+QUESTION_WEIGHTINGS = ('none', 'less_seen', 'engagement')
+# How a question's points are paid out to the winners of a round. None leaves rewards unpaid.
+PAYOUT_MODES = ('none', 'full', 'split', 'scaled')
 
 trivia_config = ConfigParser()
-trivia_paused = False
-current_game = ''
-game_detection_override = None
-next_question_file_update_time = None
-channel_is_live = False
-
-ready_for_next_question = True
-readiness_notification_time = None
-grace_period_set = False
-
-winners = {}
 
 DEFAULT_CONFIG = {
     'General': {
@@ -50,43 +46,174 @@ DEFAULT_CONFIG = {
         'randomized_question_cooldown_lower_bound': '2',
         'automatically_run_questions': 'True',
         'question_readiness_notify_in_minutes': '5',
-        'enable_game_detection': 'False'
+        'enable_game_detection': 'False',
+        'question_weighting': 'None'
     },
     'Rewards': {
         'loyalty_points_type': 'Points',
         'default_loyalty_points_value': '50',
         'number_of_winners': '1',
         'use_grace_period': 'False',
-        'multiple_winner_grace_period_in_seconds': '2'
+        'multiple_winner_grace_period_in_seconds': '2',
+        'payout_mode': 'Full',
+        'grace_period_payout_percent': '100'
     }
 }
 
 
+def game_key(game: str) -> str:
+    return str(game).lower().strip()
+
+
+@dataclass(frozen=True)
+class TriviaGeneralSettings:
+    prefix: str
+    run_only_when_live: bool
+    player_permissions: str
+    admin_permissions: str
+    enable_file_logging: bool
+    debug_level: str
+    command_prefix: str
+
+
+@dataclass(frozen=True)
+class TriviaQuestionsSettings:
+    duration_in_minutes: int
+    cooldown_between_questions_in_minutes: int
+    randomize_question_cooldown: bool
+    randomized_question_cooldown_upper_bound: int
+    randomized_question_cooldown_lower_bound: int
+    automatically_run_questions: bool
+    question_readiness_notify_in_minutes: int
+    enable_game_detection: bool
+    question_weighting: str
+
+
+@dataclass(frozen=True)
+class TriviaRewardsSettings:
+    loyalty_points_type: str
+    default_loyalty_points_value: int
+    number_of_winners: int
+    use_grace_period: bool
+    multiple_winner_grace_period_in_seconds: int
+    payout_mode: str
+    grace_period_payout_percent: int
+
+
+@dataclass(frozen=True)
+class TriviaSettings:
+    general: TriviaGeneralSettings
+    questions: TriviaQuestionsSettings
+    rewards: TriviaRewardsSettings
+
+
+def parse_trivia_config(config: ConfigParser) -> TriviaSettings:
+    general = parse_section(config, 'General', TriviaGeneralSettings)
+    # Permission names are compared against lowercase permission levels
+    general = replace(general,
+                      player_permissions=general.player_permissions.lower(),
+                      admin_permissions=general.admin_permissions.lower())
+    questions = parse_section(config, 'Questions', TriviaQuestionsSettings)
+    questions = replace(questions, question_weighting=questions.question_weighting.lower())
+    if questions.question_weighting not in QUESTION_WEIGHTINGS:
+        raise ConfigurationError(f'Questions.question_weighting must be one of {", ".join(QUESTION_WEIGHTINGS)}.')
+    rewards = parse_section(config, 'Rewards', TriviaRewardsSettings)
+    rewards = replace(rewards, payout_mode=rewards.payout_mode.lower())
+    if rewards.payout_mode not in PAYOUT_MODES:
+        raise ConfigurationError(f'Rewards.payout_mode must be one of {", ".join(PAYOUT_MODES)}.')
+    if rewards.grace_period_payout_percent < 0:
+        raise ConfigurationError('Rewards.grace_period_payout_percent must be 0 or a positive integer.')
+    return TriviaSettings(
+        general=general,
+        questions=questions,
+        rewards=rewards
+    )
+
+
+trivia_config_watcher = WatchedConfig(trivia_config, TRIVIA_CONFIG_PATH, DEFAULT_CONFIG, parse_trivia_config)
+
+
+def load_trivia_config():
+    # Loads trivia_config.ini, writing the default settings if it does not exist yet. Called when the cog is created
+    #   rather than on import, so that importing the module never writes to the bot folder.
+    if not os.path.exists(trivia_config_watcher.config_path):
+        os.makedirs(os.path.dirname(trivia_config_watcher.config_path), exist_ok=True)
+        trivia_config.read_dict(DEFAULT_CONFIG)
+        trivia_config_watcher.save()
+    else:
+        trivia_config_watcher.load()
+
+
+def trivia_settings() -> TriviaSettings:
+    return trivia_config_watcher.settings
+
+
+def round_payouts(points: int, winner_ids: list, grace_period_winner_ids, rewards: TriviaRewardsSettings) -> dict:
+    """
+    Works out what each winner of a round earns.
+
+    -full: every winner earns the question's points
+    -split: the points are shared between the winners, with any remainder going to the first to answer
+    -scaled: each later answer earns a smaller share, out of number_of_winners places: the first earns all the
+        points, the second (places - 1) / places of them and so on
+    Winners who answered during the grace period then earn grace_period_payout_percent of their share.
+
+    :param points: The question's points
+    :param winner_ids: The winners' user ids, in the order they answered
+    :param grace_period_winner_ids: The user ids of the winners who answered during the grace period
+    :param rewards: The reward settings
+    :return: Dictionary of user id -> points earned
+    """
+    payouts = {}
+    if rewards.payout_mode == 'none':
+        return payouts
+    # A number_of_winners of 0 places no limit on winners
+    places = max(rewards.number_of_winners, len(winner_ids))
+    for place, user_id in enumerate(winner_ids):
+        if rewards.payout_mode == 'split':
+            payout = points // len(winner_ids) + (1 if place < points % len(winner_ids) else 0)
+        elif rewards.payout_mode == 'scaled':
+            payout = round(points * (places - place) / places)
+        else:
+            payout = points
+        if user_id in grace_period_winner_ids:
+            payout = round(payout * rewards.grace_period_payout_percent / 100)
+        payouts[user_id] = payout
+    return payouts
+
+
 class Question(object):
     # Object-specific Variables
     points = None
     game = None
     question = None
     answers = []
+    normalized_answers = frozenset()
 
     def __init__(self, **kwargs):
         self.points = kwargs["points"] if "points" in kwargs else (
-            trivia_config['Questions']['default_loyalty_points_value'])
+            trivia_settings().rewards.default_loyalty_points_value)
         self.game = kwargs["game"] if "game" in kwargs \
             else Question.raise_value_error(self, "Error: No 'game' keyword was supplied.")
         self.question = kwargs["question"] if "question" in kwargs \
             else Question.raise_value_error(self, "Error, no 'question' keyword was supplied.")
         self.answers = kwargs["answers"] if "answers" in kwargs \
             else Question.raise_value_error(self, "Error: No 'answers' keyword was supplied.")
+        self.index_answers()
 
     def as_string(self):
         return (f"for {str(self.points)} "
-                f"{trivia_config['Rewards']['loyalty_points_type']}: "
+                f"{trivia_settings().rewards.loyalty_points_type}: "
                 f"In {self.game}, {self.question}")
 
     def to_json(self):
         return {"Points": self.points, "Game": self.game, "Question": self.question, "Answers": self.answers}
 
+    @staticmethod
+    def from_json(record: dict):
+        return Question(game=record["Game"], points=record["Points"], question=record["Question"],
+                        answers=record["Answers"])
+
     def get_game(self):
         return self.game
 
@@ -111,6 +238,7 @@ class Question(object):
     def set_answers(self, new_answers):
         if isinstance(new_answers, list):
             self.answers = new_answers
+            self.index_answers()
             return True
         else:
             return False
@@ -118,6 +246,7 @@ class Question(object):
     def remove_answer(self, answer):
         try:
             self.answers.remove(answer.lower())
+            self.index_answers()
             return True
         except ValueError:
             return False
@@ -127,8 +256,18 @@ class Question(object):
             return False
         else:
             self.answers.append(answer.lower())
+            self.index_answers()
             return True
 
+    def index_answers(self):
+        # Precompute the normalized answers so matching a chat message is a single set lookup. An answer made only of
+        #   punctuation normalizes to nothing, and would match chat lines like "???", so it is left out.
+        self.normalized_answers = frozenset(normalized_answer for normalized_answer in map(normalize_text, self.answers)
+                                            if normalized_answer)
+
+    def is_correct(self, normalized_message):
+        return bool(normalized_message) and normalized_message in self.normalized_answers
+
     def raise_value_error(self, error_text):
         raise ValueError(error_text)
 
@@ -136,49 +275,116 @@ class Question(object):
         return "Game: " + self.game + ", Question: " + self.question
 
 
+# Every question, shared by every channel. Questions are read from disk one at a time as they are asked.
+question_bank = QuestionBank(TRIVIA_DATA_FOLDER, Question.from_json, game_key)
+# The order questions are drawn in, per game
+question_decks = QuestionDecks(TRIVIA_DECKS_PATH)
+
+
+class TriviaChannelState(object):
+    # Round state for a single channel. The question bank itself is shared by every channel.
+    def __init__(self, channel_name):
+        self.channel_name = channel_name
+        self.current_questions_list = []  # List of currently active questions depending on settings
+        self.current_deck_key = ALL_QUESTIONS_DECK  # Key of the deck the current questions are drawn from
+        self.current_question_index = -1
+        # The question being asked, resolved when it is drawn. Adding or removing questions can shift the indexes of
+        #   others, so the round never looks its question up by index again.
+        self.current_question = None
+        self.question_start_time = time.time()
+        self.question_expiry_time = 0
+
+        self.trivia_paused = False
+        self.current_game = ''
+        self.game_detection_override = None
+        self.next_question_file_update_time = None
+        self.channel_is_live = False
+
+        self.ready_for_next_question = True
+        self.readiness_notification_time = None
+        self.grace_period_set = False
+
+        self.winners = {}  # User id -> username, in the order they answered
+        self.grace_period_winners = set()  # User ids of the winners who answered during the grace period
+
+
 class TriviaCog(commands.Cog):
     def __init__(self, bot: commands.Bot):
-        global question_start_time
         self.bot = bot
         self.only_execute_on_command = False
+        self.channel_states = {}
+        self.next_config_check_time = time.monotonic()
+        load_trivia_config()
         self.load_trivia()
 
+    def get_channel_state(self, channel_name):
+        state = self.channel_states.get(channel_name.lower())
+        if state is None:
+            state = self.channel_states[channel_name.lower()] = TriviaChannelState(channel_name.lower())
+            self.select_questions(state)
+        return state
+
+    def chat_filter(self) -> ChatFilter:
+        # Trivia only needs to see its own commands and the answers to the questions currently running
+        answers = set()
+        for state in self.channel_states.values():
+            if state.current_question is not None:
+                answers.update(state.current_question.normalized_answers)
+        return ChatFilter(prefixes=(trivia_settings().general.command_prefix,), exact=frozenset(answers))
+
+    def reply(self, messageable: Channel | commands.Context, text: str):
+        # Trivia chat goes through the bot's send queue in the normal priority lane
+        self.bot.queue_message(messageable, text, Priority.Normal)
+
+    def reload_config_if_changed(self):
+        # Checked at most once per second no matter how many channels are ticking
+        if time.monotonic() < self.next_config_check_time:
+            return
+        self.next_config_check_time = time.monotonic() + 1
+        try:
+            if trivia_config_watcher.reload_if_changed():
+                self.log("ReloadConfig: Reloaded trivia_config.ini.", LoggingLevel.str_to_int.get("Info"))
+                self.bot.update_chat_filter(self)
+        except ConfigurationError as e:
+            self.log(f'ReloadConfig: trivia_config.ini was modified but could not be loaded, so the previous '
+                     f'settings are still in use: {str(e)}', LoggingLevel.str_to_int.get("Warn"))
+
     # Function that runs continuously
     async def tick(self, channel: Channel):
-        global question_start_time
-        global question_expiry_time
-        global next_question_file_update_time
-        global trivia_paused
-        global grace_period_set
-        global current_game
-
-        if (not trivia_paused and
-                (channel_is_live or not trivia_config['General']['run_only_when_live'] == 'True')):
-            channel_data = await self.bot.fetch_channel(channel.name)
-            current_game = channel_data.game_name
+        self.reload_config_if_changed()
+        state = self.get_channel_state(channel.name)
+
+        if state.trivia_paused:
+            return
+
+        # Served from the bot's channel state cache; Helix is only hit when the cached entry has expired
+        channel_state = await self.bot.channel_state.get(channel.name)
+        state.channel_is_live = channel_state.is_live
+        if state.channel_is_live or not trivia_settings().general.run_only_when_live:
+            state.current_game = channel_state.game_name
             # If time has expired, check to see if there is a current question
             # If there is a current question, depending on settings the answers
             #   may need to be displayed and the points adjusted
             current_time = time.time()
-            global current_question_index
 
-            if not current_question_index == -1:
+            if not state.current_question_index == -1:
                 # There is a current question
-                if current_time > question_expiry_time:
+                if current_time > state.question_expiry_time:
                     # The question has expired. End the question.
                     self.log("Tick: Question time exceeded. Ending question.",
                              LoggingLevel.str_to_int.get("Debug"))
                     await self.end_question(channel)
-                    grace_period_set = False
-                # elif script_settings.create_current_question_file and (current_time > next_question_file_update_time):
+                    state.grace_period_set = False
+                # elif script_settings.create_current_question_file and (
+                #         current_time > state.next_question_file_update_time):
                 #     # The question has not expired. Display the question and the remaining time.
                 #     update_current_question_file(parse_string(script_settings.question_file_ask_string), 1)
 
             else:
                 # There is no current question
-                if current_time > question_start_time:
+                if current_time > state.question_start_time:
                     # It is time for the next question.
-                    if trivia_config['Questions']['automatically_run_questions'] == 'True':
+                    if trivia_settings().questions.automatically_run_questions:
                         # If the settings indicate to run the next question, do so.
                         self.log("Tick: Starting next question.", LoggingLevel.str_to_int.get("Debug"))
                         await self.next_question(channel)
@@ -187,125 +393,111 @@ class TriviaCog(commands.Cog):
                 #         #   set the boolean and display that the next question is ready.
                 #         global ready_for_next_question
                 #         global readiness_notification_time
-                #         ready_for_next_question = True
-                #         if readiness_notification_time is None:
-                #             readiness_notification_time = (time.time() +
+                #         state.ready_for_next_question = True
+                #         if state.readiness_notification_time is None:
+                #             state.readiness_notification_time = (time.time() +
                 #                 int(trivia_config.get('Questions',
                 #                                       'question_readiness_notify_in_minutes')) * 60)
                 #         # if script_settings.create_current_question_file:
                 #         #     update_current_question_file("The next question is ready! Type !trivia to begin.",
                 #         #                                  time.time() + 86400)
-                #         if current_time > readiness_notification_time:
-                #             if len(current_questions_list) > 0:
+                #         if current_time > state.readiness_notification_time:
+                #             if len(state.current_questions_list) > 0:
                 #                 await ("The next question is ready! Type !trivia to begin.")
-                #             readiness_notification_time = (time.time() +
+                #             state.readiness_notification_time = (time.time() +
                 #                 int(trivia_config.get('Questions',
                 #                                       'question_readiness_notify_in_minutes')) * 60)
-                # elif script_settings.create_current_question_file and (current_time > next_question_file_update_time):
+                # elif script_settings.create_current_question_file and (
+                #         current_time > state.next_question_file_update_time):
                 #     # It is not time for the next question. Display the remaining time until the next question.
                 #     update_current_question_file("Time until next question: " + str(
-                #         get_strftime(question_start_time - time.time())) + ".", 1)
+                #         get_strftime(state.question_start_time - time.time())) + ".", 1)
 
     async def execute(self, context: commands.Context):
-        from bot_configuration import bot_config
-        global channel_is_live
-        current_channel = await context.bot.fetch_channel(context.channel.name)
-        current_streams = await context.bot.fetch_streams(user_logins=[str(context.channel.name)], type='all')
-        channel_is_live = len(current_streams) > 0
-        if trivia_config['General']['run_only_when_live'] == 'True' and not \
-                channel_is_live:
+        state = self.get_channel_state(context.channel.name)
+        current_channel = await self.bot.channel_state.get(context.channel.name)
+        state.channel_is_live = current_channel.is_live
+        if trivia_settings().general.run_only_when_live and not \
+                state.channel_is_live:
             return
 
-        global trivia_paused
-        global current_question_index
-        global current_questions_list
-        global master_questions_list
-        global current_game
-        user_permissions = []
-        if bot_config.has_section('Permissions'):
-            for section in bot_config.options('Permissions'):
-                if context.author.name in bot_config['Permissions'][section]:
-                    user_permissions.append(str(section).lower())
-
-        if str(context.message.content).startswith(trivia_config['General']['command_prefix']):
+        parsed = context.parsed
+        user_permissions = parsed.roles
+
+        if parsed.content.startswith(trivia_settings().general.command_prefix):
             # Command started with the prefix
-            args = str(context.message.content).split(' ')
-            args.pop(0)  # remove base command
+            args = parsed.args
 
-            if len(args) == 0 and not trivia_paused:
-                if (trivia_config['General']['player_permissions'].lower() == 'everyone' or
-                        trivia_config['General']['player_permissions'].lower() in
+            if len(args) == 0 and not state.trivia_paused:
+                if (trivia_settings().general.player_permissions == 'everyone' or
+                        trivia_settings().general.player_permissions in
                         user_permissions):
-                    global question_start_time
-                    global question_expiry_time
-                    if len(current_questions_list) == 0:
+                    if len(state.current_questions_list) == 0:
                         self.log("!Trivia: Called to start new question, but no questions exist.",
                                  LoggingLevel.str_to_int.get("Warn"))
-                        if trivia_config['Questions']['enable_game_detection'] == 'True' and \
-                                len(master_questions_list) > 0:
-                            await context.send(f'@{context.author.name}: Could not load trivia. '
-                                               f'No questions exist for the current game.')
+                        if trivia_settings().questions.enable_game_detection and \
+                                len(question_bank) > 0:
+                            self.reply(context, f'@{context.author.name}: Could not load trivia. '
+                                                f'No questions exist for the current game.')
                         else:
-                            await context.send(f'@{context.author.name}: Could not load trivia. No questions exist.')
-                    elif current_question_index == -1:
-                        if trivia_config['Questions']['automatically_run_questions'] == 'False' and \
-                                ready_for_next_question:
+                            self.reply(context, f'@{context.author.name}: Could not load trivia. No questions exist.')
+                    elif state.current_question_index == -1:
+                        if not trivia_settings().questions.automatically_run_questions and \
+                                state.ready_for_next_question:
                             self.log("!Trivia: Called to start new question.",
                                      LoggingLevel.str_to_int.get("Debug"))
-                            global next_question_file_update_time
-                            global readiness_notification_time
                             await self.next_question(context)
-                            next_question_file_update_time = time.time()
-                            readiness_notification_time = time.time()
+                            state.next_question_file_update_time = time.time()
+                            state.readiness_notification_time = time.time()
                         else:
-                            await context.send(f'@{context.author.name}: There is no active trivia question. '
-                                               f'The next trivia '
-                                               'question arrives in ' + get_formatted_time_diff(
-                                                question_start_time))
+                            self.reply(context, f'@{context.author.name}: There is no active trivia question. '
+                                                f'The next trivia '
+                                                'question arrives in ' + get_formatted_time_diff(
+                                                 state.question_start_time))
                     else:
-                        await context.send(f'{current_questions_list[current_question_index].as_string()}')
-                        await context.send(f'@{context.author.name}: Time remaining on current question: ' +
-                                           get_formatted_time_diff(question_expiry_time))
+                        self.reply(context, f'{state.current_question.as_string()}')
+                        self.reply(context, f'@{context.author.name}: Time remaining on current question: ' +
+                                            get_formatted_time_diff(state.question_expiry_time))
                 else:
-                    await context.send(f'Sorry, @{context.author.name}, you do not have the '
-                                       f'required permissions to '
-                                       f'use that command.')
+                    self.reply(context, f'Sorry, @{context.author.name}, you do not have the '
+                                        f'required permissions to '
+                                        f'use that command.')
             else:
                 subcommand = args.pop(0).lower().strip()
 
                 if subcommand in ['start', 'unpause']:
-                    if trivia_config['General']['admin_permissions'].lower() in user_permissions:
-                        if trivia_paused:
-                            trivia_paused = False
+                    if trivia_settings().general.admin_permissions in user_permissions:
+                        if state.trivia_paused:
+                            state.trivia_paused = False
                             self.log("Trivia started with Command.", LoggingLevel.str_to_int.get("Info"))
-                            await context.send("Trivia: Trivia started.")
+                            self.reply(context, "Trivia: Trivia started.")
                         else:
-                            await context.send('Trivia: Trivia is already running.')
+                            self.reply(context, 'Trivia: Trivia is already running.')
                     else:
-                        await context.send(f'Sorry, @{context.author.name}, you do not have the '
-                                           f'required permissions to '
-                                           f'use that command.')
+                        self.reply(context, f'Sorry, @{context.author.name}, you do not have the '
+                                            f'required permissions to '
+                                            f'use that command.')
                 elif subcommand in ['stop', 'pause']:
-                    if trivia_config['General']['admin_permissions'].lower() in user_permissions:
-                        if not trivia_paused:
-                            trivia_paused = True
+                    if trivia_settings().general.admin_permissions in user_permissions:
+                        if not state.trivia_paused:
+                            state.trivia_paused = True
                             self.log("Trivia paused with Command.", LoggingLevel.str_to_int.get("Info"))
-                            await context.send(f'@{context.author.name}: Trivia paused.')
+                            self.reply(context, f'@{context.author.name}: Trivia paused.')
                         else:
-                            await context.send(f'@{context.author.name}: Trivia is already paused.')
+                            self.reply(context, f'@{context.author.name}: Trivia is already paused.')
                     else:
-                        await context.send(f'Sorry, @{context.author.name}, you do not have the '
-                                           f'required permissions to '
-                                           f'use that command.')
-                elif subcommand == 'load' and not trivia_paused:
-                    if trivia_config['General']['admin_permissions'].lower() in user_permissions:
-                        if len(current_questions_list) == 0:
-                            if trivia_config['Questions']['enable_game_detection'] == 'True' and \
-                                    len(master_questions_list) > 0:
-                                await context.send(f'@{context.author.name}: No applicable questions exist for the '
-                                                   f'currently detected game.')
+                        self.reply(context, f'Sorry, @{context.author.name}, you do not have the '
+                                            f'required permissions to '
+                                            f'use that command.')
+                elif subcommand == 'load' and not state.trivia_paused:
+                    if trivia_settings().general.admin_permissions in user_permissions:
+                        if len(state.current_questions_list) == 0:
+                            if trivia_settings().questions.enable_game_detection and \
+                                    len(question_bank) > 0:
+                                self.reply(context, f'@{context.author.name}: No applicable questions exist for the '
+                                                    f'currently detected game.')
                             else:
-                                await context.send(f'@{context.author.name}: There are no questions available.')
+                                self.reply(context, f'@{context.author.name}: There are no questions available.')
                             return
                         if len(args) == 0:
                             await self.next_question(context)
@@ -314,105 +506,110 @@ class TriviaCog(commands.Cog):
                                 question_index = int(args[0].strip()) - 1
                                 if question_index < 0:
                                     raise ValueError
-                                if question_index > len(current_questions_list) - 1:
+                                if question_index > len(state.current_questions_list) - 1:
                                     raise IndexError
                                 await self.next_question(context, question_index)
 
                             except ValueError:
-                                await context.send(f'@{context.author.name}: The value supplied to the load '
-                                                   'subcommand must be a positive integer.')
+                                self.reply(context, f'@{context.author.name}: The value supplied to the load '
+                                                    'subcommand must be a positive integer.')
                             except IndexError:
-                                await context.send(f'@{context.author.name}: The supplied index was too high. '
-                                                   f'Please supply a '
-                                                   f'question index up to {str(len(current_questions_list))}.')
+                                self.reply(context, f'@{context.author.name}: The supplied index was too high. '
+                                                    f'Please supply a '
+                                                    f'question index up to {str(len(state.current_questions_list))}.')
                     else:
-                        await context.send(f'Sorry, {context.author.name}, you do not have the '
-                                           f'required permissions to '
-                                           f'use that command.')
+                        self.reply(context, f'Sorry, {context.author.name}, you do not have the '
+                                            f'required permissions to '
+                                            f'use that command.')
                 elif subcommand == 'game':
-                    if trivia_config['General']['admin_permissions'].lower() in user_permissions:
+                    if trivia_settings().general.admin_permissions in user_permissions:
                         if len(args) == 0:
-                            await context.send(f'@{context.author.name}: The currently active '
-                                               f'game is "{current_game}".')
+                            self.reply(context, f'@{context.author.name}: The currently active '
+                                                f'game is "{state.current_game}".')
                         else:
                             game_command = args.pop(0)
-                            if game_command == 'detect' and not trivia_paused:
-                                if current_channel.game_name.lower() == current_game.lower():
-                                    await context.send(f'@{context.author.name}: Twitch reports the current game as "'
-                                                       f'{current_channel.game_name.lower()}". '
-                                                       f'Currently showing trivia for "{current_game.lower()}".')
+                            if game_command == 'detect' and not state.trivia_paused:
+                                current_channel = await self.bot.channel_state.refresh(context.channel.name)
+                                if current_channel.game_name.lower() == state.current_game.lower():
+                                    self.reply(context, f'@{context.author.name}: Twitch reports the current game as "'
+                                                        f'{current_channel.game_name.lower()}". '
+                                                        f'Currently showing trivia for "{state.current_game.lower()}".')
                                 else:
-                                    previous_game = current_game.lower()
-                                    current_game = current_channel.game_name.lower()
-                                    await context.send(f'@{context.author.name}: Twitch reports the current game as "'
-                                                       f'{current_channel.game_name.lower()}. '
-                                                       f'Trivia game has been updated from "{previous_game.lower()}" '
-                                                       f'to "{current_game.lower()}".')
-                                self.load_trivia()
-
-                            elif game_command.startswith('set:') and not trivia_paused:
-                                global game_detection_override
+                                    previous_game = state.current_game.lower()
+                                    state.current_game = current_channel.game_name.lower()
+                                    self.reply(context, f'@{context.author.name}: Twitch reports the current game as "'
+                                                        f'{current_channel.game_name.lower()}. '
+                                                        f'Trivia game has been updated from "{previous_game.lower()}" '
+                                                        f'to "{state.current_game.lower()}".')
+                                self.select_questions(state)
+
+                            elif game_command.startswith('set:') and not state.trivia_paused:
                                 new_game = game_command[len('set:'):]
                                 if len(new_game) == 0:
-                                    game_detection_override = None
-                                    await context.send(f'@{context.author.name}: Game detection override disabled.')
+                                    state.game_detection_override = None
+                                    self.reply(context, f'@{context.author.name}: Game detection override disabled.')
                                 else:
-                                    game_detection_override = new_game.lower().strip()
-                                    await context.send(f'@{context.author.name}: Game detection override updated to '
-                                                       f'{game_detection_override}.')
-                                self.load_trivia()
+                                    state.game_detection_override = new_game.lower().strip()
+                                    self.reply(context, f'@{context.author.name}: Game detection override updated to '
+                                                        f'{state.game_detection_override}.')
+                                self.select_questions(state)
                     else:
-                        await context.send(f'Trivia: Sorry, {context.author.name}, you do not have the '
-                                           f'required permissions to '
-                                           f'use that command.')
+                        self.reply(context, f'Trivia: Sorry, {context.author.name}, you do not have the '
+                                            f'required permissions to '
+                                            f'use that command.')
                 elif subcommand == 'count':
-                    if trivia_config['Questions']['enable_game_detection'] == 'True':
-                        await context.send(f'@{context.author.name}: There are {str(len(current_questions_list))} '
-                                           f'questions from '
-                                           f'the current game and {str(len(master_questions_list))} questions total.')
+                    if trivia_settings().questions.enable_game_detection:
+                        if len(args) > 0:
+                            counted_game = ' '.join(args)
+                        else:
+                            counted_game = self.get_active_game(state)
+                        self.reply(context, f'@{context.author.name}: There are '
+                                            f'{str(question_bank.count(counted_game))} '
+                                            f'questions from '
+                                            f'{"the current game" if len(args) == 0 else counted_game} and '
+                                            f'{str(len(question_bank))} questions total.')
                     else:
-                        await context.send(f'@{context.author.name}: There are '
-                                           f'{str(len(master_questions_list))} questions total.')
+                        self.reply(context, f'@{context.author.name}: There are '
+                                            f'{str(len(question_bank))} questions total.')
                 elif subcommand == 'answers':
-                    if trivia_config['General']['admin_permissions'].lower() in user_permissions:
+                    if trivia_settings().general.admin_permissions in user_permissions:
                         if len(args) == 0:
-                            if current_question_index == -1:
-                                await context.send(f'@{context.author.name}: There is no question currently loaded.')
+                            if state.current_question_index == -1:
+                                self.reply(context, f'@{context.author.name}: There is no question currently loaded.')
                             else:
-                                await context.send(f'@{context.author.name}: The answers to the '
-                                                   f'current question are: ' +
-                                                   ', '.join(current_questions_list[current_question_index]
-                                                             .get_answers()) + '.')
+                                self.reply(context, f'@{context.author.name}: The answers to the '
+                                                    f'current question are: ' +
+                                                    ', '.join(state.current_question.get_answers()) + '.')
                         else:
                             try:
                                 question_index = int(args[0])
                                 if question_index < 0:
                                     raise ValueError
-                                if question_index > len(current_questions_list) - 1:
+                                if question_index > len(state.current_questions_list) - 1:
                                     raise IndexError
-                                await context.send(f'@{context.author.name}: The answers to that question are: ' +
-                                                   ', '.join(current_questions_list[question_index]
-                                                             .get_answers()) + '.')
+                                self.reply(context, f'@{context.author.name}: The answers to that question are: ' +
+                                                    ', '.join(state.current_questions_list[question_index]
+                                                              .get_answers()) + '.')
                             except ValueError:
-                                await context.send(f'@{context.author.name}: The value supplied to the load '
-                                                   'subcommand must be a positive integer.')
+                                self.reply(context, f'@{context.author.name}: The value supplied to the load '
+                                                    'subcommand must be a positive integer.')
                             except IndexError:
-                                await context.send(f'@{context.author.name}: The supplied index was too high. '
-                                                   f'Please supply a '
-                                                   f'question index up to {str(len(current_questions_list) - 1)}.')
+                                self.reply(context, f'@{context.author.name}: The supplied index was too high. '
+                                                    f'Please supply a question index up to '
+                                                    f'{str(len(state.current_questions_list) - 1)}.')
                     else:
-                        await context.send(f'Trivia: Sorry, {context.author.name}, you do not have the '
-                                           f'required permissions to '
-                                           f'use that command.')
+                        self.reply(context, f'Trivia: Sorry, {context.author.name}, you do not have the '
+                                            f'required permissions to '
+                                            f'use that command.')
                 elif subcommand == 'add':
-                    if trivia_config['General']['admin_permissions'].lower() in user_permissions:
+                    if trivia_settings().general.admin_permissions in user_permissions:
                         if len(args) == 0:
-                            await context.send(f'@{context.author.name}: Syntax for add command is "'
-                                               f'{trivia_config["General"]["command_prefix"]} '
-                                               f'add (game:<name of game>|) '
-                                               f'(points:<positive integer number of points>|) '
-                                               f'question:<question>| '
-                                               f'answers:<comma-separated list of string answers>"')
+                            self.reply(context, f'@{context.author.name}: Syntax for add command is "'
+                                                f'{trivia_settings().general.command_prefix} '
+                                                f'add (game:<name of game>|) '
+                                                f'(points:<positive integer number of points>|) '
+                                                f'question:<question>| '
+                                                f'answers:<comma-separated list of string answers>"')
                         else:
                             args = ' '.join(args).split('|')
                             new_points = None
@@ -427,9 +624,9 @@ class TriviaCog(commands.Cog):
                                         if new_points < 0:
                                             raise ValueError
                                     except ValueError:
-                                        await context.send(f'@{context.author.name}: The points supplied, '
-                                                           f'{new_points}, were not a positive '
-                                                           f'integer.')
+                                        self.reply(context, f'@{context.author.name}: The points supplied, '
+                                                            f'{new_points}, were not a positive '
+                                                            f'integer.')
                                         return
                                 elif arg.lower().startswith('game:'):
                                     new_game = arg[len('game:'):].strip()
@@ -440,95 +637,83 @@ class TriviaCog(commands.Cog):
                                         [answer.strip() for answer in arg[len('answers:'):].strip().split(',')]
 
                             if new_question_text is None or new_answers is None:
-                                await context.send(
-                                    f'@{context.author.name}: Syntax for add command is "'
-                                    f'{trivia_config["General"]["command_prefix"]} '
-                                    f'add (game:<name of game>|) '
-                                    f'(points:<positive integer number of points>|) '
-                                    f'question:<question>| '
-                                    f'answers:<comma-separated list of string answers>"')
+                                self.reply(context, f'@{context.author.name}: Syntax for add command is "'
+                                                    f'{trivia_settings().general.command_prefix} '
+                                                    f'add (game:<name of game>|) '
+                                                    f'(points:<positive integer number of points>|) '
+                                                    f'question:<question>| '
+                                                    f'answers:<comma-separated list of string answers>"')
                                 return
 
                             new_question = Question(
-                                points=new_points if new_points is not None else 0,
-                                game=new_game if new_game is not None else (current_game if current_game else 'none'),
+                                points=new_points if new_points is not None else (
+                                    trivia_settings().rewards.default_loyalty_points_value),
+                                game=new_game if new_game is not None else (
+                                    state.current_game if state.current_game else 'none'),
                                 question=new_question_text,
                                 answers=new_answers
                             )
-                            master_questions_list.append(new_question)
-                            if (trivia_config['Questions']['enable_game_detection'] == 'True' and
-                                    current_game == new_question.get_game()):
-                                current_questions_list.append(new_question)
-                            if self.save_trivia():
-                                await context.send(f'@{context.author.name}: Question added.')
+                            if self.change_questions(question_bank.add, new_question):
+                                self.reply(context, f'@{context.author.name}: Question added.')
                     else:
-                        await context.send(f'Trivia: Sorry, {context.author.name}, you do not have the '
-                                           f'required permissions to '
-                                           f'use that command.')
+                        self.reply(context, f'Trivia: Sorry, {context.author.name}, you do not have the '
+                                            f'required permissions to '
+                                            f'use that command.')
                 elif subcommand == 'remove':
-                    if trivia_config['General']['admin_permissions'].lower() in user_permissions:
+                    if trivia_settings().general.admin_permissions in user_permissions:
                         if len(args) == 0:
-                            await context.send(f'@{context.author.name}: Syntax for remove command is '
-                                               f'"{trivia_config["General"]["command_prefix"]} '
-                                               f'remove <index>".')
+                            self.reply(context, f'@{context.author.name}: Syntax for remove command is '
+                                                f'"{trivia_settings().general.command_prefix} '
+                                                f'remove <index>".')
                         else:
                             try:
                                 question_index = int(args[0]) - 1
                                 if question_index < 0:
                                     raise ValueError
-                                if question_index > len(current_questions_list) - 1:
+                                if question_index > len(state.current_questions_list) - 1:
                                     raise IndexError
 
-                                old_question = current_questions_list.pop(question_index)
-                                try:
-                                    master_questions_list.remove(old_question)
-                                    if self.save_trivia():
-                                        await context.send(f'@{context.author.name}: Question removed.')
-                                except ValueError:
-                                    await context.send(f'@{context.author.name}: There was an unexpected '
-                                                       f'error removing the '
-                                                       f'question at index {str(question_index)}: The question '
-                                                       f'was not found in the list of questions.')
-                                    self.log(f'Failed to remove question from master questions list: '
-                                             f'{old_question.as_string()}.',
-                                             log_level=LoggingLevel.str_to_int.get("Error"))
+                                if self.change_questions(question_bank.remove, state.current_questions_list,
+                                                         question_index):
+                                    self.bot.update_chat_filter(self)
+                                    self.reply(context, f'@{context.author.name}: Question removed.')
                             except ValueError:
-                                await context.send(f'@{context.author.name}: The index value supplied '
-                                                   f'must be a positive integer.')
+                                self.reply(context, f'@{context.author.name}: The index value supplied '
+                                                    f'must be a positive integer.')
                             except IndexError:
-                                await context.send(f'@{context.author.name}: The supplied index was too high. '
-                                                   f'Please supply a '
-                                                   f'question index up to {str(len(current_questions_list) - 1)}.')
+                                self.reply(context, f'@{context.author.name}: The supplied index was too high. '
+                                                    f'Please supply a question index up to '
+                                                    f'{str(len(state.current_questions_list) - 1)}.')
 
                     else:
-                        await context.send(f'Trivia: Sorry, {context.author.name}, you do not have the '
-                                           f'required permissions to '
-                                           f'use that command.')
+                        self.reply(context, f'Trivia: Sorry, {context.author.name}, you do not have the '
+                                            f'required permissions to '
+                                            f'use that command.')
                 elif subcommand == 'modify':
-                    if trivia_config['General']['admin_permissions'].lower() in user_permissions:
+                    if trivia_settings().general.admin_permissions in user_permissions:
                         if len(args) < 3:
-                            await context.send(f'@{context.author.name}: Syntax for add command is "'
-                                               f'{trivia_config["General"]["command_prefix"]} '
-                                               f'modify <question_index>|<game/points/question/answers/'
-                                               f'addanswer/delanswer|<new value(s)>."')
+                            self.reply(context, f'@{context.author.name}: Syntax for add command is "'
+                                                f'{trivia_settings().general.command_prefix} '
+                                                f'modify <question_index>|<game/points/question/answers/'
+                                                f'addanswer/delanswer|<new value(s)>."')
                         else:
                             try:
                                 question_index = int(args[0]) - 1
                                 if question_index < 0:
                                     raise ValueError
-                                if question_index > len(current_questions_list) - 1:
+                                if question_index > len(state.current_questions_list) - 1:
                                     raise IndexError
 
                                 modification_type = args[1].lower()
                                 valid_modifications_types = ['game', 'points', 'question',
                                                              'answers', 'addanswer', 'delanswer']
                                 if modification_type not in valid_modifications_types:
-                                    await context.send(f'@{context.author.name}: The second argument for the modify '
-                                                       f'subcommand must '
-                                                       f'be one of {str(valid_modifications_types)}.')
+                                    self.reply(context, f'@{context.author.name}: The second argument for the modify '
+                                                        f'subcommand must '
+                                                        f'be one of {str(valid_modifications_types)}.')
                                     return
 
-                                question_to_modify = current_questions_list[question_index]
+                                question_to_modify = state.current_questions_list[question_index]
                                 new_value = args[2]
                                 if modification_type == 'game':
                                     question_to_modify.set_game(new_value)
@@ -539,8 +724,8 @@ class TriviaCog(commands.Cog):
                                             raise ValueError
                                         question_to_modify.set_points(new_value)
                                     except ValueError:
-                                        await context.send(f'@{context.author.name}: The new points value must '
-                                                           f'be a positive integer.')
+                                        self.reply(context, f'@{context.author.name}: The new points value must '
+                                                            f'be a positive integer.')
                                         return
                                 elif modification_type == 'question':
                                     question_to_modify.set_question(new_value)
@@ -552,258 +737,296 @@ class TriviaCog(commands.Cog):
                                 elif modification_type == 'delanswer':
                                     question_to_modify.remove_answer(new_value)
 
-                                if self.save_trivia():
-                                    await context.send(f'@{context.author.name}: Question modified.')
+                                if self.change_questions(question_bank.update, state.current_questions_list,
+                                                         question_index, question_to_modify):
+                                    self.bot.update_chat_filter(self)
+                                    self.reply(context, f'@{context.author.name}: Question modified.')
 
                             except ValueError:
-                                await context.send(f'@{context.author.name}: The index value supplied '
-                                                   f'must be a positive integer.')
+                                self.reply(context, f'@{context.author.name}: The index value supplied '
+                                                    f'must be a positive integer.')
                             except IndexError:
-                                await context.send(f'@{context.author.name}: The supplied index was too high. '
-                                                   f'Please supply a '
-                                                   f'question index up to {str(len(current_questions_list) - 1)}.')
+                                self.reply(context, f'@{context.author.name}: The supplied index was too high. '
+                                                    f'Please supply a question index up to '
+                                                    f'{str(len(state.current_questions_list) - 1)}.')
 
                     else:
-                        await context.send(f'Trivia: Sorry, {context.author.name}, you do not have the '
-                                           f'required permissions to '
-                                           f'use that command.')
+                        self.reply(context, f'Trivia: Sorry, {context.author.name}, you do not have the '
+                                            f'required permissions to '
+                                            f'use that command.')
         else:
             # Don't check for answers if trivia is paused, there is no active question, or if the user does
             #   not have permissions
-            if (not trivia_paused and not current_question_index == -1 and
-                    (trivia_config['General']['player_permissions'].lower() == 'everyone' or
-                     trivia_config['General']['player_permissions'].lower() in user_permissions)):
+            if not (not state.trivia_paused and not state.current_question_index == -1 and
+                    (trivia_settings().general.player_permissions == 'everyone' or
+                     trivia_settings().general.player_permissions in user_permissions)):
                 return
 
             # Process chat for possible winning answers
-            await self.check_for_match(context)
+            await self.check_for_match(context, parsed.normalized_text)
 
     async def next_question(self, messageable: Channel | commands.Context, question_index=-1):
-        global current_questions_list
-        global question_start_time
 
         if isinstance(messageable, commands.Context):
-            current_channel = await self.bot.fetch_channel(messageable.channel.name)
+            current_channel = await self.bot.channel_state.get(messageable.channel.name)
         elif isinstance(messageable, Channel):
-            current_channel = await self.bot.fetch_channel(messageable.name)
+            current_channel = await self.bot.channel_state.get(messageable.name)
         else:
             raise RuntimeError()
+        state = self.get_channel_state(current_channel.name)
 
         # Check to see if questions exist
-        if len(current_questions_list) > 0:
-            global current_question_index
-            global question_expiry_time
-            global ready_for_next_question
-            global current_game
-            global game_detection_override
+        if len(state.current_questions_list) > 0:
 
-            if (trivia_config['Questions']['enable_game_detection'] == 'True' and not
-                    game_detection_override):
-                current_game = current_channel.game_name.lower()
+            if (trivia_settings().questions.enable_game_detection and not
+                    state.game_detection_override):
+                state.current_game = current_channel.game_name.lower()
 
-            # Log the previous question to prevent duplicates
-            previous_question_index = current_question_index
-
-            # Start up a new question, avoiding using the same question twice in a row if possible
+            # Start up a new question, drawn from the deck unless a specific question was requested
+            deck = question_decks.get(state.current_deck_key, len(state.current_questions_list))
             if question_index == -1:
-                if previous_question_index != -1 and len(current_questions_list) > 1:
-                    while True:
-                        current_question_index = randint(a=0, b=len(current_questions_list))
-                        if current_question_index != previous_question_index:
-                            break
-                else:
-                    current_question_index = randint(a=0, b=len(current_questions_list))
+                state.current_question_index = deck.draw(self.get_question_weight(state, deck))
             else:
-                current_question_index = question_index
+                state.current_question_index = question_index
+            state.current_question = state.current_questions_list[state.current_question_index]
+            deck.record_asked(state.current_question.get_question())
+            self.save_deck(state.current_deck_key)
+            self.bot.update_chat_filter(self)
 
             # Set the question expiration time
-            question_expiry_time = (time.time() +
-                                    (int(trivia_config['Questions']['duration_in_minutes']) * 60))
-            self.log("NextQuestion: Next Question at " + get_formatted_time_diff(question_expiry_time) + ".",
+            state.question_expiry_time = (time.time() +
+                                          (trivia_settings().questions.duration_in_minutes * 60))
+            self.log("NextQuestion: Next Question at " + get_formatted_time_diff(state.question_expiry_time) + ".",
                      LoggingLevel.str_to_int.get("Debug"))
-            ready_for_next_question = False
-            await messageable.send(f'Question {str(int(current_question_index) + 1)} '
-                                   f'{current_questions_list[current_question_index].as_string()}')
+            state.ready_for_next_question = False
+            self.reply(messageable, f'Question {str(int(state.current_question_index) + 1)} '
+                                    f'{state.current_question.as_string()}')
         else:
             # If questions do not exist, try again every 60 seconds
-            global question_start_time
             self.log("NextQuestion: No questions exist. Trying again in 60 seconds.",
                      LoggingLevel.str_to_int.get("Warn"))
-            question_start_time = time.time() + 60
+            state.question_start_time = time.time() + 60
 
-    @staticmethod
-    async def end_question(messageable: Channel | commands.Context):
-        global current_question_index
-        global question_start_time
-        global winners
+    async def end_question(self, messageable: Channel | commands.Context):
 
         if isinstance(messageable, Channel):
             current_channel = messageable
+            state = self.get_channel_state(messageable.name)
         elif isinstance(messageable, commands.Context):
             current_channel = messageable
+            state = self.get_channel_state(messageable.channel.name)
         else:
             raise RuntimeError()
 
         # First, check to see if there is an active question. If there is no active question, nothing needs to be done.
-        if not current_question_index == -1:
-            winner_names = list(winners.values())
+        if not state.current_question_index == -1:
+            winner_names = list(state.winners.values())
+            current_question = state.current_question
+            if winner_names:
+                # Winners per round is what the engagement weighting prefers. Saved along with the next draw.
+                question_decks.get(state.current_deck_key, len(state.current_questions_list)).record_winners(
+                    current_question.get_question(), len(winner_names))
+                self.settle_round(state, current_question)
             # Post message rewarding users
             if len(winner_names) > 2:
-                await current_channel.send(f'Trivia: {", ".join(winner_names[:-1]) + ", and " + str(winner_names[-1])} '
-                                           f'answered correctly!')
+                self.reply(current_channel, f'Trivia: {", ".join(winner_names[:-1])}, and {winner_names[-1]} '
+                                            f'answered correctly!')
             elif len(winner_names) == 2:
-                await current_channel.send(f'Trivia: {" and ".join(winner_names)} answered correctly!')
+                self.reply(current_channel, f'Trivia: {" and ".join(winner_names)} answered correctly!')
             elif winner_names:
-                await current_channel.send(f'Trivia: {winner_names[0]} answered correctly!')
+                self.reply(current_channel, f'Trivia: {winner_names[0]} answered correctly!')
             else:
                 # No winners were detected. Display expiration message.
-                await current_channel.send(f'Trivia: Nobody answered the previous question. The answers were '
-                                           f'{str(current_questions_list[current_question_index].get_answers())}')
-            winners = {}
+                self.reply(current_channel, f'Trivia: Nobody answered the previous question. The answers were '
+                                            f'{str(current_question.get_answers())}')
+            state.winners = {}
+            state.grace_period_winners = set()
+            state.grace_period_set = False
 
         # End current question and set the next question's start time.
-        current_question_index = -1
-        question_start_time = (time.time() +
-                               (int(trivia_config['Questions']['cooldown_between_questions_in_minutes'])
-                                * 60))
-
-        global ready_for_next_question
-        ready_for_next_question = False
-
-    async def check_for_match(self, context: commands.Context):
-        global current_question_index
-        global winners
-        try:
-            current_question = current_questions_list[current_question_index]
-            current_answers = current_question.get_answers()
-            for answer in current_answers:
-                if context.message.content.lower().strip() == answer.lower().strip():
-                    # We have a match. Add them to the dictionary of correct users,
-                    #   then check to see if the question needs to be ended.
-                    winners[context.author.id] = context.author.name
-                    self.log("CheckForMatch: Match detected between answer " + answer + " and message "
-                             + context.message.content + ". User " + context.author.name +
-                             " added to the list of correct users.",
-                             LoggingLevel.str_to_int.get("Debug"))
-                    # Check to see if the maximum number of winners has been met
-                    if 0 < int(trivia_config['Rewards']['number_of_winners']) <= len(winners):
-                        self.log("CheckForMatch: Number of winners achieved. Ending question.",
-                                 LoggingLevel.str_to_int.get("Debug"))
-                        # If it has, immediately end the question
-                        await self.end_question(context)
-                    else:
-                        # If the maximum number of winners has not been met, but the grace period is being
-                        #   used, apply the grace period to end the question if it has not already been applied
-                        if trivia_config['Rewards']['use_grace_period'] == 'True':
-                            global question_expiry_time
-                            global grace_period_set
-                            if not grace_period_set:
-                                question_expiry_time = \
-                                    (time.time() +
-                                     int(trivia_config['Rewards']['multiple_winner_grace_period_in_seconds']))
-                                grace_period_set = True
-        except IndexError:
-            current_question_index = -1
+        state.current_question_index = -1
+        state.current_question = None
+        self.bot.update_chat_filter(self)
+        state.question_start_time = (time.time() +
+                                     (trivia_settings().questions.cooldown_between_questions_in_minutes
+                                      * 60))
+
+        state.ready_for_next_question = False
+
+    async def check_for_match(self, context: commands.Context, normalized_message: str):
+        state = self.get_channel_state(context.channel.name)
+        current_question = state.current_question
+        if current_question is not None and current_question.is_correct(normalized_message):
+            # We have a match. Add them to the dictionary of correct users,
+            #   then check to see if the question needs to be ended.
+            if state.grace_period_set and context.author.id not in state.winners:
+                state.grace_period_winners.add(context.author.id)
+            state.winners[context.author.id] = context.author.name
+            self.log("CheckForMatch: Match detected for message "
+                     + context.message.content + ". User " + context.author.name +
+                     " added to the list of correct users.",
+                     LoggingLevel.str_to_int.get("Debug"))
+            # Check to see if the maximum number of winners has been met
+            if 0 < trivia_settings().rewards.number_of_winners <= len(state.winners):
+                self.log("CheckForMatch: Number of winners achieved. Ending question.",
+                         LoggingLevel.str_to_int.get("Debug"))
+                # If it has, immediately end the question
+                await self.end_question(context)
+            else:
+                # If the maximum number of winners has not been met, but the grace period is being
+                #   used, apply the grace period to end the question if it has not already been applied
+                if trivia_settings().rewards.use_grace_period:
+                    if not state.grace_period_set:
+                        state.question_expiry_time = \
+                            (time.time() +
+                             trivia_settings().rewards.multiple_winner_grace_period_in_seconds)
+                        state.grace_period_set = True
+
+    def settle_round(self, state: TriviaChannelState, question: Question):
+        # Credits the round's winners with their payouts as a single loyalty transaction, so a round costs one loyalty
+        #   journal entry however many winners it had. Nothing is credited while the bot's loyalty points are off.
+        if not get_settings().general.lp_enabled:
+            return
+        payouts = round_payouts(int(question.get_points()), list(state.winners), state.grace_period_winners,
+                                trivia_settings().rewards)
+        grants = {user_id: (state.winners[user_id], points) for user_id, points in payouts.items() if points > 0}
+        if not grants:
+            return
+        self.bot.get_channel_loyalty(state.channel_name).credit(grants)
+        self.log(f'SettleRound: Credited {", ".join(f"{name} {str(points)}" for name, points in grants.values())} '
+                 f'{trivia_settings().rewards.loyalty_points_type}.', LoggingLevel.str_to_int.get("Info"))
 
     @staticmethod
     def log(log_string: str, log_level=LoggingLevel.str_to_int.get("All")):
-        if trivia_config['General']['enable_file_logging'] == 'True':
+        if trivia_settings().general.enable_file_logging:
             log_to_file(TRIVIA_LOG_PATH, log_string, log_level)
 
-    def save_trivia(self):
+    def change_questions(self, change, *args):
+        # Applies a change to the question bank, which writes it to the game's question file straight away, then moves
+        #   the question decks along with the questions that were added or removed
         try:
-            games = set()
-            for question in master_questions_list:
-                games.add(question.game.lower())
-
-            for game in games:
-                with open(os.path.join(TRIVIA_DATA_FOLDER, game.lower() + '.json'), 'w') as question_file:
-                    question_file.write(
-                        json.dumps([question.to_json() for question in
-                                    master_questions_list if question.game.lower() == game])
-                    )
-
-            # # if the trivia file does not exist, create it
-            # if not os.path.exists(TRIVIA_DATA_PATH):
-            #     with open(TRIVIA_DATA_PATH, 'w') as outfile:
-            #         outfile.write(json.dumps({}))
-            #     self.log("SaveTrivia: The trivia file was not found. A new one was created.",
-            #              LoggingLevel.str_to_int.get("Warn"))
-            #
-            # # record the questions
-            # with open(TRIVIA_DATA_PATH, 'w') as outfile:
-            #     outfile.seek(0)
-            #     # When writing the Questions to disk, use the Question.toJSON() function
-            #     json.dump(master_questions_list, outfile, indent=4, default=lambda q: q.toJSON())
-            #     outfile.truncate()
-            #     self.log("SaveTrivia: The trivia file was successfully updated.",
-            #               LoggingLevel.str_to_int.get("Debug"))
-
-            return True
-
+            question_changes = change(*args)
         except IOError as e:
             self.log("SaveTrivia: Unable to save trivia questions: " + str(e), LoggingLevel.str_to_int.get("Fatal"))
             raise e
+        for question_change in question_changes:
+            self.follow_question_change(question_change)
+        return True
+
+    def follow_question_change(self, question_change: QuestionChange):
+        # The game's deck and the every-question deck both hold the question, each under its own index
+        for deck_key, index in ((question_change.game_key, question_change.game_index),
+                                (ALL_QUESTIONS_DECK, question_change.index)):
+            deck = question_decks.decks.get(deck_key)
+            if deck is None or index > deck.size or (not question_change.added and index == deck.size):
+                # Not drawn from yet, or out of step with the bank. It is resized when it is next drawn from.
+                continue
+            if question_change.added:
+                deck.insert(index)
+            else:
+                deck.remove(index)
+            self.save_deck(deck_key)
 
     def load_trivia(self):
-        # Check if the length of the master questions list is 0. If it is, we need to load questions.
-        global master_questions_list
-        global current_questions_list
-        global current_question_index
-
-        # If there is a question currently running, end that question.
-        if current_question_index != -1:
-            global question_start_time
-            current_question_index = -1
-            question_start_time = (time.time() +
-                                   (int(trivia_config['Questions']['cooldown_between_questions_in_minutes'])
-                                    * 5))
-
-        os.makedirs(TRIVIA_DATA_FOLDER, exist_ok=True)
+        # Import any question files still in the old JSON format into the question bank, find every game's question
+        #   file, then select the active questions. Questions themselves are only read as they are asked.
         for root, dirs, files in os.walk(TRIVIA_DATA_FOLDER):
             for file in files:
                 if file.endswith('.json'):
+                    file_path = os.path.join(root, file)
                     try:
-                        with open(os.path.join(root, file), 'r') as infile:
+                        with open(file_path, 'r') as infile:
                             object_data = json.load(infile)  # Load the json data
 
-                        # For each object/question in the object_data, create new questions
-                        #   and feed them to the master_questions_list
-                        # If game detection is off, feed them to the g
-                        global current_questions_list
-                        global current_game
-                        for question in object_data:
-                            new_question = Question(game=question["Game"],
-                                                    points=question["Points"],
-                                                    question=question["Question"],
-                                                    answers=question["Answers"])
-                            master_questions_list.append(new_question)
+                        # Move each object/question in the object_data into its game's question file. The file is
+                        #   set aside first and put back if the import fails, so it is never imported twice.
+                        records = [{"Game": question["Game"],
+                                    "Points": question["Points"],
+                                    "Question": question["Question"],
+                                    "Answers": question["Answers"]} for question in object_data]
+                        os.replace(file_path, file_path + '.imported')
+                        try:
+                            question_bank.import_records(records)
+                        except OSError:
+                            os.replace(file_path + '.imported', file_path)
+                            raise
+                        self.log(f'LoadTrivia: Imported {str(len(object_data))} questions from {file} into the '
+                                 f'question bank.', LoggingLevel.str_to_int.get("Info"))
                     except ValueError:
                         self.log(f'LoadTrivia: Question file {file} exists, but contained no data.',
                                  LoggingLevel.str_to_int.get("Warn"))
-        else:
+                    except (KeyError, TypeError):
+                        self.log(f'LoadTrivia: Question file {file} contains a question without a Game, Points, '
+                                 f'Question or Answers.', LoggingLevel.str_to_int.get("Warn"))
+                    except OSError as e:
+                        # Nothing from the file was imported, so it is tried again on the next load
+                        self.log(f'LoadTrivia: Question file {file} could not be imported: {str(e)}',
+                                 LoggingLevel.str_to_int.get("Warn"))
+        question_bank.load()
+        question_decks.load()
+        if question_bank.game_count() == 0:
             self.log("LoadTrivia: No questions files exist in the questions directory.",
                      LoggingLevel.str_to_int.get("Warn"))
 
-        del current_questions_list[:]
-        # If the length of the master questions list is greater than 0,
-        #   we can check if the user is using game detection
-        if trivia_config['Questions']['enable_game_detection'] == 'True':
-            global current_game
-            # User is using game detection. Iterate over the master list to get games matching their current game.
-            for i in range(len(master_questions_list)):
-                if master_questions_list[i].get_game() == current_game:
-                    current_questions_list.append(master_questions_list[i])
+        for state in self.channel_states.values():
+            self.select_questions(state)
+
+    def select_questions(self, state: TriviaChannelState):
+        # Point the current questions list at the active game's questions in the question bank, or at every question
+        #   if game detection is off. No questions are read.
+
+        # If there is a question currently running, end that question.
+        if state.current_question_index != -1:
+            state.current_question_index = -1
+            state.current_question = None
+            state.question_start_time = (time.time() +
+                                         (trivia_settings().questions.cooldown_between_questions_in_minutes
+                                          * 5))
+            self.bot.update_chat_filter(self)
+
+        if trivia_settings().questions.enable_game_detection and self.get_active_game(state):
+            # The active list is the game's entry in the question bank itself, so questions added to or removed from
+            #   the game are reflected without selecting again
+            state.current_questions_list = question_bank.game_questions(self.get_active_game(state))
+            state.current_deck_key = game_key(self.get_active_game(state))
         else:
-            # User is not using game detection. Copy the master list to the current questions list
-            current_questions_list = master_questions_list
+            # User is not using game detection, or no game has been detected yet. Every question in the bank is the
+            #   current questions list
+            state.current_questions_list = question_bank.all_questions
+            state.current_deck_key = ALL_QUESTIONS_DECK
 
-        self.log("LoadTrivia: Questions loaded into master list: " + str(
-            len(master_questions_list)) + ". Questions currently being used: " + str(len(current_questions_list)),
+        self.log("LoadTrivia: Games in the question bank: " + str(question_bank.game_count()) +
+                 ". Questions currently being used: " + str(len(state.current_questions_list)),
                  LoggingLevel.str_to_int.get("Info"))
 
+    @staticmethod
+    def get_active_game(state: TriviaChannelState):
+        return state.game_detection_override if state.game_detection_override else state.current_game
+
+    @staticmethod
+    def get_question_weight(state: TriviaChannelState, deck):
+        # Score of a question index for the configured weighting, or None to draw uniformly
+        questions = state.current_questions_list
+        question_weighting = trivia_settings().questions.question_weighting
+        if question_weighting == 'less_seen':
+            return lambda index: -deck.times_asked(questions[index].get_question())
+        elif question_weighting == 'engagement':
+            return lambda index: deck.engagement(questions[index].get_question())
+        return None
+
+    def save_deck(self, deck_key: str):
+        # Written in the background. Losing a deck's position only means a reshuffle, so a failed write is only logged.
+        question_decks.save(deck_key).add_done_callback(self.log_deck_save_error)
+
+    def log_deck_save_error(self, future):
+        if future.exception() is not None:
+            self.log("SaveDecks: Unable to save question decks: " + str(future.exception()),
+                     LoggingLevel.str_to_int.get("Warn"))
+
+
+def unload():
+    # Called by the bot when this module is replaced by a reloaded version. Closes the question files and waits for
+    #   the pending deck writes.
+    question_bank.close()
+    question_decks.close()
 
-trivia_config.read_dict(DEFAULT_CONFIG)
-if len(trivia_config.read(TRIVIA_CONFIG_PATH)) == 0:
-    with open(TRIVIA_CONFIG_PATH, 'w') as config_file:
-        trivia_config.write(config_file)
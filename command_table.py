@@ -0,0 +1,210 @@
+import ast
+import os
+import re
+from dataclasses import dataclass
+from json import load, dump
+from time import perf_counter
+from twitchio.ext import commands
+from metrics import file_write_seconds
+
+# {name} placeholders that are filled in when a text command responds. Anything else in braces is left as written.
+PLACEHOLDER_PATTERN = re.compile(r'\{(\w+)\}')
+
+NEWCOMMAND_SYNTAX = ('newcommand syntax: "!newcommand command_name, (required_permission_1|required_permission_2|...,) '
+                     'command_return_string". Responses may use {user}, {touser}, {channel} and {args}.')
+
+
+@dataclass(frozen=True)
+class TextCommand:
+    name: str
+    response: str
+    permissions: tuple
+
+    def render(self, context: commands.Context, args: str) -> str:
+        """
+        :param context: Context of the chat message invoking the command
+        :param args: Everything in the message after the command name
+        :return: The response with its placeholders filled in
+        """
+        values = {
+            'user': context.author.name,
+            'touser': args.split(' ', 1)[0].lstrip('@') if args else context.author.name,
+            'channel': context.channel.name,
+            'args': args
+        }
+        return PLACEHOLDER_PATTERN.sub(lambda match: str(values.get(match.group(1), match.group(0))), self.response)
+
+
+def parse_command_definition(content: str) -> TextCommand:
+    """
+    Parses a !newcommand or !modifycommand chat message.
+
+    :param content: The chat message, e.g. "!newcommand discord, Moderator|VIP, Join us at {args}"
+    :raises ValueError: If the message does not follow NEWCOMMAND_SYNTAX. The error text can be sent to chat.
+    :return: The TextCommand the message defines
+    """
+    # The return string might have commas, but as long as we have at least a command name and return value
+    args = str(content).split(',')
+    if not (len(args) > 1):
+        raise ValueError(NEWCOMMAND_SYNTAX)
+    # message_left gets the "!newcommand command_name" part
+    message_left = str(args[0]).split()
+    if not len(message_left) == 2:
+        raise ValueError(NEWCOMMAND_SYNTAX + ' The command name cannot have spaces.')
+
+    if len(args) == 2:
+        permissions = ()
+        response = ','.join(args[1:]).strip()
+    else:
+        permissions = tuple(permission.strip() for permission in args[1].lower().split('|') if permission.strip())
+        response = ','.join(args[2:]).strip()
+    if not response:
+        raise ValueError(NEWCOMMAND_SYNTAX)
+    return TextCommand(name=message_left[1].strip().lower(), response=response, permissions=permissions)
+
+
+def parse_command_cog(source: str, name: str) -> TextCommand | None:
+    """
+    Reads the text command out of a command cog generated by an earlier version of !newcommand, without importing it.
+    The generated class sets self.permissions to a list in __init__ and its execute method ends by sending a fixed
+    string.
+
+    :param source: Source code of the cog module
+    :param name: The command name, which is the module's file name
+    :return: The TextCommand the cog answers with, or None if the module is not an unedited generated command cog
+    """
+    try:
+        module = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return None
+    classes = [node for node in module.body if isinstance(node, ast.ClassDef)]
+    if len(classes) != 1 or classes[0].name != name.title() + 'Cog':
+        return None
+    methods = {node.name: node for node in classes[0].body
+               if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))}
+    if set(methods) != {'__init__', 'execute'} or not isinstance(methods['execute'], ast.AsyncFunctionDef):
+        return None
+
+    attributes = {}
+    for node in methods['__init__'].body:
+        if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Attribute):
+            attributes[node.targets[0].attr] = node.value
+    try:
+        permissions = ast.literal_eval(attributes['permissions'])
+        only_execute_on_command = ast.literal_eval(attributes['only_execute_on_command'])
+    except (KeyError, ValueError):
+        return None
+    if not isinstance(permissions, list) or only_execute_on_command is not True:
+        return None
+
+    # The response is the last argument of the send that ends execute: context.send(...) or bot.queue_message(...)
+    last_statement = methods['execute'].body[-1]
+    call = last_statement.value if isinstance(last_statement, ast.Expr) else None
+    if isinstance(call, ast.Await):
+        call = call.value
+    if not isinstance(call, ast.Call) or not call.args:
+        return None
+    response = call.args[-1]
+    if isinstance(response, ast.JoinedStr):
+        # Braces in the response made the generated f-string evaluate them, so those commands cannot be carried over
+        if not all(isinstance(part, ast.Constant) for part in response.values):
+            return None
+        response = ''.join(part.value for part in response.values)
+    elif isinstance(response, ast.Constant) and isinstance(response.value, str):
+        response = response.value
+    else:
+        return None
+    if not response:
+        return None
+    return TextCommand(name=name.lower(), response=response,
+                       permissions=tuple(str(permission).strip() for permission in permissions
+                                         if str(permission).strip()))
+
+
+class CommandTableCog(commands.Cog, name='CommandTable'):
+    """
+    Built-in cog answering every simple text command from one table, stored in a single JSON file. Each command is
+    registered in the bot's dispatch index pointing at this cog, so a command is found with one dictionary lookup no
+    matter how many exist, and adding, changing or removing one only touches the table.
+    """
+    def __init__(self, bot: commands.Bot, table_path: str):
+        self.bot = bot
+        self.table_path = table_path
+        self.text_commands = {}
+        self.only_execute_on_command = True
+
+    def load(self):
+        """
+        Loads the command table from disk, if one exists, and registers every command with the bot.
+
+        :raises JSONDecodeError: If the table file is corrupt
+        :return: None
+        """
+        if not os.path.exists(self.table_path):
+            return
+        with open(self.table_path, 'r') as table_file:
+            table = load(table_file)
+        for name, record in table.items():
+            self.text_commands[name] = TextCommand(name=name, response=record['response'],
+                                                   permissions=tuple(record.get('permissions', ())))
+            self.register(name)
+
+    def save(self):
+        started = perf_counter()
+        temporary_path = self.table_path + '.tmp'
+        with open(temporary_path, 'w') as table_file:
+            dump({name: {'response': command.response, 'permissions': list(command.permissions)}
+                  for name, command in self.text_commands.items()}, table_file, indent=4, sort_keys=True)
+        os.replace(temporary_path, self.table_path)
+        file_write_seconds.labels('command_table').observe(perf_counter() - started)
+
+    def register(self, name: str):
+        # A cog that already owns the command keeps it
+        self.bot.command_cogs.setdefault(name, self)
+
+    def unregister(self, name: str):
+        if self.bot.command_cogs.get(name) is self:
+            del self.bot.command_cogs[name]
+
+    def is_taken(self, name: str) -> bool:
+        """
+        :param name: A command name, without the prefix
+        :return: True if a cog or one of the bot's own commands already answers to the name
+        """
+        owner = self.bot.command_cogs.get(name)
+        return (owner is not None and owner is not self) or self.bot.get_command(name) is not None
+
+    def set_command(self, command: TextCommand):
+        """
+        Adds or replaces a text command and saves the table.
+
+        :param command: The command
+        :return: None
+        """
+        self.text_commands[command.name] = command
+        self.register(command.name)
+        self.save()
+
+    def delete_command(self, name: str) -> bool:
+        """
+        Removes a text command and saves the table.
+
+        :param name: The command name, without the prefix
+        :return: True if the command existed
+        """
+        if self.text_commands.pop(name, None) is None:
+            return False
+        self.unregister(name)
+        self.save()
+        return True
+
+    async def execute(self, context: commands.Context):
+        parsed = context.parsed
+        command = self.text_commands.get(parsed.command)
+        if command is None:
+            return
+        if command.permissions and parsed.roles.isdisjoint(command.permissions):
+            self.bot.queue_message(context, f'You must have one of the following permissions to use that command, '
+                                            f'{context.author.name}: {", ".join(command.permissions)}.')
+            return
+        self.bot.queue_message(context, command.render(context, parsed.args_text))
@@ -0,0 +1,165 @@
+import os
+from json import load, loads, dumps, JSONDecodeError
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from metrics import file_write_seconds
+
+
+class LoyaltyLedger:
+    """
+    Append-only persistence for loyalty points. Every accrual appends one journal line holding the new balances of
+    the chatters that changed, so an interval costs O(chatters) rather than O(every user ever seen). Once the journal
+    holds compaction_threshold entries it is set aside and merged into the snapshot (loyalty.json) in the background.
+
+    Journal entries are absolute balances rather than deltas, so replaying an entry more than once is harmless. This
+    is what makes it safe to crash at any point during compaction.
+    """
+    def __init__(self, snapshot_path: str, compaction_threshold: int = 50000):
+        self.snapshot_path = snapshot_path
+        self.journal_path = os.path.splitext(snapshot_path)[0] + '_journal.jsonl'
+        self.compacting_journal_path = self.journal_path + '.compacting'
+        self.compaction_threshold = compaction_threshold
+        self.journal_entries = 0
+        # A single worker keeps appends and compactions in order and off the event loop
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='LoyaltyLedger')
+
+    def load(self) -> dict:
+        """
+        Rebuilds the loyalty points dictionary from the snapshot followed by any journals that have not been compacted.
+
+        :raises JSONDecodeError: If the snapshot file is corrupted
+        :return: Dictionary of user id -> {'loyalty_points': int, 'username': str}
+        """
+        loyalty_points = self._read_snapshot()
+        self.journal_entries = self._replay(self.compacting_journal_path, loyalty_points)
+        self.journal_entries += self._replay(self.journal_path, loyalty_points)
+        return loyalty_points
+
+    def record(self, balances: dict):
+        """
+        Queues the new balances of the users that changed to be appended to the journal, and starts a compaction if
+        the journal has grown past the threshold.
+
+        :param balances: Dictionary of user id -> {'loyalty_points': int, 'username': str} for the changed users only
+        :return: Future that completes once the entry is on disk
+        """
+        self.journal_entries += len(balances)
+        future = self._executor.submit(self._append, dumps(balances))
+        if self.journal_entries >= self.compaction_threshold:
+            self.compact()
+        return future
+
+    def compact(self):
+        """
+        Queues a merge of the journal into the snapshot.
+
+        :return: Future that completes once the snapshot has been rewritten
+        """
+        self.journal_entries = 0
+        return self._executor.submit(self._compact)
+
+    def close(self):
+        """
+        Compacts the journal and waits for every queued write to finish.
+
+        :return: None
+        """
+        self.compact()
+        self._executor.shutdown(wait=True)
+
+    def _read_snapshot(self) -> dict:
+        if not os.path.exists(self.snapshot_path):
+            return {}
+        with open(self.snapshot_path, 'r') as snapshot_file:
+            return load(snapshot_file)
+
+    @staticmethod
+    def _replay(journal_path: str, loyalty_points: dict) -> int:
+        entries = 0
+        if not os.path.exists(journal_path):
+            return entries
+        with open(journal_path, 'r') as journal_file:
+            for line in journal_file:
+                try:
+                    balances = loads(line)
+                except JSONDecodeError:
+                    # A torn final line from an interrupted append. Everything before it is intact.
+                    continue
+                loyalty_points.update(balances)
+                entries += len(balances)
+        return entries
+
+    def _append(self, line: str):
+        started = perf_counter()
+        with open(self.journal_path, 'a') as journal_file:
+            journal_file.write(line + '\n')
+        file_write_seconds.labels('loyalty_journal').observe(perf_counter() - started)
+
+    def _compact(self):
+        if not os.path.exists(self.compacting_journal_path):
+            if not os.path.exists(self.journal_path):
+                return
+            os.replace(self.journal_path, self.compacting_journal_path)
+        started = perf_counter()
+        loyalty_points = self._read_snapshot()
+        self._replay(self.compacting_journal_path, loyalty_points)
+        temporary_path = self.snapshot_path + '.tmp'
+        with open(temporary_path, 'w') as snapshot_file:
+            snapshot_file.write(dumps(loyalty_points))
+        os.replace(temporary_path, self.snapshot_path)
+        os.remove(self.compacting_journal_path)
+        file_write_seconds.labels('loyalty_snapshot').observe(perf_counter() - started)
+
+
+class ChannelLoyalty:
+    """
+    The loyalty points of one channel along with the ledger that persists them.
+    """
+    def __init__(self, channel_name: str, snapshot_path: str, compaction_threshold: int = 50000):
+        self.channel_name = channel_name
+        self.ledger = LoyaltyLedger(snapshot_path, compaction_threshold=compaction_threshold)
+        self.loyalty_points = {}
+
+    def load(self):
+        """
+        Loads the channel's loyalty points from its ledger.
+
+        :raises JSONDecodeError: If the snapshot file is corrupted
+        :return: None
+        """
+        self.loyalty_points = self.ledger.load()
+
+    def get_balance(self, user_id: str) -> int | None:
+        """
+        :param user_id: The Twitch user id
+        :return: The user's loyalty points, or None if the user has no loyalty points in this channel
+        """
+        try:
+            return int(self.loyalty_points[str(user_id)]['loyalty_points'])
+        except (KeyError, ValueError, TypeError):
+            return None
+
+    def credit(self, grants: dict) -> dict:
+        """
+        Adds points to each user's balance and records every changed balance in the ledger as one journal entry.
+
+        :param grants: Dictionary of user id -> (username, points to add)
+        :return: Dictionary of user id -> the user's updated record
+        """
+        changed_balances = {}
+        for user_id, (username, points) in grants.items():
+            user_id = str(user_id)
+            record = self.loyalty_points.get(user_id)
+            if record is None:
+                # User did not exist in the dictionary of loyalty points
+                record = self.loyalty_points[user_id] = {'loyalty_points': 0, 'username': username}
+            try:
+                record['loyalty_points'] = int(record['loyalty_points']) + points
+            except (KeyError, ValueError, TypeError):
+                # User did not have loyalty points
+                record['loyalty_points'] = points
+            record['username'] = username
+            changed_balances[user_id] = record
+        if changed_balances:
+            self.ledger.record(changed_balances)
+        return changed_balances
@@ -0,0 +1,256 @@
+import asyncio
+from time import perf_counter
+
+# Each power of two is split into 2 ** SUB_BUCKET_BITS histogram buckets, so a bucket's bounds are within 12.5% of
+#   any value recorded in it
+SUB_BUCKET_BITS = 3
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+# Histograms record whole microseconds
+UNITS_PER_SECOND = 1000000
+INFINITY_LABEL = 'le="+Inf"'
+
+
+def format_labels(label_names: tuple, label_values: tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{str(value)}"' for name, value in zip(label_names, label_values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class Gauge:
+    __slots__ = ('value', 'function')
+
+    def __init__(self):
+        self.value = 0
+        self.function = None
+
+    def set(self, value: float):
+        self.value = value
+
+    def set_function(self, function):
+        """
+        Reads the gauge's value from a function, which is only called when the metrics are scraped.
+
+        :param function: Function taking no arguments and returning a number
+        :return: None
+        """
+        self.function = function
+
+    def get(self) -> float:
+        return self.function() if self.function is not None else self.value
+
+
+class Histogram:
+    """
+    Log-linear latency histogram in the manner of HdrHistogram. Values are counted in sparse buckets whose width
+    doubles with every power of two, so recording is a few integer operations and a dictionary update no matter how
+    wide the range of values is.
+    """
+    __slots__ = ('counts', 'count', 'sum')
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float):
+        units = int(seconds * UNITS_PER_SECOND)
+        if units < SUB_BUCKETS:
+            index = max(units, 0)
+        else:
+            exponent = units.bit_length() - SUB_BUCKET_BITS - 1
+            index = (exponent + 1) * SUB_BUCKETS + (units >> exponent) - SUB_BUCKETS
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.sum += seconds
+
+    @staticmethod
+    def bucket_upper_bound(index: int) -> float:
+        # Exclusive upper bound of a bucket, in seconds
+        if index < SUB_BUCKETS:
+            return (index + 1) / UNITS_PER_SECOND
+        exponent = index // SUB_BUCKETS - 1
+        return ((index % SUB_BUCKETS + SUB_BUCKETS + 1) << exponent) / UNITS_PER_SECOND
+
+    def percentile(self, fraction: float) -> float:
+        """
+        :param fraction: The percentile as a fraction, e.g. 0.99
+        :return: The upper bound of the bucket holding that percentile, in seconds. 0 if nothing was recorded.
+        """
+        target = fraction * self.count
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return self.bucket_upper_bound(index)
+        return 0.0
+
+
+class MetricFamily:
+    """
+    A named metric and its children, one per combination of label values.
+    """
+    def __init__(self, name: str, documentation: str, metric_type: str, metric_class, label_names: tuple):
+        self.name = name
+        self.documentation = documentation
+        self.metric_type = metric_type
+        self.metric_class = metric_class
+        self.label_names = label_names
+        self.children = {}
+
+    def labels(self, *label_values):
+        """
+        :param label_values: One value per label name, in order
+        :return: The Counter, Gauge or Histogram for those label values, created the first time they are seen
+        """
+        child = self.children.get(label_values)
+        if child is None:
+            child = self.children[label_values] = self.metric_class()
+        return child
+
+    def expose(self) -> list:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.metric_type}']
+        for label_values, child in list(self.children.items()):
+            if self.metric_type == 'histogram':
+                cumulative = 0
+                for index in sorted(child.counts):
+                    cumulative += child.counts[index]
+                    le = f'le="{Histogram.bucket_upper_bound(index):g}"'
+                    lines.append(f'{self.name}_bucket{format_labels(self.label_names, label_values, le)} {cumulative}')
+                lines.append(f'{self.name}_bucket{format_labels(self.label_names, label_values, INFINITY_LABEL)} '
+                             f'{child.count}')
+                lines.append(f'{self.name}_sum{format_labels(self.label_names, label_values)} {child.sum}')
+                lines.append(f'{self.name}_count{format_labels(self.label_names, label_values)} {child.count}')
+            elif self.metric_type == 'gauge':
+                lines.append(f'{self.name}{format_labels(self.label_names, label_values)} {child.get()}')
+            else:
+                lines.append(f'{self.name}{format_labels(self.label_names, label_values)} {child.value}')
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Holds every metric the bot records and renders them in the Prometheus text format. Recording a value is an
+    attribute update on the event loop, and all formatting waits until the metrics are scraped.
+
+    Updates are not locked. Metrics recorded from worker threads can, at worst, lose a single observation to a race.
+    """
+    def __init__(self):
+        self.families = {}
+        self._server = None
+
+    def counter(self, name: str, documentation: str, label_names: tuple = ()) -> MetricFamily:
+        return self._family(name, documentation, 'counter', Counter, label_names)
+
+    def gauge(self, name: str, documentation: str, label_names: tuple = ()) -> MetricFamily:
+        return self._family(name, documentation, 'gauge', Gauge, label_names)
+
+    def histogram(self, name: str, documentation: str, label_names: tuple = ()) -> MetricFamily:
+        return self._family(name, documentation, 'histogram', Histogram, label_names)
+
+    def _family(self, name: str, documentation: str, metric_type: str, metric_class, label_names: tuple):
+        family = self.families.get(name)
+        if family is None:
+            family = self.families[name] = MetricFamily(name, documentation, metric_type, metric_class,
+                                                        tuple(label_names))
+        return family
+
+    def expose(self) -> str:
+        """
+        :return: Every metric in the Prometheus text exposition format
+        """
+        lines = []
+        for family in list(self.families.values()):
+            lines.extend(family.expose())
+        return '\n'.join(lines) + '\n'
+
+    async def start_server(self, port: int, host: str = '127.0.0.1'):
+        """
+        Serves the metrics at http://host:port/metrics for Prometheus to scrape.
+
+        :param port: The port to listen on
+        :param host: The address to listen on. Defaults to the local machine only.
+        :return: None
+        """
+        if self._server is None:
+            self._server = await asyncio.start_server(self._handle_scrape, host, port)
+
+    def stop_server(self):
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+
+    async def _handle_scrape(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await reader.readline()
+            # Skip the request headers
+            while (await reader.readline()).strip():
+                pass
+            parts = request_line.decode('latin-1').split()
+            if len(parts) >= 2 and parts[0] == 'GET' and parts[1].split('?')[0] == '/metrics':
+                status = '200 OK'
+                body = self.expose().encode()
+            else:
+                status = '404 Not Found'
+                body = b'Metrics are served at /metrics\n'
+            writer.write(f'HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n'
+                         f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode() + body)
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+registry = MetricsRegistry()
+
+chat_messages = registry.counter('chat_messages_total', 'Chat messages handled by event_message.').labels()
+cog_execute_seconds = registry.histogram('cog_execute_seconds', 'Time spent in a cog\'s execute method.', ('cog',))
+cog_tick_seconds = registry.histogram('cog_tick_seconds', 'Time spent in a cog\'s tick method, per channel.',
+                                      ('cog',))
+cog_tick_failures = registry.counter('cog_tick_failures_total', 'Ticks of a cog that raised, per channel.', ('cog',))
+helix_requests = registry.counter('helix_requests_total', 'Helix requests made, by endpoint and outcome.',
+                                  ('endpoint', 'outcome'))
+helix_request_seconds = registry.histogram('helix_request_seconds', 'Helix request latency by endpoint.',
+                                           ('endpoint',))
+unresolved_chatters = registry.counter('unresolved_chatters_total',
+                                       'Chatters left without a user id because their Get Users request failed.'
+                                       ).labels()
+loyalty_accrual_seconds = registry.histogram('loyalty_accrual_seconds',
+                                             'Time taken to accrue loyalty points in a channel.').labels()
+file_write_seconds = registry.histogram('file_write_seconds', 'Time taken by file writes, by file kind.', ('file',))
+startup_seconds = registry.gauge('startup_seconds',
+                                 'Time from creating the bot until it was connected and had loaded its cogs.').labels()
+cog_load_seconds = registry.histogram('cog_load_seconds',
+                                      'Time taken to load the cogs directory, or a lazily loaded cog.').labels()
+send_queue_depth = registry.gauge('send_queue_depth', 'Chat messages waiting in the outbound send queue.').labels()
+
+
+async def observe_helix(endpoint: str, awaitable):
+    """
+    Awaits a Helix call, recording its latency and whether it succeeded.
+
+    :param endpoint: The Helix endpoint, e.g. users
+    :param awaitable: The pending call, e.g. bot.fetch_users(...)
+    :return: The call's result
+    """
+    started = perf_counter()
+    try:
+        result = await awaitable
+    except Exception:
+        helix_requests.labels(endpoint, 'error').inc()
+        raise
+    finally:
+        helix_request_seconds.labels(endpoint).observe(perf_counter() - started)
+    helix_requests.labels(endpoint, 'success').inc()
+    return result
@@ -0,0 +1,67 @@
+from bot_configuration import get_roles
+from utils import normalize_text
+
+
+class ParsedMessage:
+    """
+    A chat message parsed once for every cog that receives it. Bot.event_message builds one per message and attaches
+    it to the message's Context as context.parsed. Each field is computed the first time any cog reads it and then
+    shared, so a message is split, normalized and looked up in the permission index at most once no matter how many
+    cogs look at it.
+    """
+    # functools.cached_property takes a lock on every first access, which costs more than most of these fields do
+    __slots__ = ('message', 'content', 'prefix', 'is_command', '_words', '_command', '_args_text', '_normalized_text',
+                 '_roles')
+
+    def __init__(self, message, prefix: str):
+        self.message = message
+        self.content = str(message.content)
+        self.prefix = prefix
+        self.is_command = self.content.startswith(prefix)
+        self._words = None
+        self._command = None
+        self._args_text = None
+        self._normalized_text = None
+        self._roles = None
+
+    @property
+    def words(self) -> list:
+        # Split on single spaces, the way chat commands have always been split. Callers must not modify the list.
+        if self._words is None:
+            self._words = self.content.split(' ')
+        return self._words
+
+    @property
+    def command(self) -> str:
+        """
+        The lowercase command name without the prefix, e.g. trivia for "!trivia count". Empty if the message is not a
+        command.
+        """
+        if self._command is None:
+            self._command = self.content.split(' ', 1)[0][len(self.prefix):].lower() if self.is_command else ''
+        return self._command
+
+    @property
+    def args(self) -> list:
+        # Every word after the command name
+        return self.words[1:]
+
+    @property
+    def args_text(self) -> str:
+        # Everything after the command name, as written
+        if self._args_text is None:
+            parts = self.content.split(' ', 1)
+            self._args_text = parts[1].strip() if len(parts) > 1 else ''
+        return self._args_text
+
+    @property
+    def normalized_text(self) -> str:
+        if self._normalized_text is None:
+            self._normalized_text = normalize_text(self.content)
+        return self._normalized_text
+
+    @property
+    def roles(self) -> frozenset:
+        if self._roles is None:
+            self._roles = get_roles(self.message.author.name, self.message.channel.name)
+        return self._roles
@@ -0,0 +1,364 @@
+import mmap
+import os
+from array import array
+from dataclasses import dataclass
+from json import loads, dumps
+from time import perf_counter
+from urllib.parse import quote, unquote
+from metrics import file_write_seconds
+
+BANK_FILE_EXTENSION = '.jsonl'
+
+# Materialized questions kept per game. Only the questions being asked or displayed are ever read, so this only has
+#   to cover a handful of channels.
+MATERIALIZED_CACHE_SIZE = 64
+
+
+def bank_file_name(game_key: str) -> str:
+    # Game names can hold characters that are not allowed in file names, or path separators, so they are escaped
+    return quote(game_key, safe=' ') + BANK_FILE_EXTENSION
+
+
+def bank_file_game_key(file_name: str) -> str:
+    return unquote(file_name[:-len(BANK_FILE_EXTENSION)])
+
+
+@dataclass(frozen=True)
+class QuestionChange:
+    """
+    A question added to or removed from the bank. Questions after it in its game, and in AllQuestions, move up or down
+    by one index, so anything that keeps question indexes has to follow the change.
+    """
+    added: bool
+    game_key: str
+    # Index of the question in its game
+    game_index: int
+    # Index of the question in AllQuestions
+    index: int
+
+
+class GameQuestions:
+    """
+    The questions of one game, stored one JSON record per line in a single file of the question bank. The file is
+    memory-mapped and the only thing held in memory for it is an array of line offsets, built the first time the game
+    is used. A question is only parsed from its line when it is read by index, so a game costs 8 bytes per question
+    however large its file grows.
+
+    Supports len() and indexing like the list of questions it replaces. Changes go through the QuestionBank.
+    """
+    def __init__(self, file_path: str, game_key: str, materialize):
+        """
+        :param file_path: Path of the game's bank file. It does not need to exist yet.
+        :param game_key: The game's key, as normalized by the bank
+        :param materialize: Function turning a question record into a question
+        """
+        self.file_path = file_path
+        self.game_key = game_key
+        self.materialize = materialize
+        self._map = None
+        self._offsets = None
+        self._materialized = {}
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, index: int):
+        offsets = self.offsets
+        if index < 0:
+            index += len(offsets)
+        if not 0 <= index < len(offsets):
+            raise IndexError('question index out of range')
+        question = self._materialized.get(index)
+        if question is None:
+            if len(self._materialized) >= MATERIALIZED_CACHE_SIZE:
+                self._materialized.clear()
+            question = self._materialized[index] = self.materialize(loads(self._line(index)))
+        return question
+
+    @property
+    def offsets(self) -> array:
+        # Start offset of every non-blank line
+        if self._offsets is None:
+            self._open()
+        return self._offsets
+
+    def append(self, records: list):
+        """
+        Appends question records to the end of the file.
+
+        :param records: List of question records
+        :return: None
+        """
+        started = perf_counter()
+        offsets = self.offsets
+        self.close()
+        with open(self.file_path, 'ab') as bank_file:
+            # A file edited by hand may not end with a newline
+            if bank_file.tell() > 0 and not self._ends_with_newline():
+                bank_file.write(b'\n')
+            for record in records:
+                offsets.append(bank_file.tell())
+                bank_file.write(dumps(record).encode('utf-8') + b'\n')
+        self._map = self._map_file()
+        file_write_seconds.labels('question_bank').observe(perf_counter() - started)
+
+    def replace(self, index: int, record: dict | None):
+        """
+        Rewrites the file with one line replaced or removed. The rest of the file is copied as it is, without parsing.
+
+        :param index: Index of the question in this game
+        :param record: The question record to put in its place, or None to remove the question
+        :return: None
+        """
+        started = perf_counter()
+        start = self.offsets[index]
+        end = start + len(self._line(index)) + 1
+        temporary_path = self.file_path + '.tmp'
+        with open(temporary_path, 'wb') as bank_file, memoryview(self._map) as contents:
+            bank_file.write(contents[:start])
+            if record is not None:
+                bank_file.write(dumps(record).encode('utf-8') + b'\n')
+            bank_file.write(contents[end:])
+        self.close()
+        os.replace(temporary_path, self.file_path)
+        self._open()
+        file_write_seconds.labels('question_bank').observe(perf_counter() - started)
+
+    def truncate(self, size: int):
+        """
+        Cuts the file back to size bytes, undoing appends made after it was that size.
+
+        :param size: The size to cut the file back to
+        :return: None
+        """
+        self.close()
+        if os.path.exists(self.file_path):
+            os.truncate(self.file_path, size)
+        self._open()
+
+    def close(self):
+        # Unmapped before every write, since a mapped file cannot be replaced on every platform
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def _line(self, index: int) -> bytes:
+        start = self._offsets[index]
+        end = self._map.find(b'\n', start)
+        return self._map[start:end if end != -1 else len(self._map)]
+
+    def _ends_with_newline(self) -> bool:
+        with open(self.file_path, 'rb') as bank_file:
+            bank_file.seek(-1, os.SEEK_END)
+            return bank_file.read(1) == b'\n'
+
+    def _map_file(self):
+        try:
+            with open(self.file_path, 'rb') as bank_file:
+                return mmap.mmap(bank_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            # A game with no file yet, or an empty file, which cannot be mapped
+            return None
+
+    def _open(self):
+        self._offsets = array('Q')
+        self._materialized.clear()
+        self._map = self._map_file()
+        if self._map is None:
+            return
+        find = self._map.find
+        size = len(self._map)
+        start = 0
+        while start < size:
+            end = find(b'\n', start)
+            if end == -1:
+                end = size
+            if end > start and not self._map[start:end].isspace():
+                self._offsets.append(start)
+            start = end + 1
+
+
+class AllQuestions:
+    """
+    Every question in the bank as one sequence, game after game, for when questions are not limited to the current
+    game.
+    """
+    def __init__(self, bank):
+        self.bank = bank
+        # Cached, since counting maps every game's file. Reset by the bank whenever it changes.
+        self.total = None
+
+    def __len__(self):
+        if self.total is None:
+            self.total = sum(len(game_questions) for game_questions in self.bank.games.values())
+        return self.total
+
+    def __getitem__(self, index: int):
+        game_questions, game_index = self.bank.locate(self, index)
+        return game_questions[game_index]
+
+
+class QuestionBank:
+    """
+    All trivia questions, stored as one JSONL file per game in the questions directory. Each file is named after its
+    game's key, escaped by bank_file_name, and each line holds one question record:
+    {"Game": str, "Points": int, "Question": str, "Answers": [str]}. The game's name as written is kept in the records.
+
+    Loading the bank only lists the directory. A game's file is mapped and its line offsets indexed the first time the
+    game is used, and a question is only materialized when it is read.
+    """
+    def __init__(self, folder: str, materialize, key):
+        """
+        :param folder: The questions directory
+        :param materialize: Function turning a question record into a question
+        :param key: Function normalizing a game name into the key its file is named after
+        """
+        self.folder = folder
+        self.materialize = materialize
+        self.key = key
+        self.games = {}
+        self.all_questions = AllQuestions(self)
+
+    def __len__(self):
+        return len(self.all_questions)
+
+    def load(self):
+        """
+        Finds every game's bank file in the questions directory. No file is read.
+
+        :return: None
+        """
+        self.close()
+        self.games.clear()
+        self.all_questions.total = None
+        os.makedirs(self.folder, exist_ok=True)
+        for file in sorted(os.listdir(self.folder)):
+            if file.endswith(BANK_FILE_EXTENSION):
+                game_key = bank_file_game_key(file)
+                self.games[game_key] = GameQuestions(os.path.join(self.folder, file), game_key, self.materialize)
+
+    def close(self):
+        for game_questions in self.games.values():
+            game_questions.close()
+
+    def game_questions(self, game: str) -> GameQuestions:
+        """
+        :param game: The game's name
+        :return: The game's questions. The same object is returned for as long as the bank is loaded, so it reflects
+            questions added to or removed from the game later.
+        """
+        game_key = self.key(game)
+        game_questions = self.games.get(game_key)
+        if game_questions is None:
+            game_questions = self.games[game_key] = GameQuestions(
+                os.path.join(self.folder, bank_file_name(game_key)), game_key, self.materialize)
+        return game_questions
+
+    def count(self, game: str) -> int:
+        game_questions = self.games.get(self.key(game))
+        return len(game_questions) if game_questions is not None else 0
+
+    def game_count(self) -> int:
+        # Games only get an entry once they are used, so one may not have any questions yet
+        return sum(1 for game_questions in self.games.values() if len(game_questions) > 0)
+
+    def import_records(self, records: list):
+        """
+        Appends question records to the files of their games. Either every record is added or, if a file cannot be
+        written, none are.
+
+        :param records: List of question records, from any number of games
+        :raises KeyError: If a record has no Game
+        :raises OSError: If a game's file cannot be written
+        :return: None
+        """
+        records_by_game = {}
+        for record in records:
+            records_by_game.setdefault(self.key(record['Game']), []).append(record)
+        self.all_questions.total = None
+        appended = []
+        try:
+            for game_key, game_records in records_by_game.items():
+                game_questions = self.game_questions(game_key)
+                appended.append((game_questions, os.path.getsize(game_questions.file_path)
+                                 if os.path.exists(game_questions.file_path) else 0))
+                game_questions.append(game_records)
+        except OSError:
+            # Take back the games already written, so importing the same records again does not duplicate them
+            for game_questions, size in appended:
+                try:
+                    game_questions.truncate(size)
+                except OSError:
+                    pass
+            raise
+
+    def add(self, question) -> list:
+        """
+        :param question: The question to add
+        :return: List holding the QuestionChange adding the question
+        """
+        self.import_records([question.to_json()])
+        game_questions = self.games[self.key(question.get_game())]
+        game_index = len(game_questions) - 1
+        return [QuestionChange(True, game_questions.game_key, game_index,
+                               self.all_questions_index(game_questions, game_index))]
+
+    def all_questions_index(self, game_questions: GameQuestions, game_index: int) -> int:
+        """
+        :param game_questions: A game's questions
+        :param game_index: Index of a question in the game
+        :return: Index of the question in AllQuestions
+        """
+        for other_game_questions in self.games.values():
+            if other_game_questions is game_questions:
+                return game_index
+            game_index += len(other_game_questions)
+        raise KeyError(game_questions.game_key)
+
+    def locate(self, questions, index: int) -> tuple:
+        """
+        :param questions: The GameQuestions or AllQuestions a question index refers to
+        :param index: The question index
+        :raises IndexError: If the index is out of range
+        :return: Tuple of (GameQuestions holding the question, the question's index in it)
+        """
+        if isinstance(questions, GameQuestions):
+            return questions, index
+        if index < 0:
+            index += len(questions)
+        if index >= 0:
+            for game_questions in self.games.values():
+                if index < len(game_questions):
+                    return game_questions, index
+                index -= len(game_questions)
+        raise IndexError('question index out of range')
+
+    def update(self, questions, index: int, question):
+        """
+        Writes a modified question back to the bank, moving it to another game's file if its game changed.
+
+        :param questions: The GameQuestions or AllQuestions the question was read from
+        :param index: The question's index in questions
+        :param question: The modified question
+        :return: List of QuestionChanges, which is empty unless the question moved to another game
+        """
+        game_questions, game_index = self.locate(questions, index)
+        self.all_questions.total = None
+        if self.key(question.get_game()) == game_questions.game_key:
+            game_questions.replace(game_index, question.to_json())
+            return []
+        changes = self.remove(game_questions, game_index)
+        return changes + self.add(question)
+
+    def remove(self, questions, index: int):
+        """
+        :param questions: The GameQuestions or AllQuestions the question index refers to
+        :param index: The question's index in questions
+        :return: List holding the QuestionChange removing the question
+        """
+        game_questions, game_index = self.locate(questions, index)
+        change = QuestionChange(False, game_questions.game_key, game_index,
+                                self.all_questions_index(game_questions, game_index))
+        self.all_questions.total = None
+        game_questions.replace(game_index, None)
+        return [change]
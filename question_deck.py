@@ -0,0 +1,211 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from random import randrange
+from json import load, dump, JSONDecodeError
+from time import perf_counter
+from metrics import file_write_seconds
+
+# Undrawn questions compared on each weighted draw. Taking the best of a few random picks leans each round towards the
+#   preferred questions while every draw stays O(1) and every question is still drawn once per round.
+WEIGHTED_DRAW_CANDIDATES = 3
+
+
+class QuestionDeck:
+    """
+    The order in which one game's questions are asked. Questions are drawn without replacement, so every question is
+    asked once before any question is asked again.
+
+    The deck is a Fisher-Yates shuffle done one draw at a time: position i holds question swaps.get(i, i), and a draw
+    swaps a random undrawn position to the front of the undrawn part and steps past it. Only swapped positions are
+    stored, so a draw is O(1) and a deck costs nothing until it is drawn from, however many questions the game has.
+
+    Questions added to the game join the undrawn part of the deck and removed questions leave it, so the round carries
+    on and no question is repeated before every question has been drawn.
+    """
+    def __init__(self, size: int = 0, position: int = 0, swaps: dict = None, stats: dict = None):
+        self.size = size
+        self.position = position
+        self.swaps = swaps if swaps is not None else {}
+        # Question text -> [times asked, total number of winners]
+        self.stats = stats if stats is not None else {}
+
+    def resize(self, size: int):
+        """
+        Follows a change in the number of questions made outside the bot, e.g. a question file edited by hand. New
+        indexes join the undrawn part of the deck, and indexes past the end are dropped.
+
+        :param size: The number of questions in the game
+        :return: None
+        """
+        if size > self.size:
+            # Positions past the old end hold their own index, and they are all undrawn
+            self.size = size
+        elif size < self.size:
+            order = self._order()
+            self.position -= sum(1 for index in order[:self.position] if index >= size)
+            self._relabel([index for index in order if index < size])
+
+    def insert(self, index: int):
+        """
+        Follows a question being added at index. Questions at and after it move up by one index, and the new question
+        joins the undrawn part of the deck.
+
+        :param index: Index of the new question
+        :return: None
+        """
+        if index == self.size:
+            # Added to the end, which is the common case: the new last position already holds it
+            self.size += 1
+            return
+        order = [other_index + (other_index >= index) for other_index in self._order()]
+        order.append(index)
+        self._relabel(order)
+
+    def remove(self, index: int):
+        """
+        Follows the question at index being removed. Questions after it move down by one index, and every other
+        question keeps whether it has been drawn this round.
+
+        :param index: Index of the removed question
+        :return: None
+        """
+        order = self._order()
+        position = order.index(index)
+        del order[position]
+        if position < self.position:
+            self.position -= 1
+        self._relabel([other_index - (other_index > index) for other_index in order])
+
+    def draw(self, weight=None) -> int:
+        """
+        :param weight: Optional function of question index -> score. The highest scoring of a few undrawn questions is
+            drawn.
+        :return: Index of the drawn question. The deck must not be empty.
+        """
+        end = self.size
+        if self.position >= self.size:
+            # Every question has been drawn. Start a new round.
+            last_question = self._question_at(self.size - 1)
+            self.position = 0
+            self.swaps.clear()
+            if self.size > 1:
+                # Keep the question drawn last out of the first draw, so it is not asked twice in a row
+                self._swap(last_question, self.size - 1)
+                end = self.size - 1
+
+        if weight is None:
+            pick = randrange(self.position, end)
+        else:
+            pick = max((randrange(self.position, end) for _ in range(WEIGHTED_DRAW_CANDIDATES)),
+                       key=lambda candidate: weight(self._question_at(candidate)))
+        self._swap(self.position, pick)
+        index = self._question_at(self.position)
+        self.position += 1
+        return index
+
+    def record_asked(self, question_text: str):
+        self.stats.setdefault(question_text, [0, 0])[0] += 1
+
+    def record_winners(self, question_text: str, winners: int):
+        self.stats.setdefault(question_text, [0, 0])[1] += winners
+
+    def times_asked(self, question_text: str) -> int:
+        return self.stats.get(question_text, (0, 0))[0]
+
+    def engagement(self, question_text: str) -> float:
+        # Winners per time asked, pulled towards 0.5 for questions that have rarely been asked
+        times_asked, winners = self.stats.get(question_text, (0, 0))
+        return (winners + 1) / (times_asked + 2)
+
+    def to_json(self) -> dict:
+        # A copy, so that it can be written while the deck keeps being drawn from
+        return {'size': self.size, 'position': self.position, 'swaps': list(self.swaps.items()),
+                'stats': dict(self.stats)}
+
+    @staticmethod
+    def from_json(record: dict):
+        return QuestionDeck(size=int(record['size']), position=int(record['position']),
+                            swaps={int(position): int(index) for position, index in record['swaps']},
+                            stats=record['stats'])
+
+    def _question_at(self, position: int) -> int:
+        return self.swaps.get(position, position)
+
+    def _order(self) -> list:
+        # Every position's question index. O(size), so only used when questions are added or removed.
+        return [self._question_at(position) for position in range(self.size)]
+
+    def _relabel(self, order: list):
+        self.size = len(order)
+        self.swaps = {position: index for position, index in enumerate(order) if position != index}
+
+    def _swap(self, first: int, second: int):
+        first_question = self._question_at(first)
+        self.swaps[first] = self._question_at(second)
+        self.swaps[second] = first_question
+
+
+class QuestionDecks:
+    """
+    Every game's QuestionDeck, stored in a single JSON file so that a round carries on where it left off after a
+    restart. Only a deck that changed is copied when saving, and the file is written off the event loop.
+    """
+    def __init__(self, decks_path: str):
+        self.decks_path = decks_path
+        self.decks = {}
+        # Deck key -> the deck as last saved
+        self.saved_decks = {}
+        # A single worker keeps the writes in order and off the event loop
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='QuestionDecks')
+
+    def load(self):
+        """
+        Loads the decks from disk, if they exist. Corrupt decks are discarded and reshuffled.
+
+        :return: None
+        """
+        self.decks.clear()
+        self.saved_decks.clear()
+        try:
+            with open(self.decks_path, 'r') as decks_file:
+                records = load(decks_file)
+            for key, record in records.items():
+                self.decks[key] = QuestionDeck.from_json(record)
+        except (OSError, JSONDecodeError, AttributeError, KeyError, TypeError, ValueError):
+            self.decks.clear()
+        for key, deck in self.decks.items():
+            self.saved_decks[key] = deck.to_json()
+
+    def save(self, key: str):
+        """
+        Queues the file to be rewritten with a deck's current state.
+
+        :param key: The key of the deck that changed
+        :return: Future that completes once the file is on disk
+        """
+        self.saved_decks[key] = self.decks[key].to_json()
+        return self._executor.submit(self._write, dict(self.saved_decks))
+
+    def close(self):
+        # Waits for every queued write to finish
+        self._executor.shutdown(wait=True)
+
+    def _write(self, saved_decks: dict):
+        started = perf_counter()
+        temporary_path = self.decks_path + '.tmp'
+        with open(temporary_path, 'w') as decks_file:
+            dump(saved_decks, decks_file)
+        os.replace(temporary_path, self.decks_path)
+        file_write_seconds.labels('question_decks').observe(perf_counter() - started)
+
+    def get(self, key: str, size: int) -> QuestionDeck:
+        """
+        :param key: The deck's key, e.g. the game's key
+        :param size: The number of questions the deck is drawn from
+        :return: The deck, created if it does not exist
+        """
+        deck = self.decks.get(key)
+        if deck is None:
+            deck = self.decks[key] = QuestionDeck(size)
+        deck.resize(size)
+        return deck
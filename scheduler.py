@@ -0,0 +1,155 @@
+import asyncio
+import heapq
+from itertools import count
+from time import monotonic
+
+
+class ScheduledTask:
+    """
+    A callback registered with the TickScheduler. Repeating tasks carry an interval; one-shot tasks do not. Tasks with
+    a timeout are cancelled if a run takes longer than that many seconds.
+
+    The counters record how many times the task ran, how many runs were skipped because the previous run was still in
+    flight (overruns), how many runs were cancelled for exceeding the timeout and how many raised an exception.
+    """
+    __slots__ = ('name', 'callback', 'interval', 'deadline', 'timeout', 'cancelled', 'in_flight',
+                 'runs', 'overruns', 'timeouts', 'failures')
+
+    def __init__(self, name: str, callback, interval: float | None, deadline: float, timeout: float | None = None):
+        self.name = name
+        self.callback = callback
+        self.interval = interval
+        self.deadline = deadline
+        self.timeout = timeout
+        self.cancelled = False
+        self.in_flight = None
+        self.runs = 0
+        self.overruns = 0
+        self.timeouts = 0
+        self.failures = 0
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class TickScheduler:
+    """
+    Runs coroutine callbacks at deadlines on the monotonic clock, kept in a min-heap ordered by deadline. The run loop
+    sleeps until the earliest deadline rather than waking every second, and repeating tasks are rescheduled from their
+    previous deadline rather than from when they finished, so a slow callback does not stretch every later interval.
+
+    Due tasks are started concurrently, so one slow callback cannot hold up the others. A task whose previous run is
+    still in flight when it comes due again is skipped for that run rather than stacked up.
+    """
+    def __init__(self):
+        self.paused = False
+        self._heap = []
+        self._sequence = count()
+        self._wakeup = asyncio.Event()
+        self._runner = None
+        self._in_flight = set()
+
+    def schedule_every(self, name: str, interval: float, callback, first_run_in: float = None,
+                       timeout: float = None) -> ScheduledTask:
+        """
+        Registers a callback to run repeatedly.
+
+        :param name: Name of the task, used in error messages
+        :param interval: Seconds between runs. Must be positive.
+        :param callback: Coroutine function taking no arguments
+        :param first_run_in: Seconds until the first run. Defaults to one interval.
+        :param timeout: Seconds a run may take before it is cancelled. None for no limit.
+        :return: The ScheduledTask, which can be cancelled
+        """
+        if not interval > 0:
+            raise ValueError(f'The interval for scheduled task {name} must be positive.')
+        delay = interval if first_run_in is None else first_run_in
+        return self._push(ScheduledTask(name, callback, interval, monotonic() + delay, timeout))
+
+    def schedule_at(self, name: str, deadline: float, callback, timeout: float = None) -> ScheduledTask:
+        """
+        Registers a callback to run once at an absolute time.
+
+        :param name: Name of the task, used in error messages
+        :param deadline: time.monotonic() value at which to run the callback
+        :param callback: Coroutine function taking no arguments
+        :param timeout: Seconds the run may take before it is cancelled. None for no limit.
+        :return: The ScheduledTask, which can be cancelled
+        """
+        return self._push(ScheduledTask(name, callback, None, deadline, timeout))
+
+    def start(self):
+        """
+        Starts the run loop on the current event loop, if it is not already running.
+
+        :return: None
+        """
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.ensure_future(self._run())
+
+    def stop(self):
+        """
+        Stops the run loop and cancels any runs in flight. Registered tasks are kept and resume when the scheduler is
+        started again.
+
+        :return: None
+        """
+        if self._runner is not None:
+            self._runner.cancel()
+            self._runner = None
+        for run in list(self._in_flight):
+            run.cancel()
+
+    def _push(self, task: ScheduledTask) -> ScheduledTask:
+        heapq.heappush(self._heap, (task.deadline, next(self._sequence), task))
+        # Wake the run loop in case this deadline is earlier than the one it is sleeping towards
+        self._wakeup.set()
+        return task
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            if self._heap:
+                timeout = self._heap[0][0] - monotonic()
+            else:
+                timeout = None
+            if timeout is None or timeout > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                    continue
+                except asyncio.TimeoutError:
+                    pass
+
+            now = monotonic()
+            while self._heap and self._heap[0][0] <= now:
+                deadline, _, task = heapq.heappop(self._heap)
+                if task.cancelled:
+                    continue
+                if task.interval is not None:
+                    task.deadline = deadline + task.interval
+                    if task.deadline <= now:
+                        # Fell more than an interval behind. Skip the missed runs instead of running them back to back.
+                        task.deadline = now + task.interval
+                    heapq.heappush(self._heap, (task.deadline, next(self._sequence), task))
+                if self.paused:
+                    continue
+                if task.in_flight is not None and not task.in_flight.done():
+                    task.overruns += 1
+                    continue
+                task.in_flight = asyncio.ensure_future(self._invoke(task))
+                self._in_flight.add(task.in_flight)
+                task.in_flight.add_done_callback(self._in_flight.discard)
+
+    @staticmethod
+    async def _invoke(task: ScheduledTask):
+        task.runs += 1
+        try:
+            await asyncio.wait_for(task.callback(), task.timeout)
+        except asyncio.TimeoutError:
+            task.timeouts += 1
+            print(f'Scheduled task {task.name} did not finish within {task.timeout} seconds and was cancelled.')
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            task.failures += 1
+            print(f'Error running scheduled task {task.name}: {str(e)}')
@@ -0,0 +1,171 @@
+import asyncio
+from collections import deque
+from time import monotonic
+
+# Twitch drops chat messages longer than this
+MAX_MESSAGE_LENGTH = 500
+# Messages per 30 seconds Twitch allows in a channel, depending on whether the bot is a moderator there
+MODERATOR_MESSAGES_PER_PERIOD = 100
+USER_MESSAGES_PER_PERIOD = 20
+RATE_LIMIT_PERIOD_IN_SECONDS = 30
+# Added to the period, since Twitch times a message when it arrives rather than when it was sent
+RATE_LIMIT_MARGIN_IN_SECONDS = 1
+
+
+class Priority:
+    High = 0
+    Normal = 1
+    Low = 2
+
+
+class SlidingWindowLimit:
+    """
+    Allows at most limit sends in any period seconds, the way Twitch counts them, by remembering when each of the most
+    recent sends happened. A send is only allowed while fewer than limit of them fall within the last period seconds.
+    """
+    def __init__(self, limit: int, period: float):
+        self.limit = limit
+        self.period = period
+        self.send_times = deque()
+
+    def set_limit(self, limit: int):
+        self.limit = limit
+
+    def time_until_available(self) -> float:
+        """
+        :return: Seconds until a send is allowed. 0 if one is allowed now.
+        """
+        now = monotonic()
+        while self.send_times and now - self.send_times[0] >= self.period:
+            self.send_times.popleft()
+        if len(self.send_times) < self.limit:
+            return 0.0
+        # Enough of the oldest sends have to leave the window to bring it below the limit
+        return self.send_times[len(self.send_times) - self.limit] + self.period - now
+
+    def take(self):
+        self.send_times.append(monotonic())
+
+
+def split_message(text: str, limit: int = MAX_MESSAGE_LENGTH) -> list:
+    """
+    Splits text into chunks no longer than limit, breaking on whitespace where possible.
+
+    :param text: The message text
+    :param limit: The maximum length of a chunk
+    :return: List of message chunks
+    """
+    chunks = []
+    text = text.strip()
+    while len(text) > limit:
+        split_at = text.rfind(' ', 0, limit + 1)
+        if split_at <= 0:
+            split_at = limit
+        chunks.append(text[:split_at].rstrip())
+        text = text[split_at:].lstrip()
+    if text:
+        chunks.append(text)
+    return chunks
+
+
+def is_packable(text: str) -> bool:
+    # Chat commands such as /me or .announce must be sent on their own
+    return not text.startswith(('/', '.'))
+
+
+class ChannelSendQueue:
+    """
+    The outbound messages waiting to be sent to one channel, one lane per priority.
+    """
+    def __init__(self, channel_name: str):
+        self.channel_name = channel_name
+        self.channel = None
+        # One lane per Priority, indexed by priority value
+        self.lanes = [deque(), deque(), deque()]
+        self.window = SlidingWindowLimit(USER_MESSAGES_PER_PERIOD,
+                                         RATE_LIMIT_PERIOD_IN_SECONDS + RATE_LIMIT_MARGIN_IN_SECONDS)
+        self.wakeup = asyncio.Event()
+        self.worker = None
+
+    def __len__(self):
+        return sum(len(lane) for lane in self.lanes)
+
+
+class SendQueue:
+    """
+    Central outbound chat queue. Messages are split to Twitch's length limit and queued per channel in priority lanes.
+    A worker per channel sends them as fast as that channel's rate limit allows, always taking the highest-priority
+    lane first, and packs consecutive messages from the same lane into a single chat line when they fit.
+    """
+    def __init__(self, bot):
+        self.bot = bot
+        self.channel_queues = {}
+
+    def enqueue(self, messageable, text: str, priority: int = Priority.Normal):
+        """
+        Queues a message to be sent to a channel.
+
+        :param messageable: The Channel, or a Context whose channel the message should be sent to
+        :param text: The message text. Text over the length limit is split into several messages.
+        :param priority: The Priority lane for the message
+        :return: None
+        """
+        channel = getattr(messageable, 'channel', None) or messageable
+        channel_queue = self.channel_queues.get(channel.name.lower())
+        if channel_queue is None:
+            channel_queue = self.channel_queues[channel.name.lower()] = ChannelSendQueue(channel.name.lower())
+        channel_queue.channel = channel
+        channel_queue.lanes[priority].extend(split_message(str(text)))
+        channel_queue.wakeup.set()
+        if channel_queue.worker is None or channel_queue.worker.done():
+            channel_queue.worker = asyncio.ensure_future(self._run(channel_queue))
+
+    def depth(self) -> int:
+        """
+        :return: The number of messages waiting in every channel's queue
+        """
+        return sum(len(channel_queue) for channel_queue in self.channel_queues.values())
+
+    def stop(self):
+        """
+        Stops every channel's worker. Queued messages are discarded.
+
+        :return: None
+        """
+        for channel_queue in self.channel_queues.values():
+            if channel_queue.worker is not None:
+                channel_queue.worker.cancel()
+        self.channel_queues.clear()
+
+    def is_moderator(self, channel) -> bool:
+        if channel.name.lower() == str(self.bot.nick).lower():
+            return True
+        chatter = channel.get_chatter(self.bot.nick)
+        return bool(getattr(chatter, 'is_mod', False))
+
+    async def _run(self, channel_queue: ChannelSendQueue):
+        while True:
+            if not len(channel_queue):
+                channel_queue.wakeup.clear()
+                await channel_queue.wakeup.wait()
+                continue
+
+            channel_queue.window.set_limit(MODERATOR_MESSAGES_PER_PERIOD if self.is_moderator(channel_queue.channel)
+                                           else USER_MESSAGES_PER_PERIOD)
+            delay = channel_queue.window.time_until_available()
+            if delay > 0:
+                # Sleep before choosing a message, so a higher-priority message queued meanwhile goes first
+                await asyncio.sleep(delay)
+                continue
+
+            lane = next(lane for lane in channel_queue.lanes if lane)
+            text = lane.popleft()
+            if is_packable(text):
+                while lane and is_packable(lane[0]) and len(text) + 1 + len(lane[0]) <= MAX_MESSAGE_LENGTH:
+                    text += ' ' + lane.popleft()
+
+            channel_queue.window.take()
+            try:
+                await channel_queue.channel.send(text)
+            except Exception as e:
+                print(f'Error sending message to {channel_queue.channel_name}: {str(e)}')
@@ -0,0 +1,175 @@
+import os
+from dataclasses import dataclass
+from json import load, dump
+from time import perf_counter
+from send_queue import Priority
+from metrics import file_write_seconds
+
+NEWTIMER_SYNTAX = ('newtimer syntax: "!newtimer timer_name, interval_in_seconds(|minimum_chat_messages), '
+                   'timer_message". With a minimum, the timer skips a channel until that many chat messages have been '
+                   'sent there since it last posted.')
+
+
+@dataclass(frozen=True)
+class Timer:
+    name: str
+    interval: int
+    message: str
+    # Chat messages a channel needs to have seen since the timer last posted there before it posts again
+    min_messages: int = 0
+    # The channel the timer was created in, which is the only one it posts in. Timers saved before timers had a
+    #   channel have an empty one and post in every joined channel.
+    channel: str = ''
+
+
+def parse_timer_definition(content: str, channel: str) -> Timer:
+    """
+    Parses a !newtimer or !modifytimer chat message.
+
+    :param content: The chat message, e.g. "!newtimer socials, 900|20, Follow us on..."
+    :param channel: Name of the channel the message was sent in, where the timer will post
+    :raises ValueError: If the message does not follow NEWTIMER_SYNTAX. The error text can be sent to chat.
+    :return: The Timer the message defines
+    """
+    # The message might have commas, but as long as we have at least a timer name, interval and message
+    args = str(content).split(',')
+    if not (len(args) > 2):
+        raise ValueError(NEWTIMER_SYNTAX)
+    # message_left gets the "!newtimer timer_name" part
+    message_left = str(args[0]).split()
+    if not len(message_left) == 2:
+        raise ValueError(NEWTIMER_SYNTAX + ' The timer name cannot have spaces.')
+
+    try:
+        schedule = args[1].split('|')
+        interval = int(schedule[0].strip())
+        min_messages = int(schedule[1].strip()) if len(schedule) > 1 else 0
+    except ValueError:
+        raise ValueError('The timer interval and minimum chat messages must be integers.')
+    if not interval > 0 or min_messages < 0 or len(schedule) > 2:
+        raise ValueError('The timer interval must be a positive non-zero integer and the minimum chat messages cannot '
+                         'be negative.')
+    message = ','.join(args[2:]).strip()
+    if not message:
+        raise ValueError(NEWTIMER_SYNTAX)
+    return Timer(name=message_left[1].strip().lower(), interval=interval, message=message, min_messages=min_messages,
+                 channel=channel.lower())
+
+
+class TimerService:
+    """
+    Posts every timer created with !newtimer from one table, stored in a single JSON file. Each timer is one task on
+    the bot's TickScheduler, whose min-heap is keyed by next run time, so firing a timer costs O(log n) and an idle
+    second costs nothing however many timers exist.
+
+    Chat activity is kept as one message counter per channel. A timer with min_messages only posts in a channel once
+    that channel's counter has moved on far enough since the timer last posted there.
+    """
+    def __init__(self, bot):
+        self.bot = bot
+        self.table_path = None
+        self.timers = {}
+        self.tasks = {}
+        self.message_counts = {}
+        # Timer name -> {channel name: message count when the timer last posted there}
+        self.posted_at_counts = {}
+
+    def load(self, table_path: str):
+        """
+        Loads the timer table from disk, if one exists. Later changes are saved to the same file.
+
+        :param table_path: Path of the timer table file
+        :raises JSONDecodeError: If the table file is corrupt
+        :return: None
+        """
+        self.table_path = table_path
+        if not os.path.exists(self.table_path):
+            return
+        with open(self.table_path, 'r') as table_file:
+            table = load(table_file)
+        for name, record in table.items():
+            self.timers[name] = Timer(name=name, interval=int(record['interval']), message=record['message'],
+                                      min_messages=int(record.get('min_messages', 0)),
+                                      channel=record.get('channel', ''))
+
+    def save(self):
+        started = perf_counter()
+        temporary_path = self.table_path + '.tmp'
+        with open(temporary_path, 'w') as table_file:
+            dump({name: {'interval': timer.interval, 'message': timer.message, 'min_messages': timer.min_messages,
+                         'channel': timer.channel}
+                  for name, timer in self.timers.items()}, table_file, indent=4, sort_keys=True)
+        os.replace(temporary_path, self.table_path)
+        file_write_seconds.labels('timer_table').observe(perf_counter() - started)
+
+    def schedule_all(self):
+        """
+        Registers every timer with the bot's scheduler. Timers already registered are left alone.
+
+        :return: None
+        """
+        for name in self.timers:
+            if name not in self.tasks:
+                self.schedule(name)
+
+    def schedule(self, name: str):
+        task = self.tasks.pop(name, None)
+        if task is not None:
+            task.cancel()
+        self.tasks[name] = self.bot.scheduler.schedule_every(f'timer {name}', self.timers[name].interval,
+                                                             lambda: self.fire(name))
+
+    def set_timer(self, timer: Timer):
+        """
+        Adds or replaces a timer, saves the table and (re)schedules the timer to first post one interval from now.
+
+        :param timer: The timer
+        :return: None
+        """
+        self.timers[timer.name] = timer
+        self.save()
+        self.schedule(timer.name)
+
+    def delete_timer(self, name: str) -> bool:
+        """
+        Removes a timer, saves the table and cancels the timer's scheduled task.
+
+        :param name: The timer name
+        :return: True if the timer existed
+        """
+        if self.timers.pop(name, None) is None:
+            return False
+        task = self.tasks.pop(name, None)
+        if task is not None:
+            task.cancel()
+        self.posted_at_counts.pop(name, None)
+        self.save()
+        return True
+
+    def count_message(self, channel_name: str):
+        # Called for every chat message, so keep it to a single counter update
+        self.message_counts[channel_name] = self.message_counts.get(channel_name, 0) + 1
+
+    async def fire(self, name: str):
+        """
+        Posts a timer's message in its channel, if the bot has joined it and it has seen enough chat since the timer
+        last posted there.
+
+        :param name: The timer name
+        :return: None
+        """
+        timer = self.timers.get(name)
+        if timer is None:
+            return
+        if timer.channel:
+            channel = self.bot.get_channel(timer.channel)
+            channels = [channel] if channel is not None else []
+        else:
+            channels = list(self.bot.connected_channels)
+        posted_at_counts = self.posted_at_counts.setdefault(name, {})
+        for channel in channels:
+            message_count = self.message_counts.get(channel.name, 0)
+            if message_count - posted_at_counts.get(channel.name, 0) < timer.min_messages:
+                continue
+            posted_at_counts[channel.name] = message_count
+            self.bot.queue_message(channel, timer.message, Priority.Low)
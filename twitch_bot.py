@@ -20,12 +20,25 @@ FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 DEALINGS IN THE SOFTWARE.
 """
 import os
-from importlib import reload
+import asyncio
 from datetime import datetime
-from json import load, dumps, JSONDecodeError
-from twitchio.ext import commands, routines
+from time import perf_counter
+from json import JSONDecodeError
+from twitchio.ext import commands
 from utils import LoggingLevel, log_to_file
-from bot_configuration import bot_config, check_permissions, load_config
+from channel_state import ChannelStateCache
+from scheduler import TickScheduler
+from send_queue import SendQueue, Priority
+from cog_manifest import CogManifest, LazyCog
+from command_table import CommandTableCog, parse_command_definition, parse_command_cog
+from timer_service import TimerService, parse_timer_definition
+from parsed_message import ParsedMessage
+from chat_filters import ChatMatcher
+import metrics
+from loyalty_ledger import ChannelLoyalty
+from chatter_identities import ChatterIdentityCache
+from bot_configuration import bot_config, check_permissions, load_config, get_settings, reload_config_if_changed, \
+    save_config, ConfigurationError, permission_index
 
 if __name__ == "__main__":
     # Token generating attributes
@@ -36,10 +49,14 @@ if __name__ == "__main__":
     # BOT_CREDS_PATH = os.path.join(BOT_PATH, 'creds.json')
     BOT_LOG_PATH = os.path.join(BOT_PATH, 'bot_log_' + datetime.now().strftime('%Y-%m-%d_%I-%M-%S_%p') + '.txt')
     COG_PATH = os.path.join(BOT_PATH, 'cogs')
+    COG_MANIFEST_PATH = os.path.join(BOT_PATH, 'cog_manifest.json')
+    COMMAND_TABLE_PATH = os.path.join(BOT_PATH, 'commands.json')
+    TIMER_TABLE_PATH = os.path.join(BOT_PATH, 'timers.json')
     LOYALTY_POINTS_PATH = os.path.join(BOT_PATH, 'loyalty.json')
+    LOYALTY_POINTS_FOLDER = os.path.join(BOT_PATH, 'loyalty')
+    CHATTER_IDENTITIES_PATH = os.path.join(BOT_PATH, 'chatter_identities.jsonl')
 
     bot_thread = None
-    tick_count = 0
 
     # Load config prior to the bot class code. This allows config values to be used for aliases of commands and such.
     load_config()
@@ -47,7 +64,8 @@ if __name__ == "__main__":
 
 class Bot(commands.Bot):
     def __init__(self, token: str, secret: str, prefix: str, channels: [],
-                 heartbeat: int = 30, retain_cache: bool = True, tick_rate: int = 1):
+                 heartbeat: int = 30, retain_cache: bool = True, tick_rate: int = 1, channel_state_ttl: int = 30,
+                 local_twitch_url: str = ''):
         super().__init__(
             token=token,
             client_secret=secret,
@@ -57,127 +75,751 @@ class Bot(commands.Bot):
             retain_cache=retain_cache,
             tick_rate=tick_rate
         )
-        self.loyalty_points = {}
+        self.channel_loyalty = {}
+        self.chatter_identities = None
         self.prefix = prefix
-        self.tick_pause = False
+        self.scheduler = TickScheduler()
+        self.cog_tick_tasks = {}
+        self.config_task = None
+        self.loyalty_points_task = None
+        self.channel_state = ChannelStateCache(self, ttl=channel_state_ttl)
+        self.send_queue = SendQueue(self)
+        metrics.send_queue_depth.set_function(self.send_queue.depth)
+        self.command_cogs = {}
+        self.listener_cogs = []
+        # Listener cogs that declare a chat_filter() only receive the chat lines self.chat_matcher matches for them
+        self.chat_filters = {}
+        self.chat_matcher = ChatMatcher()
+        self.cog_manifest = None
+        self.command_table = None
+        self.timers = TimerService(self)
+        self.cog_watcher_task = None
+        # Path -> (mtime, size) of cog modules that failed to reload, so they are not retried until edited again
+        self.failed_cog_files = {}
+        self.created_at = perf_counter()
+        self.startup_recorded = False
+        if local_twitch_url:
+            self.use_local_twitch(local_twitch_url)
+
+    def use_local_twitch(self, url: str):
+        """
+        Points the IRC connection, Helix requests and token validation at a local Twitch stand-in such as
+        benchmarks/twitch_standin.py instead of Twitch. Used for load testing without network access.
+
+        :param url: Base URL of the stand-in, e.g. http://127.0.0.1:8765
+        :return: None
+        """
+        import aiohttp
+        import twitchio.http
+        import twitchio.websocket
+
+        url = url.rstrip('/')
+        # http://host -> ws://host and https://host -> wss://host
+        twitchio.websocket.HOST = 'ws' + url[len('http'):] + '/irc'
+        twitchio.http.Route.BASE_URL = url + '/helix'
+
+        http = self._http
+
+        # TwitchHTTP.validate has the Twitch URL built in, so replace it with one that asks the stand-in
+        async def validate(*, token: str = None) -> dict:
+            if not http.session:
+                http.session = aiohttp.ClientSession()
+            async with http.session.get(url + '/oauth2/validate',
+                                        headers={'Authorization': f'OAuth {token or http.token}'}) as response:
+                data = await response.json()
+            if not http.nick:
+                http.nick = data.get('login')
+                http.user_id = int(data['user_id'])
+                http.client_id = data.get('client_id')
+            return data
+
+        http.validate = validate
+        print(f'Using the local Twitch stand-in at {url}.')
 
     async def load_cogs(self, force_reload=False):
         """
-        Uses importlib and inspection to dynamically locate and load Classes that subclass Cog in .py files
-        in the cogs directory. Creates the Cog objects and loads the objects into the bot.
+        Locates and loads the Classes that subclass Cog in .py files in the cogs directory. Creates the Cog objects and
+        loads the objects into the bot.
+
+        New and changed modules are imported and inspected, and what they contain is recorded in the cog manifest.
+        Modules the manifest shows to be unchanged are not inspected: cogs that have to run from the start are created
+        straight from their recorded class names, and command-only cogs are indexed as LazyCog placeholders whose
+        module is not imported until the command is first used.
 
         :param force_reload: Bool that controls whether the method reloads the imports. This allows existing cogs
-            to be completely reloaded.
+            to be completely reloaded. Also bypasses the cog manifest, so that every module is inspected again.
+        :return: None
+        """
+        started = perf_counter()
+        if self.cog_manifest is None:
+            self.cog_manifest = CogManifest(COG_MANIFEST_PATH)
+            self.cog_manifest.load()
+
+        file_paths = set()
+        for root, directories, files in os.walk(COG_PATH):
+            for file in files:
+                if str(file).endswith('.py'):
+                    file_path = os.path.join(root, file)
+                    module_name = '.'.join(os.path.join(root, os.path.splitext(file)[0]).split(os.sep)[-2:])
+                    file_paths.add(file_path)
+                    entry = None if force_reload else self.cog_manifest.lookup(file_path)
+                    try:
+                        if entry is None:
+                            self.inspect_cog_module(file_path, module_name, force_reload)
+                        else:
+                            self.load_manifest_entry(file_path, entry)
+                    except Exception as e:
+                        print(f'Error logging cog module at {str(module_name)}: {str(e)}')
+
+        # Drop the placeholders of command cogs whose files were deleted
+        for command, cog in list(self.command_cogs.items()):
+            if isinstance(cog, LazyCog) and cog.file_path not in file_paths:
+                self.release_command(command, cog)
+        self.cog_manifest.prune(file_paths)
+        try:
+            self.cog_manifest.save()
+        except OSError as e:
+            log(f'The cog manifest could not be saved: {str(e)}', LoggingLevel.Warn)
+        metrics.cog_load_seconds.observe(perf_counter() - started)
+
+    def inspect_cog_module(self, file_path: str, module_name: str, force_reload=False):
+        """
+        Imports a cog module, adds every Cog class defined in it that is not already loaded and records the module's
+        cogs in the cog manifest.
+
+        :param file_path: Path of the cog module
+        :param module_name: The module's import name, e.g. cogs.trivia
+        :param force_reload: Bool that controls whether the module is reloaded if it has already been imported
         :return: None
         """
         import inspect
         import importlib
+        cog_module = importlib.import_module(module_name)
+        if force_reload:
+            importlib.reload(cog_module)
+        cogs = []
+        # Look for classes
+        for name, obj in inspect.getmembers(cog_module):
+            if inspect.isclass(obj) and commands.Cog in inspect.getmro(obj) and obj.__module__ == cog_module.__name__:
+                cog = self.cogs.get(obj.__cogname__)
+                if cog is None:
+                    try:
+                        cog = obj(self)
+                        self.add_cog(cog)
+                    except commands.InvalidCog as exc:
+                        print(f'Error loading cog {str(obj)}: {exc}')
+                        continue
+                cogs.append(self.describe_cog(cog))
+        self.cog_manifest.record(file_path, module_name, cogs)
+
+    @staticmethod
+    def describe_cog(cog: commands.Cog) -> dict:
+        """
+        :param cog: A loaded Cog object
+        :return: The cog's record for the cog manifest
+        """
+        command = None
+        if cog.name.endswith('Cog') and callable(getattr(cog, 'execute', None)):
+            command = cog.name[:-len('Cog')].lower()
+        # Cogs that see every message, tick, or carry their own twitchio commands or events cannot wait for a command
+        eager = (command is None or not getattr(cog, 'only_execute_on_command', True) or
+                 callable(getattr(cog, 'tick', None)) or bool(cog._commands) or bool(type(cog)._events))
+        return {'class': type(cog).__name__, 'name': cog.name, 'command': command, 'eager': eager}
+
+    def load_manifest_entry(self, file_path: str, entry: dict):
+        """
+        Loads the cogs of an unchanged cog module from its cog manifest entry, without inspecting the module.
+
+        :param file_path: Path of the cog module
+        :param entry: The module's entry in the cog manifest
+        :return: None
+        """
+        import importlib
+        for record in entry['cogs']:
+            if record['name'] in self.cogs or isinstance(self.command_cogs.get(record['command']), LazyCog):
+                continue
+            if record['eager']:
+                self.add_cog(getattr(importlib.import_module(entry['module']), record['class'])(self))
+            else:
+                self.claim_command(record['command'], LazyCog(self, file_path, entry['module'], record['class'],
+                                                              record['name']))
+
+    def load_lazy_cog(self, lazy_cog: LazyCog):
+        """
+        Imports and adds the cog a LazyCog placeholder stands in for. The cog replaces the placeholder in the dispatch
+        index.
+
+        :param lazy_cog: The placeholder
+        :return: The loaded Cog object, or None if it could not be loaded
+        """
+        import importlib
+        cog = self.cogs.get(lazy_cog.name)
+        if cog is not None:
+            return cog
+        started = perf_counter()
+        try:
+            cog = getattr(importlib.import_module(lazy_cog.module_name), lazy_cog.class_name)(self)
+            self.add_cog(cog)
+        except Exception as e:
+            print(f'Error loading cog {lazy_cog.class_name} from {lazy_cog.module_name}: {str(e)}')
+            for command in [command for command, indexed in self.command_cogs.items() if indexed is lazy_cog]:
+                self.release_command(command, lazy_cog)
+            return None
+        metrics.cog_load_seconds.observe(perf_counter() - started)
+        return cog
+
+    async def reload_changed_cogs(self) -> list:
+        """
+        Reloads only the cog modules whose source changed since they were loaded, as recorded in the cog manifest, and
+        loads new modules. The cogs of deleted modules are removed. Cogs in unchanged modules keep running untouched,
+        along with their in-memory state.
+
+        A module that fails to import or whose cogs fail to initialize leaves its previous cogs running, and is not
+        retried until it is edited again.
+
+        :return: List of the module names that were reloaded, loaded or removed
+        """
+        if self.cog_manifest is None:
+            return []
+        changed_modules = []
+        file_paths = set()
         for root, directories, files in os.walk(COG_PATH):
             for file in files:
                 if str(file).endswith('.py'):
-                    # Check if the cog is already loaded. If so, skip.
-                    if self.get_cog(os.path.splitext(file)[0]) is not None:
+                    file_path = os.path.join(root, file)
+                    module_name = '.'.join(os.path.join(root, os.path.splitext(file)[0]).split(os.sep)[-2:])
+                    file_paths.add(file_path)
+                    if self.cog_manifest.lookup(file_path) is not None:
+                        continue
+                    try:
+                        stat = os.stat(file_path)
+                    except OSError:
+                        continue
+                    if self.failed_cog_files.get(file_path) == (stat.st_mtime_ns, stat.st_size):
                         continue
-                    file_path = '.'.join(os.path.join(root, os.path.splitext(file)[0]).split('\\')[-2:])
                     try:
-                        cog_module = importlib.import_module(file_path)
-                        if force_reload:
-                            importlib.reload(cog_module)
-                        # Look for classes
-                        for name, obj in inspect.getmembers(cog_module):
-                            if inspect.isclass(obj) and commands.Cog in inspect.getmro(obj):
-                                try:
-                                    self.add_cog(obj(self))
-                                except commands.InvalidCog as exc:
-                                    print(f'Error loading cog {str(obj)}: {exc}')
+                        self.swap_cog_module(file_path, module_name)
+                        self.failed_cog_files.pop(file_path, None)
+                        changed_modules.append(module_name)
                     except Exception as e:
-                        print(f'Error logging cog module at {str(file_path)}: {str(e)}')
+                        self.failed_cog_files[file_path] = (stat.st_mtime_ns, stat.st_size)
+                        print(f'Error reloading cog module at {module_name}. The previous version is still loaded: '
+                              f'{str(e)}')
+                        log(f'Error reloading cog module at {module_name}. The previous version is still loaded: '
+                            f'{str(e)}', LoggingLevel.Warn)
+
+        for file_path, entry in list(self.cog_manifest.entries.items()):
+            if file_path not in file_paths:
+                self.unload_cog_module(file_path)
+                changed_modules.append(entry['module'])
+        self.cog_manifest.prune(file_paths)
+        try:
+            self.cog_manifest.save()
+        except OSError as e:
+            log(f'The cog manifest could not be saved: {str(e)}', LoggingLevel.Warn)
+        if changed_modules:
+            log(f'Reloaded cog modules: {", ".join(changed_modules)}.', LoggingLevel.Info)
+        return changed_modules
+
+    def swap_cog_module(self, file_path: str, module_name: str):
+        """
+        Reloads one cog module and swaps its cogs for new instances. The new source runs in a fresh module object, and
+        every new cog is created before the running module or any running cog is touched, so a module that fails to
+        load leaves the previous version running exactly as it was. The swap itself does not yield to the event loop,
+        so no message or tick ever sees a mix of old and new cogs.
+
+        A cog module can define an unload() function releasing what its module-level globals hold, such as open files
+        or worker threads. It is called on the previous module once the swap succeeds, or on the new module if it
+        fails.
+
+        :param file_path: Path of the cog module
+        :param module_name: The module's import name, e.g. cogs.trivia
+        :return: None
+        """
+        import inspect
+        import importlib.util
+        import sys
+        spec = importlib.util.spec_from_file_location(module_name, file_path)
+        cog_module = importlib.util.module_from_spec(spec)
+        try:
+            spec.loader.exec_module(cog_module)
+            new_cogs = [obj(self) for name, obj in inspect.getmembers(cog_module)
+                        if inspect.isclass(obj) and commands.Cog in inspect.getmro(obj) and
+                        obj.__module__ == cog_module.__name__]
+        except Exception:
+            self.unload_module_globals(cog_module)
+            raise
+
+        previous_module = sys.modules.get(module_name)
+        sys.modules[module_name] = cog_module
+        package_name, _, child_name = module_name.rpartition('.')
+        if package_name in sys.modules:
+            setattr(sys.modules[package_name], child_name, cog_module)
+        self.unload_cog_module(file_path)
+        for cog in new_cogs:
+            if cog.name in self.cogs:
+                self.remove_cog(cog.name)
+            self.add_cog(cog)
+        self.cog_manifest.record(file_path, module_name, [self.describe_cog(cog) for cog in new_cogs])
+        if previous_module is not None and previous_module is not cog_module:
+            self.unload_module_globals(previous_module)
+
+    @staticmethod
+    def unload_module_globals(cog_module):
+        """
+        Calls a cog module's unload() function, if it has one. Failures are logged, since the module is no longer used.
+
+        :param cog_module: The module object
+        :return: None
+        """
+        unload = getattr(cog_module, 'unload', None)
+        if not callable(unload):
+            return
+        try:
+            unload()
+        except Exception as e:
+            log(f'Error unloading cog module {cog_module.__name__}: {str(e)}', LoggingLevel.Warn)
+
+    def unload_cog_module(self, file_path: str):
+        """
+        Removes the cogs the cog manifest records for a module, including any LazyCog placeholders.
+
+        :param file_path: Path of the cog module
+        :return: None
+        """
+        entry = self.cog_manifest.entries.get(file_path)
+        if entry is not None:
+            for record in entry['cogs']:
+                if record['name'] in self.cogs:
+                    self.remove_cog(record['name'])
+        for command, cog in list(self.command_cogs.items()):
+            if isinstance(cog, LazyCog) and cog.file_path == file_path:
+                self.release_command(command, cog)
+
+    def add_cog(self, cog: commands.Cog):
+        """
+        Adds the cog to the bot, to the execute dispatch index and to the tick scheduler.
+
+        :param cog: The Cog object being added
+        :return: None
+        """
+        super().add_cog(cog)
+        self.index_cog(cog)
+        self.schedule_cog(cog)
+
+    def remove_cog(self, cog_name: str):
+        """
+        Removes the cog from the tick scheduler, the execute dispatch index and the bot.
+
+        :param cog_name: The name of the cog being removed
+        :return: None
+        """
+        cog = self.get_cog(cog_name)
+        if cog is not None:
+            self.unindex_cog(cog)
+        self.unschedule_cog(cog_name)
+        super().remove_cog(cog_name)
+
+    def index_cog(self, cog: commands.Cog):
+        """
+        Registers a cog's execute function in the dispatch index used by event_message. Cogs named <Command>Cog are
+        reachable through <prefix><command>, and cogs with only_execute_on_command set to False also receive chat
+        messages: every message, or only those matching the ChatFilter returned by the cog's chat_filter() method if it
+        has one. Cogs without an execute function are not indexed.
+
+        :param cog: The Cog object being indexed
+        :return: None
+        """
+        if not callable(getattr(cog, 'execute', None)):
+            return
+        if cog.name.endswith('Cog'):
+            self.claim_command(cog.name[:-len('Cog')].lower(), cog)
+        if not getattr(cog, 'only_execute_on_command', True):
+            if callable(getattr(cog, 'chat_filter', None)):
+                self.update_chat_filter(cog)
+            elif cog not in self.listener_cogs:
+                self.listener_cogs.append(cog)
+
+    def unindex_cog(self, cog: commands.Cog):
+        """
+        Removes a cog from the dispatch index used by event_message.
+
+        :param cog: The Cog object being removed
+        :return: None
+        """
+        if cog.name.endswith('Cog'):
+            self.release_command(cog.name[:-len('Cog')].lower(), cog)
+        if cog in self.listener_cogs:
+            self.listener_cogs.remove(cog)
+        if self.chat_filters.pop(cog, None) is not None:
+            self.chat_matcher = ChatMatcher(self.chat_filters)
+
+    def claim_command(self, command: str, cog):
+        """
+        Points a command at a cog in the dispatch index, unless it is a text command in the command table. The text
+        command is kept and the collision is logged.
+
+        :param command: The command name, without the prefix
+        :param cog: The Cog object, or a LazyCog placeholder
+        :return: None
+        """
+        owner = self.command_cogs.get(command)
+        if owner is not None and owner is self.command_table:
+            log(f'{cog.name} answers to {self.prefix}{command}, which is already a text command. The text command is '
+                f'kept.', LoggingLevel.Warn)
+            return
+        self.command_cogs[command] = cog
+
+    def release_command(self, command: str, cog):
+        """
+        Removes a command from the dispatch index if it points at the cog. A text command by the same name becomes
+        reachable again.
+
+        :param command: The command name, without the prefix
+        :param cog: The Cog object, or a LazyCog placeholder
+        :return: None
+        """
+        if self.command_cogs.get(command) is not cog:
+            return
+        del self.command_cogs[command]
+        if self.command_table is not None and command in self.command_table.text_commands:
+            self.command_table.register(command)
+
+    def update_chat_filter(self, cog: commands.Cog):
+        """
+        Reads a listener cog's chat_filter() again and rebuilds the chat matcher. Cogs call this whenever the lines
+        they care about change, e.g. when a new trivia question brings new answers.
+
+        :param cog: The Cog object whose filter changed
+        :return: None
+        """
+        if self.cogs.get(cog.name) is not cog:
+            # Not added yet, or already removed. index_cog reads the filter when the cog is added.
+            return
+        chat_filter = cog.chat_filter()
+        if self.chat_filters.get(cog) == chat_filter:
+            return
+        self.chat_filters[cog] = chat_filter
+        self.chat_matcher = ChatMatcher(self.chat_filters)
 
     async def load_loyalty_points(self):
         """
-        Loads loyalty points from any existing loyalty.json file in the bot directory.
+        Loads the loyalty points of every configured channel from the loyalty directory, replaying any loyalty journal
+        entries recorded since each file was last compacted. A loyalty.json left in the bot directory by a
+        single-channel install is moved over to the first configured channel. Also warms the chatter identity cache
+        from the stored usernames.
 
         :return:
         """
-        if os.path.exists(LOYALTY_POINTS_PATH):
+        os.makedirs(LOYALTY_POINTS_FOLDER, exist_ok=True)
+        channel_names = get_settings().twitch.channel_names
+        if channel_names and os.path.exists(LOYALTY_POINTS_PATH):
+            legacy_journal_path = os.path.splitext(LOYALTY_POINTS_PATH)[0] + '_journal.jsonl'
+            channel_path = self.get_loyalty_points_path(channel_names[0])
+            if not os.path.exists(channel_path):
+                os.replace(LOYALTY_POINTS_PATH, channel_path)
+                if os.path.exists(legacy_journal_path):
+                    os.replace(legacy_journal_path, os.path.splitext(channel_path)[0] + '_journal.jsonl')
+                log(f'Moved loyalty.json to {channel_path}.', LoggingLevel.Info)
+
+        self.chatter_identities = ChatterIdentityCache(CHATTER_IDENTITIES_PATH)
+        self.chatter_identities.load()
+        for channel_name in channel_names:
+            self.chatter_identities.warm(self.get_channel_loyalty(channel_name).loyalty_points)
+
+    def queue_message(self, messageable, text: str, priority: int = Priority.Normal):
+        """
+        Queues a chat message on the send queue, which sends it once Twitch's rate limits allow. Every outbound chat
+        message should go through here rather than Channel.send so that the bot never exceeds those limits.
+
+        :param messageable: The Channel, or a Context whose channel the message should be sent to
+        :param text: The message text
+        :param priority: The Priority lane for the message. Higher priority messages are sent first.
+        :return: None
+        """
+        self.send_queue.enqueue(messageable, text, priority)
+
+    def reply(self, ctx: commands.Context, text: str):
+        # Replies to the bot's own administrative commands jump ahead of cog and timer messages
+        self.queue_message(ctx, text, Priority.High)
+
+    @staticmethod
+    def get_loyalty_points_path(channel_name: str) -> str:
+        return os.path.join(LOYALTY_POINTS_FOLDER, channel_name.lower() + '.json')
+
+    def get_channel_loyalty(self, channel_name: str) -> ChannelLoyalty:
+        """
+        Returns the loyalty points of a channel, loading them from disk the first time the channel is seen.
+
+        :param channel_name: The name of the channel
+        :return: The channel's ChannelLoyalty
+        """
+        channel_loyalty = self.channel_loyalty.get(channel_name.lower())
+        if channel_loyalty is None:
+            loyalty_points_path = self.get_loyalty_points_path(channel_name)
+            channel_loyalty = ChannelLoyalty(
+                channel_name.lower(), loyalty_points_path,
+                compaction_threshold=get_settings().general.lp_ledger_compaction_threshold)
             try:
-                with open(LOYALTY_POINTS_PATH, 'r') as loyalty_file:
-                    self.loyalty_points = load(loyalty_file)
+                channel_loyalty.load()
             except JSONDecodeError:
-                os.rename(LOYALTY_POINTS_PATH, os.path.splitext(LOYALTY_POINTS_PATH)[0] + '_backup.json')
-                log('The existing loyalty points file appears corrupted. It has been backed up and a new file has '
-                    'been created to record loyalty information. Please investigate.', LoggingLevel.Fatal)
+                os.rename(loyalty_points_path, os.path.splitext(loyalty_points_path)[0] + '_backup.json')
+                log(f'The existing loyalty points file for {channel_name} appears corrupted. It has been backed up '
+                    f'and a new file has been created to record loyalty information. Please investigate.',
+                    LoggingLevel.Fatal)
+                channel_loyalty.load()
+            self.channel_loyalty[channel_name.lower()] = channel_loyalty
+        return channel_loyalty
+
+    async def accrue_loyalty_points(self, channel):
+        """
+        Grants loyalty points to every chatter in the channel.
 
-    @routines.routine(seconds=1)
-    async def tick(self):
+        :param channel: The channel whose chatters earn points
+        :return: None
         """
-        Custom routine that runs each second and performs various operations:
+        log(f'Distributing loyalty points in {channel.name}.', LoggingLevel.Info)
+        started = perf_counter()
+        general_settings = get_settings().general
+        chatters = list(channel.chatters)
+        # Only chatters the identity cache has never seen cost a Helix call
+        chatter_ids = await self.chatter_identities.resolve(self, [chatter.name for chatter in chatters])
+        grants = {}
+        for chatter in chatters:
+            chatter_id = chatter_ids.get(chatter.name.lower())
+            if chatter_id is None:
+                continue
+            points_earned = general_settings.lp_number_earned
+            # Chatters only known from the NAMES list are PartialChatters, which carry no badges
+            if general_settings.lp_subscriber_doubling and getattr(chatter, 'is_subscriber', False):
+                points_earned = points_earned * 2
+            log(f'{chatter.name} with id {chatter_id} is receiving {str(points_earned)}'
+                f' loyalty points.', LoggingLevel.Info)
+            grants[chatter_id] = (chatter.name, points_earned)
+
+        # Only the balances that changed this interval are appended to the loyalty journal
+        self.get_channel_loyalty(channel.name).credit(grants)
+        metrics.loyalty_accrual_seconds.observe(perf_counter() - started)
+
+    def schedule_tasks(self):
+        """
+        Registers the bot's own recurring work with the scheduler. Cogs are registered as they are added.
 
-        -Invokes the tick() functions in each of the cogs. Deliberately works similarly to the Tick() function in
-            Streamlabs Chatbot scripts.
+        -Checks bot_config.ini for changes every second.
+        -Posts the timers created with !newtimer, each at its own interval.
+        -Checks the cogs directory for edited, new and deleted cog modules every cog_reload_interval_in_seconds, and
+            reloads only those.
         -Accumulates loyalty points if loyalty points are enabled. By default, works the same way as Twitch
             Channel Points, where you get 10 points every 5 minutes base and points are doubled for subscribers.
             Streaks do not exist (yet).
 
-        :return:
+        :return: None
+        """
+        # event_ready fires again after every reconnect, so tasks registered by an earlier call are replaced
+        if self.config_task is not None:
+            self.config_task.cancel()
+        self.config_task = self.scheduler.schedule_every('config', 1, self.check_config)
+        self.schedule_loyalty_points()
+        self.schedule_cog_watcher()
+        self.timers.schedule_all()
+
+    def schedule_loyalty_points(self):
+        """
+        (Re)registers loyalty point accrual at the configured earn interval.
+
+        :return: None
+        """
+        if self.loyalty_points_task is not None:
+            self.loyalty_points_task.cancel()
+        self.loyalty_points_task = self.scheduler.schedule_every(
+            'loyalty_points', get_settings().general.lp_earn_interval_in_seconds, self.distribute_loyalty_points)
+
+    def schedule_cog_watcher(self):
+        """
+        (Re)registers the cog file watcher at the configured interval. An interval of 0 turns it off, leaving cogs to
+        be reloaded with !reload_cogs.
+
+        :return: None
+        """
+        if self.cog_watcher_task is not None:
+            self.cog_watcher_task.cancel()
+            self.cog_watcher_task = None
+        interval = get_settings().general.cog_reload_interval_in_seconds
+        if interval > 0:
+            self.cog_watcher_task = self.scheduler.schedule_every('cog_watcher', interval, self.reload_changed_cogs)
+
+    def schedule_cog(self, cog: commands.Cog):
+        """
+        Registers a cog's tick() function with the scheduler, honoring the cog's tick_execution_interval in seconds.
+        Cogs without a positive tick_execution_interval are ticked every second. Deliberately works similarly to
+        the Tick() function in Streamlabs Chatbot scripts.
+
+        Each tick is cancelled if it runs longer than cog_tick_timeout_in_seconds, and a tick that comes due while the
+        previous one is still running is skipped. The task's counters record these overruns and failures.
+
+        :param cog: The Cog object being scheduled
+        :return: None
+        """
+        if not callable(getattr(cog, 'tick', None)):
+            return
+        interval = getattr(cog, 'tick_execution_interval', 1)
+        if not isinstance(interval, (int, float)) or interval <= 0:
+            interval = 1
+        self.cog_tick_tasks[cog.name] = self.scheduler.schedule_every(
+            cog.name, interval, lambda: self.tick_cog(cog),
+            timeout=get_settings().general.cog_tick_timeout_in_seconds)
+
+    def unschedule_cog(self, cog_name: str):
+        """
+        Cancels a cog's scheduled tick() function.
+
+        :param cog_name: The name of the cog
+        :return: None
+        """
+        task = self.cog_tick_tasks.pop(cog_name, None)
+        if task is not None:
+            task.cancel()
+
+    async def tick_cog(self, cog: commands.Cog):
+        """
+        Invokes a cog's tick() function for every joined channel concurrently. Every channel's failure is logged and
+        counted, and the first is raised so the scheduler records the run as failed.
+
+        :param cog: The Cog object being ticked
+        :return: None
+        """
+        tick_seconds = metrics.cog_tick_seconds.labels(cog.name)
+        channels = list(self.connected_channels)
+        results = await asyncio.gather(*[self.timed_tick(cog, channel, tick_seconds) for channel in channels],
+                                       return_exceptions=True)
+        errors = [(channel, result) for channel, result in zip(channels, results) if isinstance(result, Exception)]
+        for channel, error in errors:
+            metrics.cog_tick_failures.labels(cog.name).inc()
+            log(f'Error ticking cog {cog.name} in {channel.name}: {type(error).__name__}: {str(error)}',
+                LoggingLevel.Warn)
+        if errors:
+            raise errors[0][1]
+
+    @staticmethod
+    async def timed_tick(cog: commands.Cog, channel, tick_seconds: metrics.Histogram):
+        started = perf_counter()
+        try:
+            await cog.tick(channel)
+        finally:
+            tick_seconds.observe(perf_counter() - started)
+
+    async def check_config(self):
+        """
+        Reloads and applies bot_config.ini if it has been modified.
+
+        :return: None
+        """
+        try:
+            if reload_config_if_changed():
+                self.apply_settings()
+                log('Reloaded bot_config.ini.', LoggingLevel.Info)
+        except ConfigurationError as e:
+            log(f'bot_config.ini was modified but could not be loaded, so the previous settings are still in '
+                f'use: {str(e)}', LoggingLevel.Warn)
+
+    async def distribute_loyalty_points(self):
+        """
+        Accumulates loyalty points in every joined channel if loyalty points are enabled.
+
+        :return: None
         """
         # current_time = datetime.now()
         # if current_time > datetime.fromtimestamp(float(bot_creds['expiry_time'])):
         #     log('Access token has expired. Generating a new access token and reconnecting.', LoggingLevel.Warn)
         #     make_creds_file()
+        if get_settings().general.lp_enabled:
+            for channel in list(self.connected_channels):
+                await self.accrue_loyalty_points(channel)
 
-        if not self.tick_pause:
-            global tick_count
-            tick_count += 1
+    def apply_settings(self):
+        """
+        Applies the current settings snapshot to the attributes the bot keeps outside of it.
+
+        :return: None
+        """
+        settings = get_settings()
+        self.prefix = settings.general.prefix
+        self.channel_state.ttl = settings.twitch.channel_state_ttl_in_seconds
+        if (self.loyalty_points_task is not None and
+                self.loyalty_points_task.interval != settings.general.lp_earn_interval_in_seconds):
+            self.schedule_loyalty_points()
+        watcher_interval = self.cog_watcher_task.interval if self.cog_watcher_task is not None else 0
+        if watcher_interval != settings.general.cog_reload_interval_in_seconds:
+            self.schedule_cog_watcher()
+
+    def load_command_table(self):
+        """
+        Adds the built-in CommandTableCog, which answers the text commands created with !newcommand, and loads its
+        table from commands.json.
+
+        :return: None
+        """
+        if self.command_table is not None:
+            return
+        self.command_table = CommandTableCog(self, COMMAND_TABLE_PATH)
+        try:
+            self.command_table.load()
+        except (JSONDecodeError, KeyError, AttributeError):
+            os.replace(COMMAND_TABLE_PATH, os.path.splitext(COMMAND_TABLE_PATH)[0] + '_backup.json')
+            log('The existing commands file appears corrupted. It has been backed up and a new file will be created '
+                'when a command is added. Please investigate.', LoggingLevel.Fatal)
+            self.command_table.text_commands.clear()
+        self.add_cog(self.command_table)
+        self.migrate_command_cogs()
+
+    def migrate_command_cogs(self):
+        """
+        Moves the command cogs generated by earlier versions of !newcommand into the command table, so they can be
+        modified and deleted like any other text command. Each migrated module is renamed to <command>.py.migrated so
+        that it is no longer loaded. Cog modules that were edited by hand are left alone.
 
+        :return: None
+        """
+        migrated = []
+        for file in sorted(os.listdir(COG_PATH)) if os.path.isdir(COG_PATH) else []:
+            if not file.endswith('.py'):
+                continue
+            file_path = os.path.join(COG_PATH, file)
             try:
-                if (bot_config['General']['lp_enabled'] == 'True' and
-                        tick_count % int(bot_config['General']['lp_earn_interval_in_seconds']) == 0):
-                    log('Distributing loyalty points.', LoggingLevel.Info)
-                    try:
-                        int(bot_config['General']['lp_number_earned'])
-                        chatters = zip(self.connected_channels[0].chatters,
-                                       await self.fetch_users(names=[chatter.name for chatter
-                                                                     in self.connected_channels[0].chatters]))
-                        for chatter, attributes in chatters:
-                            points_earned = int(bot_config['General']['lp_number_earned'])
-                            if bot_config['General']['lp_subscriber_doubling'] == 'True' and chatter.is_subscriber:
-                                points_earned = points_earned * 2
-                            log(f'{chatter.name} with id {str(attributes.id)} is receiving {str(points_earned)}'
-                                f' loyalty points.', LoggingLevel.Info)
-                            try:
-                                self.loyalty_points[str(attributes.id)]['loyalty_points'] = str(
-                                    int(self.loyalty_points[str(attributes.id)]['loyalty_points']) +
-                                    points_earned)
-                            except KeyError:
-                                # Chatter did not exist in the dictionary of loyalty points
-                                self.loyalty_points[str(attributes.id)] = {
-                                    'loyalty_points': points_earned,
-                                    'username': chatter.name
-                                }
-                            except ValueError:
-                                # Chatter did not have loyalty points
-                                self.loyalty_points[str(attributes.id)]['loyalty_points'] = \
-                                    points_earned
-
-                        with open(LOYALTY_POINTS_PATH, 'w') as loyalty_file:
-                            loyalty_file.write(dumps(self.loyalty_points))
-                    except ValueError:
-                        log_to_file('The value for loyalty_points_number_earned is not an integer. '
-                                    'Points cannot be rewarded.',
-                                    LoggingLevel.Warn)
-            except ValueError:
-                log_to_file('The value for loyalty_points_earn_interval_in_seconds is not an integer. '
-                            'Points cannot be rewarded.',
-                            LoggingLevel.Warn)
-
-            # Uses list comprehension for protection against RuntimeError: dictionary keys changed during iteration
-            for cog_name in [name for name in self.cogs]:
-                cog = self.get_cog(cog_name)
-                try:
-                    await cog.tick(self.connected_channels[0])
-                except (TypeError, AttributeError):
-                    pass
+                with open(file_path, 'r') as cog_file:
+                    command = parse_command_cog(cog_file.read(), os.path.splitext(file)[0])
+            except (OSError, UnicodeDecodeError):
+                continue
+            if command is None:
+                continue
+            try:
+                if command.name not in self.command_table.text_commands:
+                    self.command_table.set_command(command)
+                os.replace(file_path, file_path + '.migrated')
+            except OSError as e:
+                log(f'The command cog at {file_path} could not be moved into the command table: {str(e)}',
+                    LoggingLevel.Warn)
+                continue
+            migrated.append(command.name)
+        if migrated:
+            log(f'Moved the generated command cogs for {", ".join(migrated)} into the command table. Their modules '
+                f'were renamed to <command>.py.migrated.', LoggingLevel.Info)
+
+    def load_timers(self):
+        """
+        Loads the timers created with !newtimer from timers.json. They are scheduled along with the bot's other tasks.
+
+        :return: None
+        """
+        if self.timers.table_path is not None:
+            return
+        try:
+            self.timers.load(TIMER_TABLE_PATH)
+        except (JSONDecodeError, KeyError, AttributeError, ValueError):
+            os.replace(TIMER_TABLE_PATH, os.path.splitext(TIMER_TABLE_PATH)[0] + '_backup.json')
+            log('The existing timers file appears corrupted. It has been backed up and a new file will be created '
+                'when a timer is added. Please investigate.', LoggingLevel.Fatal)
+            self.timers.timers.clear()
 
     async def event_ready(self):
         """
@@ -186,14 +828,25 @@ class Bot(commands.Bot):
         :return:
         """
         print(f"Successfully logged in as {self.nick}.")
+        self.load_command_table()
+        self.load_timers()
         await self.load_cogs()
         await self.load_loyalty_points()
-        self.tick.start()
+        self.schedule_tasks()
+        self.scheduler.start()
+        if not self.startup_recorded:
+            metrics.startup_seconds.set(perf_counter() - self.created_at)
+            self.startup_recorded = True
+        metrics_port = get_settings().general.metrics_port
+        if metrics_port > 0:
+            await metrics.registry.start_server(metrics_port)
+            print(f'Serving metrics at http://127.0.0.1:{metrics_port}/metrics.')
 
     async def event_message(self, message):
         """
-        Receives messages. If the message starts with the command prefix iterates over all Cog objects, invoking
-        the Cog's execute function. Also executes self.handle_commands to run standard bot commands.
+        Receives messages. Invokes the execute function of every listener cog and, if the message starts with the
+        command prefix, of the cog that owns the command. The message is parsed once into a ParsedMessage that the cogs
+        read from context.parsed. Also executes self.handle_commands to run standard bot commands.
 
         :param message: The chat message causing the event.
         :return:
@@ -202,191 +855,295 @@ class Bot(commands.Bot):
         # For now we just want to ignore them...
         if message.echo:
             return
+        metrics.chat_messages.inc()
+        self.timers.count_message(message.channel.name)
+
+        parsed = ParsedMessage(message, self.prefix)
+
+        # Commands only reach the cog that owns them; plain chat only reaches the listener cogs whose filters match it
+        receivers = self.listener_cogs
+        if self.chat_filters:
+            matched_cogs = self.chat_matcher.match(parsed)
+            if matched_cogs:
+                receivers = receivers + matched_cogs
+        command_cog = None
+        if parsed.is_command:
+            command_cog = self.command_cogs.get(parsed.command)
+            if command_cog is not None and command_cog not in receivers:
+                receivers = receivers + [command_cog]
+
+        if receivers:
+            message_context = await self.get_context(message)
+            message_context.parsed = parsed
+            for cog in receivers:
+                started = perf_counter()
+                await cog.execute(message_context)
+                metrics.cog_execute_seconds.labels(cog.name).observe(perf_counter() - started)
 
         # Since we have commands and are overriding the default `event_message`
         # We must let the bot know we want to handle and invoke our commands...
-        message_context = await self.get_context(message)
-        command = str(message.content).split(' ')[0][1:]
-
-        for cog_name in self.cogs:
-            cog = self.get_cog(cog_name)
-            try:
-                # only_execute_on_command is a variable that determines whether the bot should only run the cog's
-                #   execute function if the
-                if cog_name == command.title() + 'Cog' or not cog.only_execute_on_command:
-                    await cog.execute(message_context)
-            except AttributeError:
-                pass
-
-        if str(message.content).startswith(self.prefix):
+        # Commands owned by a cog are not the bot's, so they are not passed on to be reported as not found
+        if parsed.is_command and command_cog is None:
             await self.handle_commands(message)
 
+    async def event_command_error(self, context: commands.Context, error: Exception):
+        """
+        TwitchIO event handler for command errors. get_context reports every prefixed message that is not one of the
+        bot's own commands as not found, including the commands cogs answer, so those reports are dropped.
+
+        :param context: The command context
+        :param error: The exception raised
+        :return: None
+        """
+        if isinstance(error, commands.CommandNotFound) and str(error.name).lower() in self.command_cogs:
+            return
+        await super().event_command_error(context, error)
+
     @commands.command(aliases=[bot_config['General']['lp_type'].lower()])
     async def loyalty(self, ctx: commands.Context):
-        try:
-            await ctx.send(f'@{ctx.author.name}: Your current amount of {bot_config["General"]["lp_type"]} is '
-                           f'{self.loyalty_points[ctx.author.id]["loyalty_points"]}.')
-        except (KeyError, ValueError):
-            await ctx.send(f'@{ctx.author.name}: Your do not currently have any {bot_config["General"]["lp_type"]}.')
+        balance = self.get_channel_loyalty(ctx.channel.name).get_balance(ctx.author.id)
+        if balance is not None:
+            self.reply(ctx, f'@{ctx.author.name}: Your current amount of {get_settings().general.lp_type} is '
+                            f'{balance}.')
+        else:
+            self.reply(ctx, f'@{ctx.author.name}: Your do not currently have any {get_settings().general.lp_type}.')
 
     @commands.command(aliases=['recog'])
     async def reload_cogs(self, ctx: commands.Context):
         """
-        Reloads all cogs and cog modules. Can be used to apply updated cog code without restarting the whole bot.
+        Reloads the cog modules that changed since they were loaded, without disturbing any other cog. Can be used to
+        apply updated cog code without restarting the whole bot or waiting for the cog file watcher.
+        "!reload_cogs all" removes every cog and reloads every cog module instead.
 
         :return:
         """
-        if not (ctx.author.name == self.connected_channels[0].name) and not \
+        if not (ctx.author.name == ctx.channel.name) and not \
                 check_permissions(username=ctx.author.name,
-                                  permission=bot_config['Command_Permissions']['reload_cogs']):
-            await ctx.send(f'Sorry, @{ctx.author.name}, you do not have the '
-                           f'required permissions to '
-                           f'use that command.')
+                                  permission=get_settings().command_permissions['reload_cogs']):
+            self.reply(ctx, f'Sorry, @{ctx.author.name}, you do not have the '
+                            f'required permissions to '
+                            f'use that command.')
             return
 
-        self.tick_pause = True
+        if str(ctx.message.content).split(' ')[1:2] != ['all']:
+            changed_modules = await self.reload_changed_cogs()
+            if changed_modules:
+                self.reply(ctx, f'Reloaded {", ".join(changed_modules)}.')
+            else:
+                self.reply(ctx, 'No cog modules have changed.')
+            return
+
+        self.scheduler.paused = True
         # Uses list comprehension for protection against RuntimeError: dictionary keys changed during iteration
-        for cog_name in [name for name in self.cogs]:
+        for cog_name in [name for name, cog in self.cogs.items() if cog is not self.command_table]:
             self.remove_cog(cog_name)
         await self.load_cogs(force_reload=True)
-        self.tick_pause = False
+        self.scheduler.paused = False
+        self.reply(ctx, 'Reloaded all cogs.')
 
     @commands.command()
-    async def newcommand(self, ctx: commands.Context, replace=False):
+    async def newcommand(self, ctx: commands.Context):
         """
-        Uses the cog.template.py file to create a .py file in the cogs directory containing the code necessary
-        to create and run a new Cog object, then adds the cog to the bot. Sends chat confirmation.
+        Adds a text command to the command table. Sends chat confirmation.
 
         :param ctx: Context containing the chat message and ability to send messages back to chat
-        :param replace: Boolean that determines whether an existing cog file should be replaced
         :return: None
         """
-        if not (ctx.author.name == self.connected_channels[0].name) and not \
+        if not (ctx.author.name == ctx.channel.name) and not \
                 check_permissions(username=ctx.author.name,
-                                  permission=bot_config['Command_Permissions']['newcommand']):
-            await ctx.send(f'Sorry, @{ctx.author.name}, you do not have the '
-                           f'required permissions to '
-                           f'use that command.')
-            return
-
-        from cog_template import create_command_cog
-        success = await create_command_cog(ctx, replace)
-        if success:
-            await self.load_cogs()
-            if replace:
-                await ctx.send('Command modified.')
-            else:
-                await ctx.send('Command created.')
+                                  permission=get_settings().command_permissions['newcommand']):
+            self.reply(ctx, f'Sorry, @{ctx.author.name}, you do not have the '
+                            f'required permissions to '
+                            f'use that command.')
+            return
+
+        await self.set_text_command(ctx, replace=False)
+
+    async def set_text_command(self, ctx: commands.Context, replace: bool):
+        """
+        Adds or replaces a text command in the command table from a !newcommand or !modifycommand message. Sends chat
+        confirmation.
+
+        :param ctx: Context containing the chat message and ability to send messages back to chat
+        :param replace: Boolean that determines whether an existing command should be replaced
+        :return: None
+        """
+        try:
+            command = parse_command_definition(ctx.message.content)
+        except ValueError as e:
+            self.reply(ctx, str(e))
+            return
+        if self.command_table.is_taken(command.name):
+            self.reply(ctx, f'{self.prefix}{command.name} is handled by a cog or the bot itself and cannot be '
+                            f'replaced by a text command.')
+            return
+        exists = command.name in self.command_table.text_commands
+        if exists and not replace:
+            self.reply(ctx, 'A command by that name already exists. To replace it, use the !modifycommand command.')
+            return
+        if not exists and replace:
+            self.reply(ctx, f'No command exists with the name {command.name}. To create it, use the !newcommand '
+                            f'command.')
+            return
+        try:
+            self.command_table.set_command(command)
+        except OSError as e:
+            self.reply(ctx, f'An error occurred trying to save the command: {str(e)}.')
+            return
+        if replace:
+            self.reply(ctx, 'Command modified.')
+        else:
+            self.reply(ctx, 'Command created.')
 
     @commands.command()
-    async def newtimer(self, ctx: commands.Context, replace=False):
+    async def newtimer(self, ctx: commands.Context):
         """
-        Uses the cog.template.py file to create a .py file in the cogs directory containing the code necessary
-        to create and run a new Cog object, then adds the cog to the bot. Sends chat confirmation.
+        Adds a timer to the timer table. The timer posts its message in the channel it was created in once every
+        interval. Sends chat confirmation.
 
         :param ctx: Context containing the chat message and ability to send messages back to chat
-        :param replace: Boolean that determines whether an existing cog file should be replaced
         :return: None
         """
-        if not (ctx.author.name == self.connected_channels[0].name) and not \
+        if not (ctx.author.name == ctx.channel.name) and not \
                 check_permissions(username=ctx.author.name,
-                                  permission=bot_config['Command_Permissions']['newtimer']):
-            await ctx.send(f'Sorry, @{ctx.author.name}, you do not have the '
-                           f'required permissions to '
-                           f'use that command.')
-            return
-
-        from cog_template import create_timer_cog
-        success = await create_timer_cog(ctx, replace)
-        if success:
-            await self.load_cogs()
-            if replace:
-                await ctx.send('Timer modified.')
-            else:
-                await ctx.send('Timer created.')
+                                  permission=get_settings().command_permissions['newtimer']):
+            self.reply(ctx, f'Sorry, @{ctx.author.name}, you do not have the '
+                            f'required permissions to '
+                            f'use that command.')
+            return
+
+        self.set_timer(ctx, replace=False)
+
+    def set_timer(self, ctx: commands.Context, replace: bool):
+        """
+        Adds or replaces a timer in the timer table from a !newtimer or !modifytimer message. Sends chat confirmation.
+
+        :param ctx: Context containing the chat message and ability to send messages back to chat
+        :param replace: Boolean that determines whether an existing timer should be replaced
+        :return: None
+        """
+        try:
+            timer = parse_timer_definition(ctx.message.content, ctx.channel.name)
+        except ValueError as e:
+            self.reply(ctx, str(e))
+            return
+        exists = timer.name in self.timers.timers
+        if exists and not replace:
+            self.reply(ctx, 'A timer by that name already exists. To replace it, use the !modifytimer command.')
+            return
+        if not exists and replace:
+            self.reply(ctx, f'No timer exists with the name {timer.name}. To create it, use the !newtimer command.')
+            return
+        try:
+            self.timers.set_timer(timer)
+        except OSError as e:
+            self.reply(ctx, f'An error occurred trying to save the timer: {str(e)}.')
+            return
+        if replace:
+            self.reply(ctx, 'Timer modified.')
+        else:
+            self.reply(ctx, 'Timer created.')
 
     @commands.command()
-    async def modifycommand(self, ctx: commands.Context, replace=True):
+    async def modifycommand(self, ctx: commands.Context):
         """
-        Uses the cog.template.py file to create a .py file in the cogs directory containing the code necessary
-        to create and run a new Cog object, then adds the cog to the bot. Sends chat confirmation.
+        Replaces the response and permissions of a text command in the command table. Sends chat confirmation.
 
         :param ctx: Context containing the chat message and ability to send messages back to chat
-        :param replace: Boolean that determines whether an existing cog file should be replaced
         :return: None
         """
-        if not (ctx.author.name == self.connected_channels[0].name) and not \
+        if not (ctx.author.name == ctx.channel.name) and not \
                 check_permissions(username=ctx.author.name,
-                                  permission=bot_config['Command_Permissions']['modifycommand']):
-            await ctx.send(f'Sorry, @{ctx.author.name}, you do not have the '
-                           f'required permissions to '
-                           f'use that command.')
+                                  permission=get_settings().command_permissions['modifycommand']):
+            self.reply(ctx, f'Sorry, @{ctx.author.name}, you do not have the '
+                            f'required permissions to '
+                            f'use that command.')
             return
 
-        await self.newcommand(ctx, replace)
+        await self.set_text_command(ctx, replace=True)
 
     @commands.command()
-    async def modifytimer(self, ctx: commands.Context, replace=True):
+    async def modifytimer(self, ctx: commands.Context):
         """
-        Uses the cog.template.py file to create a .py file in the cogs directory containing the code necessary
-        to create and run a new Cog object, then adds the cog to the bot. Sends chat confirmation.
+        Replaces the interval, chat activity minimum and message of a timer in the timer table. The timer moves to the
+        channel it was modified in. Sends chat confirmation.
 
         :param ctx: Context containing the chat message and ability to send messages back to chat
-        :param replace: Boolean that determines whether an existing cog file should be replaced
         :return: None
         """
-        if not (ctx.author.name == self.connected_channels[0].name) and not \
+        if not (ctx.author.name == ctx.channel.name) and not \
                 check_permissions(username=ctx.author.name,
-                                  permission=bot_config['Command_Permissions']['modifytimer']):
-            await ctx.send(f'Sorry, @{ctx.author.name}, you do not have the '
-                           f'required permissions to '
-                           f'use that command.')
+                                  permission=get_settings().command_permissions['modifytimer']):
+            self.reply(ctx, f'Sorry, @{ctx.author.name}, you do not have the '
+                            f'required permissions to '
+                            f'use that command.')
             return
 
-        await self.newtimer(ctx, replace)
+        self.set_timer(ctx, replace=True)
 
     @commands.command()
-    async def delcommand(self, ctx: commands.Context, cog_type='Command'):
+    async def delcommand(self, ctx: commands.Context):
         """
-        Uses the cog.template.py file to delete a .py file in the cogs directory and remove the Cog object
-        from the bot. Sends chat confirmation.
+        Removes a text command from the command table. Sends chat confirmation.
 
         :param ctx: Context containing the chat message and ability to send messages back to chat
-        :param cog_type: The type of cog being deleted.
         :return: None
         """
-        if not (ctx.author.name == self.connected_channels[0].name) and not \
+        if not (ctx.author.name == ctx.channel.name) and not \
                 check_permissions(username=ctx.author.name,
-                                  permission=bot_config['Command_Permissions']['delcommand']):
-            await ctx.send(f'Sorry, @{ctx.author.name}, you do not have the '
-                           f'required permissions to '
-                           f'use that command.')
+                                  permission=get_settings().command_permissions['delcommand']):
+            self.reply(ctx, f'Sorry, @{ctx.author.name}, you do not have the '
+                            f'required permissions to '
+                            f'use that command.')
             return
 
-        from cog_template import delete_cog
-        success = await delete_cog(ctx, cog_type)
-        if success:
-            self.remove_cog(self.get_cog(str(ctx.message)).name)
-        await ctx.send(f'{cog_type} deleted.')
+        args = str(ctx.message.content).split()
+        if len(args) != 2:
+            self.reply(ctx, 'delcommand syntax: "!delcommand command_name".')
+            return
+        name = args[1].lower()
+        if name.startswith(self.prefix):
+            name = name[len(self.prefix):]
+        try:
+            deleted = self.command_table.delete_command(name)
+        except OSError as e:
+            self.reply(ctx, f'An error occurred trying to remove the command: {str(e)}.')
+            return
+        if deleted:
+            self.reply(ctx, 'Command deleted.')
+        else:
+            self.reply(ctx, f'No command exists with the name {name}.')
 
     @commands.command()
     async def deltimer(self, ctx: commands.Context):
         """
-        Uses the cog.template.py file to delete a .py file in the cogs directory and remove the Cog object
-        from the bot. Sends chat confirmation.
+        Removes a timer from the timer table. Sends chat confirmation.
 
         :param ctx: Context containing the message
         :return: None
         """
-        if not (ctx.author.name == self.connected_channels[0].name) and not \
+        if not (ctx.author.name == ctx.channel.name) and not \
                 check_permissions(username=ctx.author.name,
-                                  permission=bot_config['Command_Permissions']['deltimer']):
-            await ctx.send(f'Sorry, @{ctx.author.name}, you do not have the '
-                           f'required permissions to '
-                           f'use that command.')
+                                  permission=get_settings().command_permissions['deltimer']):
+            self.reply(ctx, f'Sorry, @{ctx.author.name}, you do not have the '
+                            f'required permissions to '
+                            f'use that command.')
             return
 
-        await self.delcommand(ctx, 'Timer')
+        args = str(ctx.message.content).split()
+        if len(args) != 2:
+            self.reply(ctx, 'deltimer syntax: "!deltimer timer_name".')
+            return
+        name = args[1].lower()
+        try:
+            deleted = self.timers.delete_timer(name)
+        except OSError as e:
+            self.reply(ctx, f'An error occurred trying to remove the timer: {str(e)}.')
+            return
+        if deleted:
+            self.reply(ctx, 'Timer deleted.')
+        else:
+            self.reply(ctx, f'No timer exists with the name {name}.')
 
     @commands.command()
     async def addperms(self, ctx: commands.Context):
@@ -397,17 +1154,17 @@ class Bot(commands.Bot):
         :param ctx: Context containing the chat message and ability to send messages back to chat
         :return: None
         """
-        if not (ctx.author.name == self.connected_channels[0].name) and not \
+        if not (ctx.author.name == ctx.channel.name) and not \
                 check_permissions(username=ctx.author.name,
-                                  permission=bot_config['Command_Permissions']['addperms']):
-            await ctx.send(f'Sorry, @{ctx.author.name}, you do not have the '
-                           f'required permissions to '
-                           f'use that command.')
+                                  permission=get_settings().command_permissions['addperms']):
+            self.reply(ctx, f'Sorry, @{ctx.author.name}, you do not have the '
+                            f'required permissions to '
+                            f'use that command.')
             return
 
         args = ' '.join(str(ctx.message.content).split(' ')[1:]).split(',')
         if not len(args) > 1:
-            await ctx.send('Command syntax: !addperms <username>,<permission level>(,<permission level>,...)')
+            self.reply(ctx, 'Command syntax: !addperms <username>,<permission level>(,<permission level>,...)')
             return
         username = str(args.pop(0).strip().lower())
         for permission_level in args:
@@ -423,9 +1180,9 @@ class Bot(commands.Bot):
             else:
                 bot_config.add_section('Permissions')
                 bot_config['Permissions'][permission_level] = username
-        with open(BOT_CONFIG_PATH, 'w') as config_file:
-            bot_config.write(config_file)
-        await ctx.send('Permissions added.')
+            permission_index.grant(username, permission_level)
+        save_config()
+        self.reply(ctx, 'Permissions added.')
 
     @commands.command()
     async def delperms(self, ctx: commands.Context):
@@ -436,25 +1193,24 @@ class Bot(commands.Bot):
         :param ctx: Context containing the chat message and ability to send messages back to chat
         :return: None
         """
-        if not (ctx.author.name == self.connected_channels[0].name) and not \
+        if not (ctx.author.name == ctx.channel.name) and not \
                 check_permissions(username=ctx.author.name,
-                                  permission=bot_config['Command_Permissions']['delperms']):
-            await ctx.send(f'Sorry, @{ctx.author.name}, you do not have the '
-                           f'required permissions to '
-                           f'use that command.')
+                                  permission=get_settings().command_permissions['delperms']):
+            self.reply(ctx, f'Sorry, @{ctx.author.name}, you do not have the '
+                            f'required permissions to '
+                            f'use that command.')
             return
 
-        global BOT_CONFIG_PATH
         args = ' '.join(str(ctx.message.content).split(' ')[1:]).split(',')
         if not len(args) > 1:
-            await ctx.send('Command syntax: !delperms <username>,<permission level>(,<permission level>,...)')
+            self.reply(ctx, 'Command syntax: !delperms <username>,<permission level>(,<permission level>,...)')
             return
         username = str(args.pop(0).strip().lower())
         for permission_level in args:
             permission_level = str(permission_level).strip().lower()
-            if not bot_config.config.has_section('Permissions'):
+            if not bot_config.has_section('Permissions'):
                 break
-            if not bot_config.config.has_option('Permissions', permission_level):
+            if not bot_config.has_option('Permissions', permission_level):
                 continue
             existing_users = bot_config['Permissions'][permission_level].split(',')
             if username in existing_users:
@@ -463,9 +1219,9 @@ class Bot(commands.Bot):
                     bot_config.remove_option('Permissions', permission_level)
                 else:
                     bot_config['Permissions'][permission_level] = ','.join(existing_users)
-        with open(BOT_CONFIG_PATH, 'w') as config_file:
-            bot_config.write(config_file)
-        await ctx.send('Permissions deleted.')
+                permission_index.revoke(username, permission_level, bot_config)
+        save_config()
+        self.reply(ctx, 'Permissions deleted.')
 
     @commands.command()
     async def shutdown(self, ctx: commands.Context):
@@ -475,12 +1231,12 @@ class Bot(commands.Bot):
         :param ctx: Context containing the chat message and ability to send messages back to chat
         :return: None
         """
-        if not (ctx.author.name == self.connected_channels[0].name) and not \
+        if not (ctx.author.name == ctx.channel.name) and not \
                 check_permissions(username=ctx.author.name,
-                                  permission=bot_config['Command_Permissions']['shutdown']):
-            await ctx.send(f'Sorry, @{ctx.author.name}, you do not have the '
-                           f'required permissions to '
-                           f'use that command.')
+                                  permission=get_settings().command_permissions['shutdown']):
+            self.reply(ctx, f'Sorry, @{ctx.author.name}, you do not have the '
+                            f'required permissions to '
+                            f'use that command.')
             return
 
         from asyncio.exceptions import CancelledError
@@ -489,7 +1245,11 @@ class Bot(commands.Bot):
             await self.close()
         except CancelledError:
             pass
-        self.tick.stop()
+        self.scheduler.stop()
+        self.send_queue.stop()
+        metrics.registry.stop_server()
+        for channel_loyalty in self.channel_loyalty.values():
+            channel_loyalty.ledger.close()
         self.loop.stop()
 
     @commands.command()
@@ -501,28 +1261,32 @@ class Bot(commands.Bot):
         :return: None
         """
 
-        if not (ctx.author.name == self.connected_channels[0].name) and not \
+        if not (ctx.author.name == ctx.channel.name) and not \
                 check_permissions(username=ctx.author.name,
-                                  permission=bot_config['Command_Permissions']['reconnect']):
-            await ctx.send(f'Sorry, @{ctx.author.name}, you do not have the '
-                           f'required permissions to '
-                           f'use that command.')
-            return
-
-        import bot_configuration
-        await ctx.send("Restarting...")
-        self.tick.stop()
-        reload(bot_configuration)
-        self.prefix = bot_config['General']['prefix']
-        self.token = bot_config['Twitch']['token']
-        self.secret = bot_config['Twitch']['secret']
-        self.initial_channels = bot_config['Twitch']['channels'].split(',')
-        self.heartbeat = int(bot_config['Twitch']['heartbeat_duration_in_seconds'])
-        self.retain_cache = bool(bot_config['Twitch']['retain_cache'])
+                                  permission=get_settings().command_permissions['reconnect']):
+            self.reply(ctx, f'Sorry, @{ctx.author.name}, you do not have the '
+                            f'required permissions to '
+                            f'use that command.')
+            return
+
+        self.reply(ctx, "Restarting...")
+        self.scheduler.stop()
+        try:
+            reload_config_if_changed()
+        except ConfigurationError as e:
+            self.reply(ctx, f'bot_config.ini could not be loaded, so the previous settings are still in use: {str(e)}')
+        settings = get_settings()
+        self.apply_settings()
+        self.token = settings.twitch.token
+        self.secret = settings.twitch.secret
+        self.initial_channels = settings.twitch.channel_names
+        self.heartbeat = settings.twitch.heartbeat_duration_in_seconds
+        self.retain_cache = settings.twitch.retain_cache
+        self.channel_state.invalidate()
         self._closing = False
         await self.connect()
-        self.tick.start()
-        await ctx.send("Reconnection complete.")
+        self.scheduler.start()
+        self.reply(ctx, "Reconnection complete.")
 
 
 def log(log_string: str, log_level=LoggingLevel.str_to_int.get("All")):
@@ -533,16 +1297,19 @@ def log(log_string: str, log_level=LoggingLevel.str_to_int.get("All")):
     :param log_level: The severity of the log entry
     :return:
     """
-    if bot_config.get('General', 'enable_file_logging') == 'True':
+    if get_settings().general.enable_file_logging:
         log_to_file(BOT_LOG_PATH, log_string, log_level)
 
 
 if __name__ == "__main__":
+    bot_settings = get_settings()
     Bot(
-        token=bot_config['Twitch']['token'],
-        secret=bot_config['Twitch']['secret'],
-        prefix=bot_config['General']['prefix'],
-        channels=bot_config['Twitch']['channels'].split(','),
-        heartbeat=int(bot_config['Twitch']['heartbeat_duration_in_seconds']),
-        retain_cache=bool(bot_config['Twitch']['retain_cache'])
+        token=bot_settings.twitch.token,
+        secret=bot_settings.twitch.secret,
+        prefix=bot_settings.general.prefix,
+        channels=bot_settings.twitch.channel_names,
+        heartbeat=bot_settings.twitch.heartbeat_duration_in_seconds,
+        retain_cache=bot_settings.twitch.retain_cache,
+        channel_state_ttl=bot_settings.twitch.channel_state_ttl_in_seconds,
+        local_twitch_url=bot_settings.twitch.local_twitch_url
     ).run()
@@ -1,6 +1,15 @@
-from time import time
+import atexit
+import gzip
+import os
+import re
+import shutil
+import unicodedata
+from time import time, monotonic, perf_counter
 from datetime import datetime
 from math import floor
+from queue import Queue, Empty
+from threading import Thread, Lock
+from metrics import file_write_seconds
 
 
 def get_formatted_time_diff(end_time: float, start_time: float = None):
@@ -23,6 +32,24 @@ def get_formatted_time_diff(end_time: float, start_time: float = None):
     return return_string
 
 
+NON_WORD_CHARACTERS = re.compile(r"[^\w\s]")
+LEADING_ARTICLE = re.compile(r"^(?:the|an|a)\s+")
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalizes free text for forgiving comparisons: applies Unicode NFKC, folds case, removes punctuation,
+    collapses whitespace and drops a leading article ("the", "a", "an"). If dropping the article would leave nothing,
+    the article is kept.
+
+    :param text: The text to normalize
+    :return: The normalized text
+    """
+    text = NON_WORD_CHARACTERS.sub('', unicodedata.normalize('NFKC', str(text)).casefold())
+    text = ' '.join(text.split())
+    return LEADING_ARTICLE.sub('', text) or text
+
+
 class LoggingLevel:
     All = 1
     Debug = 2
@@ -50,20 +77,137 @@ class LoggingLevel:
     }
 
 
+class LogWriter:
+    """
+    Buffered log file writer. Records are put on a queue by the caller and written by a background thread that keeps
+    the file open, flushes in batches once batch_size records are waiting or flush_interval seconds have passed, and
+    rotates the file once it grows past max_bytes. Rotated files are gzip-compressed on the writer thread, so callers
+    on the event loop never wait on disk.
+    """
+    def __init__(self, log_file_path: str, batch_size: int = 256, flush_interval: float = 1.0,
+                 max_bytes: int = 10 * 1024 * 1024, backup_count: int = 5):
+        self.log_file_path = log_file_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._queue = Queue()
+        self._log_file = None
+        self._thread = Thread(target=self._run, name=f'LogWriter({os.path.basename(log_file_path)})', daemon=True)
+        self._thread.start()
+
+    def write(self, line: str):
+        """
+        Queues a line to be written to the log file. Never blocks.
+
+        :param line: The complete line, including the trailing newline
+        :return: None
+        """
+        self._queue.put(line)
+
+    def close(self):
+        """
+        Flushes every queued line, closes the log file and stops the writer thread.
+
+        :return: None
+        """
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def _run(self):
+        closing = False
+        while not closing:
+            batch = []
+            deadline = monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    line = self._queue.get(timeout=max(0.0, deadline - monotonic()))
+                except Empty:
+                    break
+                if line is None:
+                    closing = True
+                    break
+                batch.append(line)
+            if batch:
+                try:
+                    self._write_batch(batch)
+                except OSError as e:
+                    print(f'Error writing to log file {self.log_file_path}: {str(e)}')
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
+
+    def _write_batch(self, batch: list):
+        started = perf_counter()
+        if self._log_file is None:
+            self._log_file = open(self.log_file_path, 'a+')
+        self._log_file.writelines(batch)
+        self._log_file.flush()
+        file_write_seconds.labels('log').observe(perf_counter() - started)
+        if 0 < self.max_bytes <= self._log_file.tell():
+            self._rotate()
+
+    def _rotate(self):
+        self._log_file.close()
+        self._log_file = None
+        root, extension = os.path.splitext(self.log_file_path)
+        # Shift older archives up by one, dropping whatever falls off the end
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f'{root}.{index}{extension}.gz'
+            if os.path.exists(source):
+                os.replace(source, f'{root}.{index + 1}{extension}.gz')
+        if self.backup_count > 0:
+            with open(self.log_file_path, 'rb') as source, gzip.open(f'{root}.1{extension}.gz', 'wb') as archive:
+                shutil.copyfileobj(source, archive)
+        os.remove(self.log_file_path)
+
+
+log_writers = {}
+log_writers_lock = Lock()
+
+
+def get_log_writer(log_file_path: str) -> LogWriter:
+    """
+    Returns the LogWriter for a log file, creating it on first use.
+
+    :param log_file_path: String path to the logging file
+    :return: The LogWriter that owns the file
+    """
+    log_writer = log_writers.get(log_file_path)
+    if log_writer is None:
+        with log_writers_lock:
+            log_writer = log_writers.get(log_file_path)
+            if log_writer is None:
+                log_writer = log_writers[log_file_path] = LogWriter(log_file_path)
+    return log_writer
+
+
+@atexit.register
+def close_log_writers():
+    """
+    Flushes and closes every open LogWriter. Registered to run at interpreter exit.
+
+    :return: None
+    """
+    for log_writer in list(log_writers.values()):
+        log_writer.close()
+
+
 def log_to_file(log_file_path: str, log_string: str, log_level=LoggingLevel.All):
     """
-    Log a string to file with an appropriate severity level
+    Log a string to file with an appropriate severity level. The entry is handed to the file's LogWriter and written
+    in the background.
 
     :param log_file_path: String path to the logging file
     :param log_string: String that should be logged to the file
     :param log_level: LoggingLevel indicating the log entry severity
     :return:
     """
-    with open(log_file_path, 'a+') as log_file:
-        log_file.writelines(
-            str(datetime.now()).ljust(26) +
-            " " +
-            str(LoggingLevel.int_to_string.get(log_level) +
-                ":").ljust(10) +
-            log_string +
-            "\n")
+    get_log_writer(log_file_path).write(
+        str(datetime.now()).ljust(26) +
+        " " +
+        str(LoggingLevel.int_to_string.get(log_level) +
+            ":").ljust(10) +
+        log_string +
+        "\n")